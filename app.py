@@ -1,5 +1,6 @@
 import streamlit as st
-from src.app.authentication import app_authentication
+from src.app.authentication import app_authentication, is_admin
+from src.agent.warmup import start_warmup
 
 # Page Setup
 st.set_page_config(
@@ -26,5 +27,10 @@ if not st.session_state.user_email:
     app_authentication()
 else:
     # If user is logged in, display the navigation and the selected page
+    if is_admin(st.session_state.user_email):
+        pages.append(st.Page("pages/admin.py", title="Metrics", icon="📈"))
     pg = st.navigation(pages, position="top")
     pg.run()
+
+# Build the agent in the background while the user signs in (no-op once started)
+start_warmup()
@@ -0,0 +1,192 @@
+import streamlit as st
+from src.app.authentication import is_admin
+from src.agent.agent import agent_stats, get_answer_cache, get_router, get_service
+from src.agent.metrics import METRICS_HOST, METRICS_PORT, metrics
+from src.agent.tools.client import cache
+from src.agent.tools.warmer import get_warmer
+from src.agent.tools.websearch import search_stats
+from src.agent import streaming
+from src.agent.warmup import warmup_status
+
+st.title("📈 Metrics")
+
+# app.py only lists this page for admins, but the URL can still be opened directly
+if not is_admin(st.session_state.get("user_email")):
+    st.error("This page is only available to administrators.")
+    st.stop()
+
+
+def latency_table(histogram, label, sizes=None):
+    """Rows of count, mean and p50/p95 latency (ms), with error and size columns."""
+    calls = metrics.counter(histogram.replace("latency_seconds", "calls_total"))
+    size_rows = {r[label]: r for r in metrics.summary(sizes, label)} if sizes else {}
+    rows = []
+    for row in metrics.summary(histogram, label):
+        name = row[label]
+        statuses = {
+            dict(key)["status"]: value
+            for key, value in calls.items()
+            if dict(key).get(label) == name
+        }
+        entry = {
+            label: name,
+            "calls": row["count"],
+            "mean ms": round(row["mean"] * 1000, 1),
+            "p50 ms": round(row["p50"] * 1000, 1),
+            "p95 ms": round(row["p95"] * 1000, 1),
+            "errors": statuses.get("error", 0),
+            "429s": statuses.get("throttled", 0),
+        }
+        if name in size_rows:
+            entry["mean bytes"] = round(size_rows[name]["mean"])
+        rows.append(entry)
+    return rows
+
+
+turns = streaming.stats()
+col1, col2, col3 = st.columns(3)
+col1.metric("Turns", turns["turns"])
+col2.metric(
+    "Median first token",
+    f"{turns['ttft_median']:.2f}s" if turns["ttft_median"] is not None else "–",
+)
+col3.metric(
+    "Median turn",
+    f"{turns['total_median']:.2f}s" if turns["total_median"] is not None else "–",
+)
+
+st.header("Turns")
+st.dataframe(latency_table("turn_latency_seconds", "route"), hide_index=True)
+
+st.header("Tools")
+st.dataframe(
+    latency_table("tool_latency_seconds", "tool", "tool_output_bytes"),
+    hide_index=True,
+)
+
+st.header("Model")
+st.dataframe(latency_table("model_latency_seconds", "model"), hide_index=True)
+tokens = {
+    f"{dict(key)['model']} {dict(key)['direction']}": value
+    for key, value in metrics.counter("model_tokens_total").items()
+}
+if tokens:
+    st.caption(" · ".join(f"{name} tokens: {int(n)}" for name, n in tokens.items()))
+
+st.header("Checkpoint writes")
+st.dataframe(latency_table("checkpoint_latency_seconds", "op"), hide_index=True)
+
+st.header("Caches")
+jikan = cache.stats()
+answers = get_answer_cache().snapshot()
+routes = get_router().stats()
+col1, col2, col3 = st.columns(3)
+col1.metric("Jikan cache hit ratio", f"{jikan['hit_ratio']:.0%}")
+col2.metric("Answer cache hit ratio", f"{answers['hit_ratio']:.0%}")
+col3.metric("Answered without the agent", f"{routes['direct_ratio']:.0%}")
+with st.expander("Jikan cache by endpoint"):
+    st.dataframe(
+        [{"endpoint": k, **v} for k, v in sorted(jikan["endpoints"].items())],
+        hide_index=True,
+    )
+
+warm = get_warmer().report()
+ratio = warm["warm_hit_ratio"]
+st.subheader("Cache warmer")
+col1, col2, col3 = st.columns(3)
+col1.metric("Warm hit ratio", "–" if ratio is None else f"{ratio:.0%}")
+col2.metric("Refreshes", warm["refreshes"])
+col3.metric("Failed refreshes", warm["failures"])
+if not warm["running"]:
+    st.caption("The warmer is not running (CACHE_WARM=0 or the agent is not built).")
+st.dataframe(
+    [
+        {
+            **t,
+            "interval": round(t["interval"]),
+            "age": None if t["age"] is None else round(t["age"]),
+        }
+        for t in warm["targets"]
+    ],
+    hide_index=True,
+)
+
+web = search_stats.snapshot()
+lookups = sum(web["cache"].values())
+st.subheader("Web search")
+col1, col2 = st.columns(2)
+col1.metric(
+    "Web search cache hit ratio",
+    f"{web['cache'].get('hits', 0) / lookups:.0%}" if lookups else "–",
+)
+col2.metric("Escalated to advanced", web["escalations"])
+st.dataframe(
+    [
+        {
+            "tier": t["tier"],
+            "calls": t["calls"],
+            "errors": t["errors"],
+            "mean ms": None if t["mean_seconds"] is None else t["mean_seconds"] * 1000,
+            "mean KB": None if t["mean_bytes"] is None else t["mean_bytes"] / 1024,
+            "answers": t["answered"],
+            "mean KB returned": None
+            if t["mean_returned_bytes"] is None
+            else t["mean_returned_bytes"] / 1024,
+        }
+        for t in web["tiers"]
+    ],
+    hide_index=True,
+)
+
+st.header("Agent service")
+service = get_service().stats()
+wait = service["mean_wait"]
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Running", f"{service['running']} / {service['workers']}")
+col2.metric("Queued", service["queued"])
+col3.metric("Shed", service["rejected"])
+col4.metric("Mean queue wait", "–" if wait is None else f"{wait:.2f}s")
+warmup, builds = warmup_status(), agent_stats()
+cold = builds["cold_seconds"]
+st.caption(
+    f"Warm-up {warmup['state']}"
+    + (f" in {warmup['seconds']:.1f}s" if warmup["seconds"] is not None else "")
+    + (f" · cold graph build {cold:.1f}s" if cold is not None else "")
+    + (f" · {warmup['error']}" if warmup["error"] else "")
+)
+
+st.header("Recent calls by thread")
+recent_turns = metrics.calls("turn")
+threads = list(dict.fromkeys(c.thread_id for c in recent_turns if c.thread_id))
+if threads:
+    thread = st.selectbox("Thread", threads)
+    st.dataframe(
+        [
+            {
+                "kind": c.kind,
+                "name": c.name,
+                "ms": round(c.seconds * 1000, 1),
+                "size": c.size,
+                "error": c.error or "",
+            }
+            for c in metrics.calls(thread_id=thread)
+        ],
+        hide_index=True,
+    )
+else:
+    st.caption("No turns recorded yet.")
+
+st.divider()
+st.download_button(
+    "Download Prometheus metrics",
+    metrics.prometheus(),
+    "metrics.txt",
+    "text/plain",
+)
+if METRICS_PORT:
+    st.caption(
+        f"Prometheus can scrape http://{METRICS_HOST}:{METRICS_PORT}/metrics "
+        "(set METRICS_HOST to listen beyond this machine)"
+    )
+else:
+    st.caption("Set METRICS_PORT to serve /metrics for Prometheus.")
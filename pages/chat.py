@@ -1,31 +1,84 @@
 import streamlit as st
-from src.agent.agent import WeeabooBudddy
-from langchain_core.messages import HumanMessage
+from src.agent.agent import get_agent, get_history, get_service
+from src.agent.history import WINDOW, merge
+from src.agent.service.admission import QueueFull
+import time
+
+# Minimum seconds between re-renders of a streaming answer
+RENDER_INTERVAL = 0.05
 
 st.title("🎌 Weeaboo-Buddy")
-agent = WeeabooBudddy()
+# Builds the shared graph up front so the first turn does not pay for it
+get_agent()
+service = get_service()
+history = get_history()
 
-# Initialize session state for messages, processing status, and memory choice
+# Initialize session state for messages, processing status, and memory choice.
+# Turns with memory on are read back from the checkpointer; 'messages' only keeps
+# what it never sees (turns with memory off, errors), and 'captions' the timings of
+# stored answers by position.
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "captions" not in st.session_state:
+    st.session_state.captions = {}
+if "pending" not in st.session_state:
+    st.session_state.pending = None
+if "window" not in st.session_state:
+    st.session_state.window = WINDOW
 if "processing" not in st.session_state:
     st.session_state.processing = False
 if "memory_choice" not in st.session_state:
     st.session_state.memory_choice = True  # Default memory to True
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+
+
+def keep_local(thread_id, question, reply):
+    """Records a finished turn, keeping in the session what its thread did not store."""
+    stored = history.messages(st.session_state.user_email)
+    asked = [entry["content"] for entry in stored if entry["role"] == "user"]
+    local = []
+    if not (thread_id and asked and asked[-1] == question):
+        local.append({"role": "user", "content": question})
+    elif stored[-1] == {"role": "assistant", "content": reply["content"]}:
+        # The answer is in the thread; only its timings are kept here
+        if reply.get("caption"):
+            st.session_state.captions[len(stored) - 1] = reply["caption"]
+        return
+    local.append(reply)
+    st.session_state.messages += [{**entry, "after": len(stored)} for entry in local]
+
 
 # --- Main Chat Interface ---
-if not st.session_state.messages:
+entries = merge(
+    history.messages(st.session_state.user_email),
+    st.session_state.messages,
+    st.session_state.captions,
+)
+if not entries and st.session_state.pending is None:
     st.info(
         "Hello! I'm your Weeaboo-Buddy! Ask me anything about anime, manga, characters, or anything otaku-related!"
     )
 
-for message in st.session_state.messages:
+# Only the latest messages are rendered; earlier ones on request
+hidden = max(len(entries) - st.session_state.window, 0)
+if hidden and st.button(f"Load earlier messages ({hidden} more)"):
+    st.session_state.window += WINDOW
+    st.rerun()
+
+for message in entries[hidden:]:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("caption"):
+            st.caption(message["caption"])
+
+if st.session_state.pending is not None:
+    with st.chat_message("user"):
+        st.markdown(st.session_state.pending)
 
 if not st.session_state.processing:
     if prompt := st.chat_input("What would you like to know about anime/manga?"):
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        st.session_state.pending = prompt
         with st.chat_message("user"):
             st.markdown(prompt)
 
@@ -37,38 +90,81 @@ if st.session_state.processing:
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
             # Use memory choice from session state, which is set in 'Chat Options'
-            config = {"configurable": {"thread_id": st.session_state.user_email}}
+            thread_id = st.session_state.user_email
             if not st.session_state.memory_choice:
-                config["configurable"]["thread_id"] = None
+                thread_id = None
+            question = st.session_state.pending
+            # The turn runs on the agent service; a rerun re-attaches to the same job
+            if st.session_state.job_id is None:
+                try:
+                    st.session_state.job_id = service.submit(
+                        question, thread_id, st.session_state.user_email
+                    )
+                except QueueFull as e:
+                    # Shed under load: say so instead of making the user wait
+                    keep_local(
+                        None, question, {"role": "assistant", "content": f"⏳ {e}"}
+                    )
+                    st.session_state.pending = None
+                    st.session_state.processing = False
+                    st.rerun()
 
-            last_user_prompt = st.session_state.messages[-1]["content"]
-            input_message = [HumanMessage(content=last_user_prompt)]
+            status = st.empty()
             response_placeholder = st.empty()
             full_response = ""
+            last_render = 0.0
+            turn = None
 
             try:
-                for chunk in agent.stream(
-                    {"messages": input_message}, config, stream_mode="values"
-                ):
-                    if chunk.get("messages"):
-                        last_message = chunk["messages"][-1]
-                        if (
-                            hasattr(last_message, "content")
-                            and last_message.type == "ai"
-                        ):
-                            full_response = last_message.content
+                for event in service.follow(st.session_state.job_id):
+                    if event.kind == "queued":
+                        status.caption(
+                            f"⏳ Lots of questions right now, you're #{event.text} in line…"
+                        )
+                    elif event.kind == "started":
+                        status.empty()
+                    elif event.kind == "tool_start":
+                        status.caption(f"🔧 Calling {event.text}…")
+                    elif event.kind == "tool_end":
+                        status.caption(f"✅ {event.text} done")
+                    elif event.kind == "token":
+                        full_response = event.text
+                        # Re-rendering markdown on every token is slow for long answers
+                        if time.perf_counter() - last_render >= RENDER_INTERVAL:
                             response_placeholder.markdown(full_response + "▌")
+                            last_render = time.perf_counter()
+                    elif event.kind == "done":
+                        full_response = event.text
+                        turn = event.stats
 
+                if turn is None:
+                    job = service.status(st.session_state.job_id)
+                    raise RuntimeError(
+                        (job or {}).get("error") or "the answer was interrupted"
+                    )
                 response_placeholder.markdown(full_response)
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": full_response}
+                keep_local(
+                    thread_id,
+                    question,
+                    {
+                        "role": "assistant",
+                        "content": full_response,
+                        "caption": (
+                            f"⚡ Answered from cache in {turn.total:.2f}s"
+                            if turn.cached
+                            else f"First token in {turn.ttft or turn.total:.2f}s · "
+                            f"{turn.total:.2f}s total"
+                        ),
+                    },
                 )
             except Exception as e:
                 error_message = f"Sorry, I encountered an error: {str(e)}"
                 st.error(error_message)
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": error_message}
+                keep_local(
+                    thread_id, question, {"role": "assistant", "content": error_message}
                 )
 
+            st.session_state.job_id = None
+            st.session_state.pending = None
             st.session_state.processing = False
             st.rerun()
@@ -1,5 +1,6 @@
 import streamlit as st
-import json
+from src.agent.agent import get_history
+from src.agent.history import EXPORTS, export, merge
 
 
 st.title("Chat Options")
@@ -16,34 +17,30 @@ st.session_state.memory_choice = st.checkbox(
     "Enable Memory (allows the bot to remember previous messages)",
     value=st.session_state.memory_choice,
 )
-st.metric(
-    label="Total Messages in Current Session",
-    value=len(st.session_state.get("messages", [])),
+
+# The conversation is the stored thread plus what only this session kept
+entries = merge(
+    get_history().messages(st.session_state.user_email),
+    st.session_state.get("messages", []),
+    st.session_state.get("captions"),
 )
+st.metric(label="Total Messages in Conversation", value=len(entries))
 
 st.divider()
 
 # Export Options
 st.header("Export Chat")
-if st.session_state.get("messages"):
-    # Create a markdown string from the chat history
-    chat_export_md = ""
-    for msg in st.session_state.messages:
-        chat_export_md += f"**{msg['role'].title()}**: {msg['content']}\n\n"
-    st.download_button(
-        "Download as Markdown (.md)",
-        chat_export_md,
-        "chat_history.md",
-        "text/markdown",
-    )
-
-    # Create a JSON string from the chat history
-    chat_export_json = json.dumps(st.session_state.messages, indent=2)
-    st.download_button(
-        "Download as JSON (.json)",
-        chat_export_json,
-        "chat_history.json",
-        "application/json",
-    )
+if entries:
+    format = st.radio("Format", list(EXPORTS), horizontal=True)
+    # The file is only written when asked for, not on every visit to this page
+    if st.button("Prepare download"):
+        _, file_name, mime = EXPORTS[format]
+        st.download_button(
+            f"Download as {format} (.{file_name.rsplit('.', 1)[1]})",
+            export(entries, format),
+            file_name,
+            mime,
+            on_click="ignore",
+        )
 else:
     st.caption("No messages to export yet. Start a conversation first!")
@@ -1,28 +1,125 @@
-from .tools.tools import get_all_tools
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_tavily import TavilySearch
-from langchain_core.messages import HumanMessage
-from langgraph.checkpoint.mongodb import MongoDBSaver
-from pymongo import MongoClient
-from rich.console import Console
-from rich.markdown import Markdown
-from langgraph.prebuilt import create_react_agent
+from .history import ChatHistory
+from .router import IntentRouter
+from .service.client import RemoteAgentService
+from .service.jobs import AgentService
+from . import metrics
+from .semantic_cache import SemanticCache
+from .streaming import astream_turn
+from . import runtime
 from dotenv import load_dotenv
+import atexit
 import os
+import threading
+import time
 
 load_dotenv()
 
+# --- Process-wide Agent Resources ---
+# Streamlit re-executes page scripts on every rerun, so everything expensive
+# (model clients, the Mongo connection pool, the compiled graph) lives here
+# and is built at most once per process. The clients' libraries are imported
+# where they are first built, so importing this module stays cheap; see
+# warmup.py for loading them in the background ahead of the first turn.
+
+_lock = threading.RLock()
+_mongo_client = None
+_checkpointer = None
+_model = None
+_web_search = None
+_agents = {}
+_router = None
+_service = None
+_context_window = None
+_answer_cache = None
+_history = None
+_warmer = None
+_build_stats = {"builds": 0, "cold_seconds": None, "warm_seconds": None}
+
+
+def get_mongo_client():
+    """Returns the shared, pooled MongoClient for this process."""
+    global _mongo_client
+    with _lock:
+        if _mongo_client is None:
+            from pymongo import MongoClient
+
+            _mongo_client = MongoClient(os.getenv("MONGO_URI"))
+        return _mongo_client
+
 
 def load_memory():
-    cs = os.getenv("MONGO_URI")
-    client = MongoClient(cs)
-    checkpointer = MongoDBSaver(client)
+    """Returns the shared MongoDB checkpointer built on the pooled client."""
+    global _checkpointer
+    with _lock:
+        if _checkpointer is None:
+            from .checkpoint import MongoCheckpointSaver
+
+            _checkpointer = MongoCheckpointSaver(get_mongo_client())
+        return _checkpointer
+
+
+def get_history():
+    """Returns the shared reader of the chat history stored in the checkpointer."""
+    global _history
+    with _lock:
+        if _history is None:
+            _history = ChatHistory(load_memory())
+        return _history
+
+
+def get_model():
+    """Returns the shared Gemini chat model client."""
+    global _model
+    with _lock:
+        if _model is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            _model = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+        return _model
+
 
-    return checkpointer
+def get_web_search():
+    """Returns the shared Tavily search tool, cached and tiered (see websearch.py)."""
+    global _web_search
+    with _lock:
+        if _web_search is None:
+            from .tools.websearch import TieredTavilySearch
 
+            # Depth and result count are chosen per tier; images are always
+            # requested, their descriptions only by the advanced tier
+            _web_search = TieredTavilySearch(
+                topic="general",
+                include_answer=False,
+                include_raw_content=False,
+                include_images=True,
+                time_range="year",
+                include_domains=None,
+                exclude_domains=None,
+            )
+        return _web_search
 
-def WeeabooBudddy():
-    prompt = """
+
+def get_context_window():
+    """Returns the shared context window, which summarizes old turns with the model."""
+    global _context_window
+    with _lock:
+        if _context_window is None:
+            from .context import ContextWindow
+
+            _context_window = ContextWindow(get_model())
+        return _context_window
+
+
+def get_answer_cache():
+    """Returns the shared semantic answer cache for recurring questions."""
+    global _answer_cache
+    with _lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticCache()
+        return _answer_cache
+
+
+PROMPT = """
     You are "The Anime Architect," an expert AI designed to answer a wide variety of questions about anime, manga, and relevant Japanese culture. Your primary audience is teens and young adults, and your persona should be like a knowledgeable, enthusiastic, and engaging anime YouTuber (think Joey The Anime Man, Garnt, and The Anime Man).
 
     **Role and Personality:**
@@ -58,45 +155,182 @@ def WeeabooBudddy():
     
     """
 
-    model = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
-    web_search = TavilySearch(
-        max_results=15,
-        topic="general",
-        include_answer=False,
-        include_raw_content=False,
-        include_images=True,
-        include_image_descriptions=True,
-        search_depth="advanced",
-        time_range="year",
-        include_domains=None,
-        exclude_domains=None,
+
+def WeeabooBudddy(model=None, tools=None, checkpointer=None, context_window=None):
+    from langgraph.prebuilt import create_react_agent
+    from .context import ContextState
+
+    if model is None:
+        model = get_model()
+    if tools is None:
+        tools = get_tools()
+    if checkpointer is None:
+        checkpointer = load_memory()
+    if context_window is None:
+        context_window = get_context_window()
+
+    agent = create_react_agent(
+        model,
+        tools,
+        checkpointer=checkpointer,
+        prompt=PROMPT,
+        pre_model_hook=context_window.as_hook(),
+        state_schema=ContextState,
     )
+
+    # Callbacks in the graph's config reach every model and tool call it makes
+    return agent.with_config(callbacks=[metrics.handler])
+
+
+def get_tools():
+    """Returns every tool the full agent binds: the Jikan tools and Tavily."""
+    from .tools.tools import get_all_tools
+
     tools = get_all_tools()
-    tools.append(web_search)
+    tools.append(get_web_search())
+    return tools
+
+
+def get_agent(tools=None):
+    """Returns a process-wide compiled agent, building it on first use.
+
+    Args:
+        tools: Names of the tools to bind; None binds all of them. Each subset gets
+            its own graph, sharing the model, the checkpointer and the threads.
+    """
+    global _warmer
+    key = None if tools is None else tuple(sorted(tools))
+    start = time.perf_counter()
+    with _lock:
+        if key not in _agents:
+            if key is None:
+                from .tools.warmer import start_warmer
 
-    memory = load_memory()
+                _agents[key] = WeeabooBudddy()
+                metrics.start_server()
+                _warmer = start_warmer()
+            else:
+                _agents[key] = WeeabooBudddy(
+                    tools=[t for t in get_tools() if t.name in key]
+                )
+            _build_stats["builds"] += 1
+            if key is None:
+                _build_stats["cold_seconds"] = time.perf_counter() - start
+            return _agents[key]
+    _build_stats["warm_seconds"] = time.perf_counter() - start
+    return _agents[key]
 
-    agent = create_react_agent(model, tools, checkpointer=memory, prompt=prompt)
 
-    return agent
+def get_router():
+    """Returns the shared intent router in front of the agent."""
+    global _router
+    with _lock:
+        if _router is None:
+            _router = IntentRouter(
+                get_model(), get_tools(), get_agent, PROMPT, [metrics.handler]
+            )
+        return _router
+
+
+def run_turn(messages, config):
+    """Streams one turn through the shared agent, answer cache and router."""
+    return astream_turn(get_agent(), messages, config, get_answer_cache(), get_router())
+
+
+def get_service():
+    """Returns the service turns are submitted to.
+
+    Turns run on a pool of workers on the runtime loop, or on a separate agent
+    service process when AGENT_SERVICE_URL is set (python -m src.agent.service).
+    """
+    global _service
+    with _lock:
+        if _service is None:
+            url = os.getenv("AGENT_SERVICE_URL")
+            if url:
+                _service = RemoteAgentService(url)
+            else:
+                _service = AgentService(run_turn).start(runtime.get_loop())
+        return _service
+
+
+def _collect_service():
+    # A remote service exports its own metrics
+    return _service.collect() if isinstance(_service, AgentService) else {}
+
+
+metrics.metrics.collectors.append(_collect_service)
+
+
+def agent_stats():
+    """Returns cold (first build) and warm (cached lookup) construction times."""
+    with _lock:
+        return dict(_build_stats)
+
+
+def shutdown_agent():
+    """Drops the shared agent, stops the async runtime and closes the Mongo pool."""
+    global _mongo_client, _checkpointer, _model, _web_search, _router, _context_window
+    global _service, _warmer, _history
+    if isinstance(_service, AgentService):
+        runtime.run(_service.stop(), timeout=10)
+    runtime.shutdown()
+    if _warmer is not None:
+        _warmer.stop(timeout=5)
+        _warmer = None
+    with _lock:
+        _agents.clear()
+        _router = None
+        _service = None
+        _checkpointer = None
+        _history = None
+        _model = None
+        _web_search = None
+        _context_window = None
+        if _mongo_client is not None:
+            _mongo_client.close()
+            _mongo_client = None
+
+
+atexit.register(shutdown_agent)
 
 
 # Agent Conversation Tool
 def talk_tuah():
+    from langchain_core.messages import HumanMessage
+    from rich.console import Console
+    from rich.live import Live
+    from rich.markdown import Markdown
+
     console = Console()
-    agent = WeeabooBudddy()
+    agent = get_agent()
 
     hi = input("Enter your question: ")
     config = {"configurable": {"thread_id": "abc123"}}
-    for step in agent.stream(
-        {"messages": [HumanMessage(content=hi)]},
-        config,  # type: ignore
-        stream_mode="values",
-    ):
-        if step["messages"][-1].type == "ai":
-            m = step["messages"][-1].content
-            content = Markdown(m)
-            console.print(content)
+    turn = None
+    # Live redraws at most refresh_per_second, so tokens don't re-render one by one
+    with Live(Markdown(""), console=console, refresh_per_second=10) as live:
+        for event in runtime.iterate(
+            astream_turn(
+                agent,
+                [HumanMessage(content=hi)],
+                config,
+                get_answer_cache(),
+                get_router(),
+            )
+        ):
+            if event.kind == "tool_start":
+                console.print(f"[dim]calling {event.text}…[/dim]")
+            elif event.kind in ("token", "done"):
+                live.update(Markdown(event.text))
+            if event.kind == "done":
+                turn = event.stats
+    # No stats when the stream ends without a 'done' event (e.g. the turn failed)
+    if turn is not None:
+        console.print(
+            f"[dim]first token {turn.ttft or turn.total:.2f}s, "
+            f"total {turn.total:.2f}s[/dim]"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+Command line entry point of the offline benchmark.
+
+Usage:
+    python -m src.agent.benchmark [--repeat 5] [--json report.json]
+    python -m src.agent.benchmark --baseline report.json --tolerance 0.2
+    python -m src.agent.benchmark --concurrency 8 --model-latency 0.5
+"""
+
+from rich.console import Console
+from rich.table import Table
+from .runner import compare, run_benchmark
+import argparse
+import json
+import sys
+
+
+def print_report(report: dict, console: Console) -> None:
+    table = Table(title=f"Benchmark ({report['turns']} turns)")
+    for column in ("conversation", "turns", "p50 ms", "p90 ms", "ttft p50 ms"):
+        table.add_column(
+            column, justify="right" if column != "conversation" else "left"
+        )
+    for column in ("tools/answer", "model calls", "input tokens", "tool bytes"):
+        table.add_column(column, justify="right")
+    rows = [*report["conversations"].items(), ("all", report)]
+    for name, m in rows:
+        table.add_row(
+            name,
+            str(m["turns"]),
+            f"{m['latency_ms']['p50']:.1f}",
+            f"{m['latency_ms']['p90']:.1f}",
+            f"{m['ttft_ms']['p50']:.1f}",
+            f"{m['tool_calls']['mean']:.2f}",
+            f"{m['model_calls']['mean']:.2f}",
+            f"{m['model_input_tokens']['mean']:.0f}",
+            f"{m['tool_output_bytes']['mean']:.0f}",
+        )
+    console.print(table)
+    latency = report["latency_ms"]
+    console.print(
+        f"latency p50 {latency['p50']:.1f} ms · p90 {latency['p90']:.1f} ms · "
+        f"p99 {latency['p99']:.1f} ms · max {latency['max']:.1f} ms"
+    )
+    wait = report["queue_wait_ms"]
+    console.print(
+        f"concurrency {report['concurrency']} · "
+        f"{report['throughput']:.1f} turns/s · "
+        f"queue wait p50 {wait['p50']:.1f} ms · p90 {wait['p90']:.1f} ms"
+    )
+    console.print(
+        f"peak traced memory {report['peak_memory_mb']:.1f} MB · "
+        f"max RSS {report['max_rss_mb']:.1f} MB · {report['elapsed_s']:.2f}s total"
+    )
+    for service, stats in sorted(report["upstream"].items()):
+        console.print(
+            f"{service}: {stats['requests']} requests, {stats['bytes']} bytes, "
+            f"{stats['missing']} without fixture"
+        )
+    if report["routes"]:
+        console.print(f"routes: {report['routes']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the agent offline against a scripted model and "
+        "recorded API responses."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per conversation")
+    parser.add_argument(
+        "--only", nargs="*", help="Names of the conversations to run (default all)"
+    )
+    parser.add_argument(
+        "--upstream-latency", type=float, default=0.0, help="Seconds per API response"
+    )
+    parser.add_argument(
+        "--model-latency", type=float, default=0.0, help="Seconds per model response"
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.0, help="Seconds between tokens"
+    )
+    parser.add_argument("--no-router", action="store_true")
+    parser.add_argument("--answer-cache", action="store_true")
+    parser.add_argument(
+        "--warm", action="store_true", help="Keep tool caches between conversations"
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Fetch Jikan responses missing from the fixtures and save them",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Conversations run at once against as many agent service workers",
+    )
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Report to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative regression against the baseline",
+    )
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        repeat=args.repeat,
+        upstream_latency=args.upstream_latency,
+        model_latency=args.model_latency,
+        token_latency=args.token_latency,
+        use_router=not args.no_router,
+        use_answer_cache=args.answer_cache,
+        cold=not args.warm,
+        only=args.only,
+        record=args.record,
+        concurrency=args.concurrency,
+    )
+    console = Console()
+    print_report(report, console)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            console.print(f"[red]regression[/red] {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
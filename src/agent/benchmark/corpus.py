@@ -0,0 +1,181 @@
+"""
+Representative conversations the benchmark drives through the agent.
+Each covers a kind of question users actually ask, with the tool calls a good
+answer needs: seasonal and schedule lookups, top lists, title lookups with
+follow-ups, full profiles, comparisons, paginated browsing, scene search and web
+search. Every call is served by the recorded fixtures.
+"""
+
+from typing import List
+from dataclasses import dataclass
+from PIL import Image
+from .fake_model import Turn, call
+import base64
+import io
+
+ANSWER = (
+    "Okay, so here's the deal! {topic} is seriously worth talking about. "
+    "I pulled the details for you: the scores are great, the studio went all out, "
+    "and the fandom has not stopped talking about it. If you liked this, ask me "
+    "about similar shows and I'll dig up some recommendations! "
+)
+
+
+@dataclass
+class Conversation:
+    name: str
+    turns: List[Turn]
+
+
+def answer(topic: str, paragraphs: int = 3) -> str:
+    return "\n\n".join([ANSWER.format(topic=topic)] * paragraphs)
+
+
+def screenshot() -> str:
+    """A small letterboxed frame, base64 encoded like a pasted screenshot."""
+    image = Image.new("RGB", (1280, 720), "black")
+    image.paste(Image.linear_gradient("L").convert("RGB").resize((1280, 540)), (0, 90))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def conversations() -> List[Conversation]:
+    """Builds the benchmark corpus."""
+    return [
+        Conversation(
+            "season",
+            [
+                Turn(
+                    "What anime is airing this season?",
+                    [[call("jikan_seasons", extension="now")]],
+                    answer("This season's lineup", 4),
+                ),
+                Turn(
+                    "Which of those has the best score? Tell me more about it",
+                    [[call("jikan_anime", id=52991, extension="full")]],
+                    answer("Frieren"),
+                ),
+            ],
+        ),
+        Conversation(
+            "schedule",
+            [
+                Turn(
+                    "What anime airs on Friday?",
+                    [[call("jikan_schedules", day="friday")]],
+                    answer("The Friday schedule", 2),
+                )
+            ],
+        ),
+        Conversation(
+            "top",
+            [
+                Turn(
+                    "What are the top 10 anime of all time?",
+                    [[call("jikan_top", type="anime", parameters={"limit": 10})]],
+                    answer("The all-time top 10", 4),
+                ),
+                Turn(
+                    "Compare the top 3 for me",
+                    [
+                        [
+                            call(
+                                "jikan_batch",
+                                type="anime",
+                                ids=[52991, 5114, 9253],
+                                columns=["mal_id", "title", "score", "episodes"],
+                            )
+                        ]
+                    ],
+                    answer("Frieren vs. FMA:B vs. Steins;Gate"),
+                ),
+            ],
+        ),
+        Conversation(
+            "lookup",
+            [
+                Turn(
+                    "Tell me about Frieren",
+                    [
+                        [call("catalog_search", query="Frieren")],
+                        [
+                            call("jikan_anime", id=52991, extension="full"),
+                            call("jikan_anime", id=52991, extension="characters"),
+                        ],
+                    ],
+                    answer("Frieren: Beyond Journey's End", 4),
+                ),
+                Turn(
+                    "Who voices Fern?",
+                    [[call("jikan_anime", id=52991, extension="characters")]],
+                    answer("Fern's voice actress", 1),
+                ),
+            ],
+        ),
+        Conversation(
+            "profile",
+            [
+                Turn(
+                    "Give me the full rundown on Frieren: cast, staff and episodes",
+                    [
+                        [call("catalog_search", query="Frieren")],
+                        [call("jikan_full_profile", type="anime", id=52991)],
+                    ],
+                    answer("Frieren's cast, staff and episodes", 4),
+                ),
+            ],
+        ),
+        Conversation(
+            "browse",
+            [
+                Turn(
+                    "Find every action anime airing now with a score above 8",
+                    [
+                        [call("jikan_genres", type="anime")],
+                        [
+                            call(
+                                "jikan_fetch_all",
+                                endpoint="seasons",
+                                arguments={"extension": "now"},
+                                where={"score>": 8, "genres": "Action"},
+                                fields=["mal_id", "title", "score"],
+                            )
+                        ],
+                    ],
+                    answer("This season's action hits", 3),
+                )
+            ],
+        ),
+        Conversation(
+            "scene",
+            [
+                Turn(
+                    "What anime is this screenshot from?",
+                    [[call("trace_moe_search", path=screenshot())]],
+                    answer("That scene from Frieren", 2),
+                )
+            ],
+        ),
+        Conversation(
+            "news",
+            [
+                Turn(
+                    "Any news on upcoming anime announcements?",
+                    [[call("tavily_search", query="upcoming anime announcements")]],
+                    answer("The latest announcements", 3),
+                )
+            ],
+        ),
+        Conversation(
+            "long-chat",
+            [
+                Turn(
+                    f"Tell me about the manga Berserk, part {i}",
+                    [[call("jikan_manga", id=2, extension="full")]],
+                    answer("Berserk", 3),
+                )
+                for i in range(1, 9)
+            ],
+        ),
+    ]
@@ -0,0 +1,208 @@
+"""
+Scripted stand-in for the Gemini chat model.
+Each benchmark turn scripts the tool calls the model makes, step by step, and the
+answer it finally writes. The model finds the turn from the user's latest message
+and the step from the tool results that followed it, so it stays in sync whether the
+turn runs through the full agent, an agent with fewer tools or a direct answer. Any
+other request, such as a summary of old turns, gets a short canned reply. Latency
+before the first token and between tokens can be simulated.
+"""
+
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from dataclasses import dataclass, field
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from ..context import estimate_tokens
+from contextvars import ContextVar
+import asyncio
+import json
+import re
+import time
+import uuid
+
+CANNED_REPLY = "Summary: the user asked about several anime and got answers."
+
+# Thread the current turn belongs to, set by whoever runs it, so requests from
+# concurrent conversations can be told apart
+current_thread: ContextVar[Optional[str]] = ContextVar("current_thread", default=None)
+
+
+@dataclass
+class Turn:
+    """One scripted exchange.
+
+    Attributes:
+        question: What the user asks
+        steps: Tool calls the model makes, one list per model step, each call a
+            {"name": ..., "args": ...} dict
+        answer: Final answer the model writes
+    """
+
+    question: str
+    steps: List[List[Dict[str, Any]]] = field(default_factory=list)
+    answer: str = ""
+
+
+def call(name: str, **args: Any) -> Dict[str, Any]:
+    """Shorthand for a scripted tool call."""
+    return {"name": name, "args": args}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replays scripted turns instead of calling an API.
+
+    Attributes:
+        turns: Scripted turns by question
+        latency: Seconds before the first chunk of each response
+        token_latency: Seconds between streamed answer chunks
+        bound: Names of the tools bound with bind_tools()
+        calls: Thread id and input token estimate of every request, shared by bound
+            copies
+    """
+
+    turns: Dict[str, Turn] = {}
+    latency: float = 0.0
+    token_latency: float = 0.0
+    bound: Sequence[str] = ()
+    calls: List[Tuple[Optional[str], int]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @classmethod
+    def from_turns(cls, turns: Sequence[Turn], **kwargs: Any) -> "ScriptedChatModel":
+        return cls(turns={t.question: t for t in turns}, calls=[], **kwargs)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        names = [getattr(t, "name", None) or t["name"] for t in tools]
+        # model_copy is shallow, so every bound copy records into the same calls list
+        return self.model_copy(update={"bound": tuple(names)})
+
+    def _turn(self, messages: Sequence[BaseMessage]) -> Optional[Turn]:
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                text = str(message.content)
+                # Direct answers append the tool data to the question
+                for question, turn in self.turns.items():
+                    if text == question or text.startswith(question + "\n"):
+                        return turn
+                return None
+        return None
+
+    def _respond(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        self.calls.append((current_thread.get(), estimate_tokens(messages)))
+        turn = self._turn(messages)
+        if turn is None:
+            return AIMessage(content=CANNED_REPLY)
+        step = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage) and message.tool_calls:
+                step += 1
+        while step < len(turn.steps):
+            calls = [c for c in turn.steps[step] if c["name"] in self.bound]
+            if calls:
+                return AIMessage(
+                    content="",
+                    tool_calls=[
+                        {
+                            "name": c["name"],
+                            "args": c["args"],
+                            "id": f"call_{uuid.uuid4().hex[:12]}",
+                        }
+                        for c in calls
+                    ],
+                )
+            # Tools the router left unbound are skipped, as a real model would
+            step += 1
+        return AIMessage(content=turn.answer)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    def _chunks(self, message: AIMessage) -> Iterator[AIMessageChunk]:
+        if message.tool_calls:
+            yield AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {
+                        "name": c["name"],
+                        "args": json.dumps(c["args"]),
+                        "id": c["id"],
+                        "index": i,
+                    }
+                    for i, c in enumerate(message.tool_calls)
+                ],
+            )
+            return
+        for token in re.split(r"(?<=\s)", str(message.content)):
+            if token:
+                yield AIMessageChunk(content=token)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for i, chunk in enumerate(self._chunks(self._respond(messages))):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(str(chunk.content), chunk=chunk)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for i, chunk in enumerate(self._chunks(self._respond(messages))):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(str(chunk.content), chunk=chunk)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
@@ -0,0 +1,191 @@
+"""
+Import-time profile of the app's entry points.
+Imports each entry point in a fresh interpreter with -X importtime, keeps the fastest
+of a few runs per module, and reports the total per entry point and the slowest
+top-level packages behind it. It also checks that the login path (what app.py
+imports before anyone signs in) stays clear of the agent stack. Reports can be saved
+and compared against a baseline to catch regressions.
+
+Usage:
+    python -m src.agent.benchmark.imports [--repeat 3] [--top 15] [--json imports.json]
+    python -m src.agent.benchmark.imports --baseline imports.json --tolerance 0.25
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+from rich.console import Console
+from rich.table import Table
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ENTRY_POINTS = (
+    # What app.py imports before anyone signs in
+    "src.app.authentication",
+    "src.agent.warmup",
+    # What the chat page imports, and what building the agent pulls in
+    "src.agent.agent",
+    "src.agent.tools.tools",
+    "src.agent.service.client",
+)
+LOGIN_PATH = ("src.app.authentication", "src.agent.warmup")
+# Packages only the agent needs, which must not load before sign in
+AGENT_PACKAGES = (
+    "langchain_google_genai",
+    "langchain_tavily",
+    "langgraph",
+    "pymongo",
+    "jikanpy",
+    "rich",
+    "supabase",
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def profile(module: str) -> Dict[str, Dict[str, int]]:
+    """Imports a module in a fresh interpreter.
+
+    Returns:
+        Self and cumulative import time (microseconds) of every module it loaded
+    """
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            own, cumulative, _, name = match.groups()
+            modules[name] = {"self": int(own), "cumulative": int(cumulative)}
+    return modules
+
+
+def fastest(runs: Sequence[Dict[str, Dict[str, int]]]) -> Dict[str, Dict[str, int]]:
+    """Per module, the fastest of several runs, to filter out scheduling noise."""
+    merged: Dict[str, Dict[str, int]] = {}
+    for run in runs:
+        for name, times in run.items():
+            best = merged.setdefault(name, dict(times))
+            best["self"] = min(best["self"], times["self"])
+            best["cumulative"] = min(best["cumulative"], times["cumulative"])
+    return merged
+
+
+def by_package(modules: Dict[str, Dict[str, int]]) -> Dict[str, int]:
+    """Self time summed per top-level package (src.* split one level deeper)."""
+    packages: Dict[str, int] = {}
+    for name, times in modules.items():
+        parts = name.split(".")
+        package = ".".join(parts[:3]) if parts[0] == "src" else parts[0]
+        packages[package] = packages.get(package, 0) + times["self"]
+    return packages
+
+
+def run_profile(
+    entry_points: Sequence[str] = ENTRY_POINTS, repeat: int = 3
+) -> Dict[str, Any]:
+    """Profiles every entry point and returns the report."""
+    report: Dict[str, Any] = {"entry_points": {}, "violations": []}
+    for module in entry_points:
+        modules = fastest([profile(module) for _ in range(repeat)])
+        total = modules.get(module, {}).get("cumulative", 0)
+        report["entry_points"][module] = {
+            "total_ms": total / 1000,
+            "modules": len(modules),
+            "packages_ms": {
+                name: us / 1000
+                for name, us in sorted(
+                    by_package(modules).items(), key=lambda item: -item[1]
+                )
+            },
+        }
+        if module in LOGIN_PATH:
+            loaded = {name.split(".")[0] for name in modules}
+            report["violations"] += [
+                f"{module} imports {package}"
+                for package in AGENT_PACKAGES
+                if package in loaded
+            ]
+    return report
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25
+) -> List[str]:
+    """Lists the entry points that got slower than the baseline by the tolerance."""
+    regressions = []
+    for module, now in current["entry_points"].items():
+        before = baseline.get("entry_points", {}).get(module)
+        if before and now["total_ms"] > before["total_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{module}: {before['total_ms']:.0f} -> {now['total_ms']:.0f} ms"
+            )
+    return regressions
+
+
+def print_report(report: Dict[str, Any], console: Console, top: int) -> None:
+    table = Table(title="Import time")
+    table.add_column("entry point")
+    table.add_column("total ms", justify="right")
+    table.add_column("modules", justify="right")
+    table.add_column(f"slowest packages (self ms, top {top})")
+    for module, entry in report["entry_points"].items():
+        slowest = list(entry["packages_ms"].items())[:top]
+        table.add_row(
+            module,
+            f"{entry['total_ms']:.0f}",
+            str(entry["modules"]),
+            ", ".join(f"{name} {ms:.0f}" for name, ms in slowest),
+        )
+    console.print(table)
+    for violation in report["violations"]:
+        console.print(f"[red]login path[/red] {violation}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Profile the import time of the app's entry points."
+    )
+    parser.add_argument(
+        "modules", nargs="*", help="Entry points to profile (default the app's)"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per entry point")
+    parser.add_argument("--top", type=int, default=8, help="Packages listed per entry")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Report to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative regression against the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    report = run_profile(args.modules or ENTRY_POINTS, args.repeat)
+    console = Console()
+    print_report(report, console, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    failed = bool(report["violations"])
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            console.print(f"[red]regression[/red] {regression}")
+        failed = failed or bool(regressions)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
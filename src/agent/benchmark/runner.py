@@ -0,0 +1,357 @@
+"""
+Offline end-to-end benchmark of the agent.
+Runs the real graph, tools, context window and router against the scripted chat
+model and the local API stand-in, submits the corpus to the agent service as the chat
+page does, and reports per-turn latency percentiles, queue wait, tool calls and model
+calls per answer, bytes of tool output fed to the model, upstream traffic and peak
+memory. With a concurrency above 1, that many conversations run at once against as
+many workers, as a load test. Reports can be saved and compared against a baseline
+to catch regressions.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from .corpus import Conversation, conversations
+from .fake_model import ScriptedChatModel, current_thread
+from .server import StubServer
+import asyncio
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+# Metrics compared against a baseline; all of them are better when lower
+REGRESSION_METRICS = (
+    ("latency_ms", "p90"),
+    ("ttft_ms", "p90"),
+    ("queue_wait_ms", "p90"),
+    ("tool_calls", "mean"),
+    ("model_calls", "mean"),
+    ("model_input_tokens", "mean"),
+    ("tool_output_bytes", "mean"),
+    ("peak_memory_mb", None),
+)
+
+
+@dataclass
+class TurnResult:
+    conversation: str
+    latency: float
+    ttft: Optional[float]
+    queue_wait: float
+    tool_calls: int
+    model_calls: int
+    model_input_tokens: int
+    tool_output_bytes: int
+    route: Optional[str]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of a list of values (q between 0 and 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def _configure(stub: StubServer) -> None:
+    """Points every client at the stub and isolates caches from the real ones.
+
+    Must run before the agent modules are imported, since the Jikan clients are
+    created at import time.
+    """
+    os.environ.update(stub.env())
+    os.environ["JIKAN_CACHE_PATH"] = ""
+    os.environ["JIKAN_CATALOG_PATH"] = os.path.join(
+        tempfile.mkdtemp(prefix="weeaboo-bench-"), "catalog.sqlite3"
+    )
+    # The stub needs no protection; set JIKAN_RATE_LIMITS to benchmark with them
+    os.environ.setdefault("JIKAN_RATE_LIMITS", "1000/1")
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+
+    import langchain_tavily._utilities
+
+    langchain_tavily._utilities.TAVILY_API_URL = f"{stub.url}/tavily"
+
+
+class Benchmark:
+    """Builds the agent on stand-ins and runs conversations through it.
+
+    Attributes:
+        model: Scripted chat model shared by the agent, the router and the summarizer
+        use_router: Route turns through the intent router, as the chat page does
+        use_answer_cache: Serve repeated questions from the semantic answer cache
+        concurrency: Conversations run at once, and workers of the agent service
+    """
+
+    def __init__(
+        self,
+        corpus: List[Conversation],
+        model_latency: float = 0.0,
+        token_latency: float = 0.0,
+        use_router: bool = True,
+        use_answer_cache: bool = False,
+        concurrency: int = 1,
+    ) -> None:
+        from langgraph.checkpoint.memory import MemorySaver
+        from ..agent import PROMPT, WeeabooBudddy, get_web_search
+        from ..metrics import handler
+        from ..context import ContextWindow
+        from ..router import IntentRouter
+        from ..semantic_cache import SemanticCache
+        from ..service.jobs import AgentService
+        from ..streaming import astream_turn
+        from ..tools.tools import get_all_tools
+
+        self.corpus = corpus
+        self.model = ScriptedChatModel.from_turns(
+            [turn for c in corpus for turn in c.turns],
+            latency=model_latency,
+            token_latency=token_latency,
+        )
+        self.tools = get_all_tools() + [get_web_search()]
+        self.checkpointer = MemorySaver()
+        self.context_window = ContextWindow(self.model)
+        self._agents: Dict[Any, Any] = {}
+
+        def build(names: Optional[Sequence[str]] = None) -> Any:
+            key = None if names is None else tuple(sorted(names))
+            if key not in self._agents:
+                self._agents[key] = WeeabooBudddy(
+                    model=self.model,
+                    tools=[t for t in self.tools if key is None or t.name in key],
+                    checkpointer=self.checkpointer,
+                    context_window=self.context_window,
+                )
+            return self._agents[key]
+
+        self.agent = build()
+        self.router = (
+            IntentRouter(self.model, self.tools, build, PROMPT, [handler])
+            if use_router
+            else None
+        )
+        self.answer_cache = SemanticCache() if use_answer_cache else None
+        self.concurrency = concurrency
+
+        async def run_turn(messages: Any, config: Dict[str, Any]) -> Any:
+            # Tasks the turn starts inherit this, attributing model calls to it
+            current_thread.set(config["configurable"]["thread_id"])
+            async for event in astream_turn(
+                self.agent, messages, config, self.answer_cache, self.router
+            ):
+                yield event
+
+        self.service = AgentService(run_turn, workers=concurrency)
+        self.runs = 0
+
+    def reset_caches(self) -> None:
+        """Empties every response cache and the catalog so each run starts cold."""
+        from ..tools.catalog import get_catalog
+        from ..tools.client import cache
+        from ..tools.tracemoe import scene_cache
+        from ..tools.websearch import search_cache
+
+        cache.clear()
+        scene_cache.clear()
+        search_cache.clear()
+        get_catalog().clear()
+
+    async def run_conversation(
+        self, conversation: Conversation, thread_id: str
+    ) -> List[TurnResult]:
+        config = {"configurable": {"thread_id": thread_id}}
+        results = []
+        for turn in conversation.turns:
+            before = self._model_calls(thread_id)
+            state = await self.agent.aget_state(config)
+            history = len(state.values.get("messages", []))
+            done = None
+            job_id = self.service.submit(turn.question, thread_id)
+            async for event in self.service.afollow(job_id):
+                if event.kind == "done":
+                    done = event.stats
+            job = self.service.get(job_id)
+            if done is None:
+                raise RuntimeError(f"{conversation.name} turn failed: {job.error}")
+            state = await self.agent.aget_state(config)
+            new = state.values.get("messages", [])[history:]
+            calls = self._model_calls(thread_id)[len(before) :]
+            results.append(
+                TurnResult(
+                    conversation=conversation.name,
+                    latency=done.total,
+                    ttft=done.ttft,
+                    queue_wait=job.started - job.submitted,
+                    tool_calls=len(done.tools),
+                    model_calls=len(calls),
+                    model_input_tokens=sum(calls),
+                    tool_output_bytes=sum(
+                        len(str(m.content).encode()) for m in new if m.type == "tool"
+                    ),
+                    route=done.intent,
+                )
+            )
+        return results
+
+    def _model_calls(self, thread_id: str) -> List[int]:
+        return [tokens for thread, tokens in self.model.calls if thread == thread_id]
+
+    async def run(self, repeat: int = 3, cold: bool = True) -> List[TurnResult]:
+        self.service.start(asyncio.get_running_loop())
+        slots = asyncio.Semaphore(self.concurrency)
+        self.runs += 1
+
+        async def run_one(conversation: Conversation, round_: int) -> List[TurnResult]:
+            async with slots:
+                if cold and self.concurrency == 1:
+                    self.reset_caches()
+                return await self.run_conversation(
+                    conversation, f"bench-{self.runs}-{conversation.name}-{round_}"
+                )
+
+        results: List[TurnResult] = []
+        for round_ in range(repeat):
+            if cold and self.concurrency > 1:
+                # Concurrent conversations share the caches, as users do
+                self.reset_caches()
+            for batch in await asyncio.gather(
+                *(run_one(c, round_) for c in self.corpus)
+            ):
+                results += batch
+        return results
+
+
+def report(
+    results: List[TurnResult],
+    stub: StubServer,
+    bench: Benchmark,
+    peak_memory: int,
+    elapsed: float,
+) -> Dict[str, Any]:
+    """Aggregates turn results into the benchmark report."""
+
+    def metrics(turns: List[TurnResult]) -> Dict[str, Any]:
+        return {
+            "turns": len(turns),
+            "latency_ms": summarize([t.latency * 1000 for t in turns]),
+            "ttft_ms": summarize([(t.ttft or t.latency) * 1000 for t in turns]),
+            "queue_wait_ms": summarize([t.queue_wait * 1000 for t in turns]),
+            "tool_calls": summarize([t.tool_calls for t in turns]),
+            "model_calls": summarize([t.model_calls for t in turns]),
+            "model_input_tokens": summarize([t.model_input_tokens for t in turns]),
+            "tool_output_bytes": summarize([t.tool_output_bytes for t in turns]),
+        }
+
+    names = list(dict.fromkeys(t.conversation for t in results))
+    return {
+        **metrics(results),
+        "elapsed_s": elapsed,
+        "concurrency": bench.concurrency,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+        "peak_memory_mb": peak_memory / 2**20,
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "upstream": dict(stub.stats),
+        "routes": bench.router.stats()["routes"] if bench.router else None,
+        "conversations": {
+            name: metrics([t for t in results if t.conversation == name])
+            for name in names
+        },
+    }
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2
+) -> List[str]:
+    """Lists the metrics that got worse than the baseline by more than the tolerance."""
+    regressions = []
+    for metric, statistic in REGRESSION_METRICS:
+        now, before = current.get(metric), baseline.get(metric)
+        if statistic is not None:
+            now = (now or {}).get(statistic)
+            before = (before or {}).get(statistic)
+        if now is None or before is None:
+            continue
+        if now > before * (1 + tolerance) and now - before > 1e-9:
+            label = f"{metric}.{statistic}" if statistic else metric
+            regressions.append(f"{label}: {before:.2f} -> {now:.2f}")
+    return regressions
+
+
+def run_benchmark(
+    repeat: int = 3,
+    upstream_latency: float = 0.0,
+    model_latency: float = 0.0,
+    token_latency: float = 0.0,
+    use_router: bool = True,
+    use_answer_cache: bool = False,
+    cold: bool = True,
+    only: Optional[Sequence[str]] = None,
+    record: bool = False,
+    concurrency: int = 1,
+) -> Dict[str, Any]:
+    """Runs the corpus against the stand-ins and returns the report.
+
+    Args:
+        repeat: Times each conversation is run
+        upstream_latency: Seconds the stub waits before each API response
+        model_latency: Seconds the scripted model waits before each response
+        token_latency: Seconds between streamed answer chunks
+        use_router: Route turns through the intent router
+        use_answer_cache: Serve repeated questions from the semantic answer cache
+        cold: Empty the tool caches before each conversation
+        only: Names of the conversations to run (default all)
+        record: Fetch and save Jikan responses missing from the fixtures
+        concurrency: Conversations run at once (and agent service workers)
+    """
+    stub = StubServer(latency=upstream_latency, record=record).start()
+    try:
+        _configure(stub)
+        corpus = [c for c in conversations() if not only or c.name in only]
+        bench = Benchmark(
+            corpus,
+            model_latency,
+            token_latency,
+            use_router,
+            use_answer_cache,
+            concurrency,
+        )
+
+        async def main() -> Tuple[List[TurnResult], float]:
+            from ..tools.client import aclose_aio_jikan
+            from ..transport import aclose_aio_sessions
+
+            try:
+                # One untimed pass warms imports, graph compilation and connections
+                await bench.run(repeat=1, cold=cold)
+                stub.reset_stats()
+                if bench.router is not None:
+                    bench.router.counts.clear()
+                tracemalloc.start()
+                started = time.perf_counter()
+                results = await bench.run(repeat=repeat, cold=cold)
+                return results, time.perf_counter() - started
+            finally:
+                await bench.service.stop()
+                await aclose_aio_jikan()
+                await aclose_aio_sessions()
+
+        results, elapsed = asyncio.run(main())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return report(results, stub, bench, peak, elapsed)
+    finally:
+        stub.stop()
@@ -0,0 +1,179 @@
+"""
+Local stand-in for the Jikan, trace.moe and Tavily APIs.
+Serves recorded responses from the JSON fixtures next to this module over HTTP, so
+the real clients (jikanpy, the trace.moe session, langchain-tavily) run unchanged
+against it. A request matches the fixture recorded for its exact path and query
+first, then the one recorded for its path alone. In record mode, Jikan requests
+without a fixture are forwarded to the public API and their responses saved.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+# URL prefix of each service on the stub, and the upstream it stands in for
+SERVICES = {
+    "jikan": "https://api.jikan.moe",
+    "tracemoe": "https://api.trace.moe",
+    "tavily": "https://api.tavily.com",
+}
+
+
+def fixture_key(path: str, query: str = "") -> str:
+    """Normalizes a request target so the order of query parameters does not matter."""
+    params = sorted(parse_qsl(query, keep_blank_values=True))
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+class Fixtures:
+    """Recorded responses of one service, keyed by request target.
+
+    Attributes:
+        service: Service name, also the fixture file name
+        responses: Response bodies by fixture_key()
+    """
+
+    def __init__(self, service: str, directory: str = FIXTURES) -> None:
+        self.service = service
+        self.path = os.path.join(directory, f"{service}.json")
+        self._lock = threading.Lock()
+        self.responses: Dict[str, Any] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.responses = json.load(f)
+
+    def find(self, path: str, query: str) -> Optional[Any]:
+        with self._lock:
+            exact = self.responses.get(fixture_key(path, query))
+            return exact if exact is not None else self.responses.get(path)
+
+    def record(self, path: str, query: str, body: Any) -> None:
+        with self._lock:
+            self.responses[fixture_key(path, query)] = body
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(
+                    self.responses, f, indent=1, sort_keys=True, ensure_ascii=False
+                )
+
+
+class StubServer:
+    """Threaded HTTP server replaying fixtures, with per-service request counts.
+
+    Attributes:
+        latency: Seconds each response is delayed by, to stand in for the network
+        record: Forward Jikan requests without a fixture upstream and save them
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        record: bool = False,
+        directory: str = FIXTURES,
+    ) -> None:
+        self.latency = latency
+        self.record = record
+        self.fixtures = {name: Fixtures(name, directory) for name in SERVICES}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables pointing the agent's clients at this server."""
+        return {
+            "JIKAN_BASE_URL": f"{self.url}/jikan/v4",
+            "TRACE_MOE_URL": f"{self.url}/tracemoe/search",
+        }
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="benchmark-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats.clear()
+
+    def _count(self, service: str, status: int, sent: int) -> None:
+        with self._lock:
+            stats = self.stats.setdefault(
+                service, {"requests": 0, "bytes": 0, "missing": 0}
+            )
+            stats["requests"] += 1
+            stats["bytes"] += sent
+            stats["missing"] += status == 404
+
+    def respond(self, method: str, target: str) -> Tuple[str, int, bytes]:
+        """Looks up the response for a request on the stub."""
+        parts = urlsplit(target)
+        service, _, path = parts.path.lstrip("/").partition("/")
+        if service not in self.fixtures:
+            return service, 404, b'{"error": "unknown service"}'
+        path = "/" + path
+        body = self.fixtures[service].find(path, parts.query)
+        if body is None and self.record and service == "jikan" and method == "GET":
+            body = self._fetch(SERVICES[service] + path, parts.query)
+            if body is not None:
+                self.fixtures[service].record(path, parts.query, body)
+        if body is None:
+            error = {
+                "status": 404,
+                "type": "BadResponseException",
+                "message": f"No fixture recorded for {method} {path}",
+            }
+            return service, 404, json.dumps(error).encode()
+        return service, 200, json.dumps(body).encode()
+
+    @staticmethod
+    def _fetch(url: str, query: str) -> Optional[Any]:
+        try:
+            with urllib.request.urlopen(f"{url}?{query}" if query else url) as r:
+                return json.loads(r.read())
+        except urllib.error.URLError:
+            return None
+
+    def _handler(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                service, status, payload = stub.respond(self.command, self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                stub._count(service, status, len(payload))
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
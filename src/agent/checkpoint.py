@@ -0,0 +1,401 @@
+"""
+MongoDB checkpoint storage for the agent.
+The upstream MongoDBSaver only implements the synchronous checkpointer interface and
+stores every checkpoint of every thread forever, uncompressed. MongoCheckpointSaver
+adds the async interface and keeps storage bounded: serialized state is compressed
+with zstd, only the latest checkpoints of each thread are retained, abandoned threads
+expire through TTL indexes, and the thread/checkpoint indexes are always ensured.
+
+Environment:
+    CHECKPOINT_KEEP: Checkpoints retained per thread, 0 keeps all (default 10)
+    CHECKPOINT_TTL_DAYS: Days without activity before a thread expires, 0 never (default 90)
+
+Usage (migrates and prunes existing data):
+    python -m src.agent.checkpoint compact [--keep 10] [--dry-run]
+"""
+
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+from datetime import datetime, timezone
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+)
+from langgraph.checkpoint.mongodb import MongoDBSaver
+from langgraph.checkpoint.mongodb.utils import dumps_metadata
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+from .metrics import observe_checkpoint
+import argparse
+import asyncio
+import functools
+import os
+import time
+import zstandard
+
+KEEP = int(os.getenv("CHECKPOINT_KEEP", "10"))
+TTL_DAYS = float(os.getenv("CHECKPOINT_TTL_DAYS", "90"))
+
+# Prefix marking compressed payloads in the 'type' field; older documents without it
+# are still read as-is
+COMPRESSED_PREFIX = "zstd+"
+# Payloads smaller than this are not worth a compression frame
+MIN_COMPRESS_BYTES = 256
+# Index options MongoDB reports when an index exists with different options
+INDEX_OPTIONS_CONFLICT = 85
+
+
+class CompressedSerializer:
+    """Wraps a checkpoint serializer (msgpack by default) with zstd compression."""
+
+    def __init__(self, serde: SerializerProtocol, level: int = 3) -> None:
+        self.serde = serde
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) < MIN_COMPRESS_BYTES:
+            return type_, data
+        return COMPRESSED_PREFIX + type_, self._compressor.compress(data)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.startswith(COMPRESSED_PREFIX):
+            type_ = type_[len(COMPRESSED_PREFIX) :]
+            payload = self._decompressor.decompress(payload)
+        return self.serde.loads_typed((type_, payload))
+
+
+def ensure_index(collection: Collection, keys: Any, **options: Any) -> None:
+    """Creates an index, or updates its TTL when it exists with another one."""
+    try:
+        collection.create_index(keys, **options)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT or "expireAfterSeconds" not in options:
+            raise
+        # Default index names are derived from the keys, e.g. 'created_at_1'
+        name = "_".join(f"{field}_{direction}" for field, direction in keys)
+        collection.database.command(
+            "collMod",
+            collection.name,
+            index={"name": name, "expireAfterSeconds": options["expireAfterSeconds"]},
+        )
+
+
+class MongoCheckpointSaver(MongoDBSaver):
+    """Compressed, pruned MongoDBSaver whose async methods run the pooled sync client
+    in a worker thread.
+
+    Attributes:
+        keep: Checkpoints retained per thread and namespace (0 keeps all)
+        ttl: Seconds without a new checkpoint before a thread expires (None never)
+    """
+
+    def __init__(
+        self,
+        client: MongoClient,
+        keep: int = KEEP,
+        ttl_days: float = TTL_DAYS,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(client, **kwargs)
+        self.keep = keep
+        # TTL is handled here rather than upstream, which puts created_at in the upsert
+        # filter and so can never match an existing document
+        self.ttl = int(ttl_days * 86400) if ttl_days else None
+        self.serde = CompressedSerializer(self.serde)
+        self.ensure_indexes()
+
+    def ensure_indexes(self) -> None:
+        """Creates the lookup and TTL indexes; safe to call repeatedly."""
+        ensure_index(
+            self.checkpoint_collection,
+            [("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", -1)],
+            unique=True,
+        )
+        ensure_index(
+            self.writes_collection,
+            [
+                ("thread_id", 1),
+                ("checkpoint_ns", 1),
+                ("checkpoint_id", -1),
+                ("task_id", 1),
+                ("idx", 1),
+            ],
+            unique=True,
+        )
+        if self.ttl:
+            for collection in (self.checkpoint_collection, self.writes_collection):
+                ensure_index(
+                    collection,
+                    [("created_at", ASCENDING)],
+                    expireAfterSeconds=self.ttl,
+                )
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        started = time.perf_counter()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        doc = {
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": type_,
+            "checkpoint": serialized_checkpoint,
+            "metadata": dumps_metadata(metadata),
+            "created_at": datetime.now(timezone.utc),
+        }
+        self.checkpoint_collection.update_one(
+            {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            },
+            {"$set": doc},
+            upsert=True,
+        )
+        if self.keep:
+            self.prune(thread_id, checkpoint_ns, self.keep)
+        observe_checkpoint("put", time.perf_counter() - started, thread_id)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        started = time.perf_counter()
+        configurable = config["configurable"]
+        # Only writes that recorded errors/interrupts may replace existing ones
+        set_method = (
+            "$set" if all(w[0] in WRITES_IDX_MAP for w in writes) else "$setOnInsert"
+        )
+        now = datetime.now(timezone.utc)
+        operations = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized_value = self.serde.dumps_typed(value)
+            update: Dict[str, Any] = {
+                set_method: {
+                    "channel": channel,
+                    "type": type_,
+                    "value": serialized_value,
+                }
+            }
+            update.setdefault("$set", {})["created_at"] = now
+            operations.append(
+                UpdateOne(
+                    {
+                        "thread_id": configurable["thread_id"],
+                        "checkpoint_ns": configurable["checkpoint_ns"],
+                        "checkpoint_id": configurable["checkpoint_id"],
+                        "task_id": task_id,
+                        "task_path": task_path,
+                        "idx": WRITES_IDX_MAP.get(channel, idx),
+                    },
+                    update,
+                    upsert=True,
+                )
+            )
+        if operations:
+            self.writes_collection.bulk_write(operations)
+        observe_checkpoint(
+            "put_writes", time.perf_counter() - started, configurable["thread_id"]
+        )
+
+    def prune(self, thread_id: str, checkpoint_ns: str, keep: int) -> int:
+        """Deletes all but the latest `keep` checkpoints (and their writes) of a thread.
+
+        Returns:
+            Number of checkpoints deleted
+        """
+        query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        # Checkpoint IDs are time-ordered, so everything at or below the first one
+        # past the newest `keep` is superseded
+        oldest_kept = list(
+            self.checkpoint_collection.find(query, {"checkpoint_id": 1})
+            .sort("checkpoint_id", DESCENDING)
+            .skip(keep)
+            .limit(1)
+        )
+        if not oldest_kept:
+            return 0
+        stale = {**query, "checkpoint_id": {"$lte": oldest_kept[0]["checkpoint_id"]}}
+        deleted = self.checkpoint_collection.delete_many(stale).deleted_count
+        self.writes_collection.delete_many(stale)
+        return deleted
+
+    def latest_checkpoint_id(
+        self, thread_id: str, checkpoint_ns: str = ""
+    ) -> Optional[str]:
+        """ID of a thread's newest checkpoint, read from the index without its state."""
+        latest = self.checkpoint_collection.find_one(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns},
+            {"checkpoint_id": 1, "_id": 0},
+            sort=[("checkpoint_id", DESCENDING)],
+        )
+        return latest["checkpoint_id"] if latest else None
+
+    async def _in_thread(self, fn: Any, *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._in_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await self._in_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self._in_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self._in_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._in_thread(self.delete_thread, thread_id)
+
+
+def _stored_bytes(collection: Collection) -> int:
+    result = list(
+        collection.aggregate(
+            [{"$group": {"_id": None, "bytes": {"$sum": {"$bsonSize": "$$ROOT"}}}}]
+        )
+    )
+    return result[0]["bytes"] if result else 0
+
+
+def _recompress(
+    collection: Collection, field: str, saver: MongoCheckpointSaver, dry_run: bool
+) -> int:
+    """Re-encodes uncompressed payloads and stamps documents missing created_at."""
+    now = datetime.now(timezone.utc)
+    operations = []
+    query = {
+        "$or": [
+            {"type": {"$not": {"$regex": f"^{COMPRESSED_PREFIX}"}}},
+            {"created_at": {"$exists": False}},
+        ]
+    }
+    for doc in collection.find(query, {"type": 1, field: 1, "created_at": 1}):
+        update: Dict[str, Any] = {}
+        if not doc["type"].startswith(COMPRESSED_PREFIX):
+            value = saver.serde.loads_typed((doc["type"], doc[field]))
+            type_, data = saver.serde.dumps_typed(value)
+            if type_ != doc["type"]:
+                update.update({"type": type_, field: data})
+        if "created_at" not in doc:
+            update["created_at"] = now
+        if update:
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+    if operations and not dry_run:
+        collection.bulk_write(operations)
+    return len(operations)
+
+
+def compact(
+    saver: MongoCheckpointSaver, keep: int = KEEP, dry_run: bool = False
+) -> Dict[str, int]:
+    """Migrates existing checkpoint data to the compact format.
+
+    Prunes every thread to its latest `keep` checkpoints, compresses payloads written
+    before compression was enabled and stamps created_at so the TTL applies to them.
+
+    Returns:
+        Counts of pruned checkpoints and migrated documents, and bytes before/after
+    """
+    checkpoints, writes = saver.checkpoint_collection, saver.writes_collection
+    report = {
+        "bytes_before": _stored_bytes(checkpoints) + _stored_bytes(writes),
+        "pruned": 0,
+    }
+    if keep:
+        threads = checkpoints.aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": {"thread_id": "$thread_id", "ns": "$checkpoint_ns"},
+                        "count": {"$sum": 1},
+                    }
+                },
+                {"$match": {"count": {"$gt": keep}}},
+            ]
+        )
+        for thread in threads:
+            if dry_run:
+                report["pruned"] += thread["count"] - keep
+            else:
+                report["pruned"] += saver.prune(
+                    thread["_id"]["thread_id"], thread["_id"]["ns"], keep
+                )
+    report["checkpoints_migrated"] = _recompress(
+        checkpoints, "checkpoint", saver, dry_run
+    )
+    report["writes_migrated"] = _recompress(writes, "value", saver, dry_run)
+    report["bytes_after"] = _stored_bytes(checkpoints) + _stored_bytes(writes)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage agent checkpoint storage.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact_parser = commands.add_parser(
+        "compact", help="Prune, compress and index existing checkpoints"
+    )
+    compact_parser.add_argument("--keep", type=int, default=KEEP)
+    compact_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from .agent import get_mongo_client
+
+    saver = MongoCheckpointSaver(get_mongo_client(), keep=args.keep)
+    report = compact(saver, keep=args.keep, dry_run=args.dry_run)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Bounded conversation context for the agent.
+Threads grow forever in the checkpointer, but the model only needs recent turns. A
+pre-model hook keeps each request within a token budget: the last few turns are sent
+verbatim, tool results from earlier turns are clipped, and older turns are folded into
+a rolling summary stored in the checkpoint alongside the messages. Only the model
+input is trimmed; the full history stays in the thread.
+
+Environment:
+    CONTEXT_TOKEN_BUDGET: Estimated tokens allowed per model request (default 8000)
+    CONTEXT_KEEP_TURNS: Most recent turns always sent verbatim (default 4)
+    CONTEXT_TOOL_CHARS: Characters kept of tool results from earlier turns (default 600)
+"""
+
+from typing import Any, Deque, Dict, List, Optional, Sequence
+from typing_extensions import NotRequired
+from collections import deque
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.prebuilt.chat_agent_executor import AgentState
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+TOOL_CHARS = int(os.getenv("CONTEXT_TOOL_CHARS", "600"))
+# Rough characters-per-token ratio, as used for tool payloads
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and
+Weeaboo-Buddy, an anime and manga assistant. Update the summary with the new messages
+below. Keep the user's name, tastes, watch history, requests and any MyAnimeList IDs
+or facts the assistant found that may matter later. Drop pleasantries and raw data.
+Answer with the updated summary only, in at most 200 words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}"""
+
+
+class ContextState(AgentState):
+    """Agent state with the rolling summary of turns no longer sent verbatim.
+
+    Attributes:
+        summary: Summary of every message up to and including summary_until
+        summary_until: ID of the last message folded into the summary
+        context_tokens: Estimated tokens of the last model request
+    """
+
+    summary: NotRequired[str]
+    summary_until: NotRequired[Optional[str]]
+    context_tokens: NotRequired[int]
+
+
+def _content_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return json.dumps(content, default=str)
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Estimates the tokens a list of messages costs, tool calls included."""
+    chars = 0
+    for message in messages:
+        chars += len(_content_text(message))
+        for call in getattr(message, "tool_calls", None) or []:
+            chars += len(json.dumps(call.get("args", {}), default=str))
+    return chars // CHARS_PER_TOKEN
+
+
+def _turn_starts(messages: Sequence[BaseMessage]) -> List[int]:
+    """Indices of the messages that open a turn (the user's messages)."""
+    return [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+
+
+def _clip(message: BaseMessage, limit: int) -> BaseMessage:
+    """Shortens a tool result, keeping its ID so the history still lines up."""
+    text = _content_text(message)
+    if len(text) <= limit:
+        return message
+    clipped = f"{text[:limit]}… [{len(text) - limit} characters omitted]"
+    return message.model_copy(update={"content": clipped})
+
+
+def _transcript(messages: Sequence[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        text = _content_text(message)
+        if message.type == "tool":
+            text = text[:TOOL_CHARS]
+        if text:
+            lines.append(f"{message.type}: {text}")
+    return "\n".join(lines)
+
+
+class ContextWindow:
+    """Builds the bounded model input for a thread and tracks its size.
+
+    Attributes:
+        budget: Estimated tokens allowed per model request
+        keep_turns: Most recent turns always sent verbatim
+        tool_chars: Characters kept of tool results from earlier turns
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Any] = None,
+        budget: int = TOKEN_BUDGET,
+        keep_turns: int = KEEP_TURNS,
+        tool_chars: int = TOOL_CHARS,
+    ) -> None:
+        # Summary calls must not show up in the streamed answer
+        self.summarizer = (
+            summarizer.with_config(tags=["nostream"]) if summarizer else None
+        )
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.tool_chars = tool_chars
+        self._lock = threading.Lock()
+        self.requests: Deque[Dict[str, int]] = deque(maxlen=200)
+
+    def _plan(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Splits the unsummarized history into messages to fold and messages to keep."""
+        messages = list(state["messages"])
+        start = 0
+        until = state.get("summary_until")
+        if until is not None:
+            ids = [m.id for m in messages]
+            start = ids.index(until) + 1 if until in ids else 0
+        pending = messages[start:]
+
+        turns = _turn_starts(pending)
+        keep_from = turns[-self.keep_turns] if len(turns) >= self.keep_turns else 0
+        current = turns[-1] if turns else 0
+        kept = [
+            _clip(m, self.tool_chars) if m.type == "tool" and i < current else m
+            for i, m in enumerate(pending)
+        ]
+        fold: List[BaseMessage] = []
+        summary = state.get("summary", "")
+        if estimate_tokens(kept) + len(summary) // CHARS_PER_TOKEN > self.budget:
+            fold, kept = pending[:keep_from], kept[keep_from:]
+        return {"raw": messages, "fold": fold, "kept": kept, "summary": summary}
+
+    def _finish(
+        self, plan: Dict[str, Any], summary: str, folded: bool
+    ) -> Dict[str, Any]:
+        kept = plan["kept"]
+        # Still over budget: drop whole turns from the front, never the current one
+        while estimate_tokens(kept) > self.budget:
+            turns = _turn_starts(kept)
+            if len(turns) < 2:
+                break
+            kept = kept[turns[1] :]
+
+        llm_input: List[BaseMessage] = []
+        if summary:
+            llm_input.append(
+                SystemMessage(
+                    content=f"Summary of the earlier conversation:\n{summary}"
+                )
+            )
+        llm_input.extend(kept)
+        tokens = estimate_tokens(llm_input)
+        with self._lock:
+            self.requests.append(
+                {
+                    "history_tokens": estimate_tokens(plan["raw"]),
+                    "input_tokens": tokens,
+                    "messages": len(llm_input),
+                }
+            )
+
+        update: Dict[str, Any] = {
+            "llm_input_messages": llm_input,
+            "context_tokens": tokens,
+        }
+        if folded:
+            update["summary"] = summary
+            update["summary_until"] = plan["fold"][-1].id
+        return update
+
+    def _summary_prompt(self, plan: Dict[str, Any]) -> str:
+        return SUMMARY_PROMPT.format(
+            summary=plan["summary"] or "(empty)", messages=_transcript(plan["fold"])
+        )
+
+    def hook(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Pre-model hook: returns the bounded model input and summary updates."""
+        plan = self._plan(state)
+        if not plan["fold"] or self.summarizer is None:
+            return self._finish(plan, plan["summary"], False)
+        try:
+            response = self.summarizer.invoke(self._summary_prompt(plan))
+        except Exception:
+            # Answering matters more than summarizing; retry folding on the next step
+            logger.exception("Failed to summarize conversation context")
+            return self._finish(plan, plan["summary"], False)
+        return self._finish(plan, _content_text(response).strip(), True)
+
+    async def ahook(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Async version of hook."""
+        plan = self._plan(state)
+        if not plan["fold"] or self.summarizer is None:
+            return self._finish(plan, plan["summary"], False)
+        try:
+            response = await self.summarizer.ainvoke(self._summary_prompt(plan))
+        except Exception:
+            logger.exception("Failed to summarize conversation context")
+            return self._finish(plan, plan["summary"], False)
+        return self._finish(plan, _content_text(response).strip(), True)
+
+    def as_hook(self) -> RunnableLambda:
+        """Returns the hook as a runnable for create_react_agent(pre_model_hook=...)."""
+        return RunnableLambda(self.hook, afunc=self.ahook, name="context_window")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns estimated tokens per model request, before and after trimming."""
+        with self._lock:
+            requests = list(self.requests)
+        if not requests:
+            return {"requests": 0, "budget": self.budget}
+        inputs = [r["input_tokens"] for r in requests]
+        history = [r["history_tokens"] for r in requests]
+        return {
+            "requests": len(requests),
+            "budget": self.budget,
+            "input_tokens_avg": sum(inputs) / len(inputs),
+            "input_tokens_max": max(inputs),
+            "history_tokens_avg": sum(history) / len(history),
+            "last": requests[-1],
+        }
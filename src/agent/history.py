@@ -0,0 +1,157 @@
+"""
+Chat history for the Streamlit pages.
+A thread's messages already live in its checkpoints, so the pages read them from the
+checkpointer instead of keeping a second copy in session state. ChatHistory turns the
+latest checkpoint into the user's questions and the assistant's answers and caches
+them per thread until a newer checkpoint appears, so a rerun costs one indexed
+lookup. Only what the checkpointer never sees (turns with memory off, errors, shed
+notices) stays in the session, positioned after the stored messages that preceded
+it. Exports are written on demand, one chunk per message.
+
+Environment:
+    CHAT_WINDOW: Messages shown at once, and per "load earlier" (default 30)
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from .streaming import _text
+import io
+import json
+import os
+import textwrap
+import threading
+
+WINDOW = int(os.getenv("CHAT_WINDOW", "30"))
+
+Entry = Dict[str, Any]
+
+
+def to_entry(message: Any) -> Optional[Entry]:
+    """The chat entry of a stored message, or None for tool calls and results."""
+    if message.type == "human":
+        return {"role": "user", "content": _text(message.content)}
+    if message.type == "ai" and not getattr(message, "tool_calls", None):
+        text = _text(message.content)
+        if text:
+            return {"role": "assistant", "content": text}
+    return None
+
+
+class ChatHistory:
+    """The chat entries of each thread's latest checkpoint, cached per checkpoint.
+
+    Attributes:
+        checkpointer: Checkpointer the agent writes threads to
+        size: Threads kept in the cache
+    """
+
+    def __init__(self, checkpointer: Any, size: int = 256) -> None:
+        self.checkpointer = checkpointer
+        self.size = size
+        self._threads: "OrderedDict[str, Tuple[str, List[Entry]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def messages(self, thread_id: Optional[str]) -> List[Entry]:
+        """A thread's questions and answers, oldest first.
+
+        The list is shared with the cache; callers must not modify it.
+        """
+        if not thread_id:
+            return []
+        # Checkpointers without a cheap lookup of the newest ID load every time
+        latest = getattr(self.checkpointer, "latest_checkpoint_id", None)
+        checkpoint_id = latest(thread_id) if latest else None
+        with self._lock:
+            cached = self._threads.get(thread_id)
+            if cached and checkpoint_id and cached[0] == checkpoint_id:
+                self._threads.move_to_end(thread_id)
+                return cached[1]
+
+        saved = self.checkpointer.get_tuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        )
+        if saved is None:
+            return []
+        stored = saved.checkpoint["channel_values"].get("messages", [])
+        entries = [entry for entry in map(to_entry, stored) if entry]
+        with self._lock:
+            self._threads[thread_id] = (saved.checkpoint["id"], entries)
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.size:
+                self._threads.popitem(last=False)
+        return entries
+
+
+def merge(
+    stored: List[Entry],
+    local: Iterable[Entry],
+    captions: Optional[Dict[int, str]] = None,
+) -> List[Entry]:
+    """Interleaves session-only entries with the stored ones.
+
+    Args:
+        stored: Entries from the checkpointer
+        local: Session-only entries, each with 'after', the number of stored entries
+            before it
+        captions: Captions of stored entries by position
+    """
+    captions = captions or {}
+    merged: List[Entry] = []
+    position = 0
+
+    def take(until: int) -> None:
+        nonlocal position
+        for index in range(position, until):
+            entry = stored[index]
+            merged.append(
+                {**entry, "caption": captions[index]} if index in captions else entry
+            )
+        position = max(position, until)
+
+    for entry in local:
+        take(min(entry.get("after", 0), len(stored)))
+        merged.append(entry)
+    take(len(stored))
+    return merged
+
+
+def _public(entry: Entry) -> Entry:
+    """The exported fields of an entry: the role and content, as always exported."""
+    return {"role": entry["role"], "content": entry["content"]}
+
+
+def export_markdown(entries: Iterable[Entry]) -> Iterator[str]:
+    for entry in entries:
+        yield f"**{entry['role'].title()}**: {entry['content']}\n\n"
+
+
+def export_json(entries: Iterable[Entry]) -> Iterator[str]:
+    """The same document as json.dumps(entries, indent=2), one entry at a time."""
+    separator = "[\n"
+    for entry in entries:
+        yield separator + textwrap.indent(json.dumps(_public(entry), indent=2), "  ")
+        separator = ",\n"
+    yield "[]" if separator == "[\n" else "\n]"
+
+
+def export_ndjson(entries: Iterable[Entry]) -> Iterator[str]:
+    for entry in entries:
+        yield json.dumps(_public(entry), ensure_ascii=False) + "\n"
+
+
+# Format name: (chunk generator, file name, MIME type)
+EXPORTS: Dict[str, Tuple[Callable[[Iterable[Entry]], Iterator[str]], str, str]] = {
+    "Markdown": (export_markdown, "chat_history.md", "text/markdown"),
+    "JSON": (export_json, "chat_history.json", "application/json"),
+    "NDJSON": (export_ndjson, "chat_history.ndjson", "application/x-ndjson"),
+}
+
+
+def export(entries: Iterable[Entry], format: str) -> io.BytesIO:
+    """Writes the entries in an export format, chunk by chunk, to a buffer."""
+    generate = EXPORTS[format][0]
+    buffer = io.BytesIO()
+    for chunk in generate(entries):
+        buffer.write(chunk.encode())
+    buffer.seek(0)
+    return buffer
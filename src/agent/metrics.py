@@ -0,0 +1,562 @@
+"""
+Instrumentation of tool calls, model calls, checkpoint writes and whole turns.
+A LangChain callback handler attached to the agent graph times every tool and model
+call, measures payload sizes and counts errors and throttled (429) responses. The
+observations go into Prometheus-style histograms and counters, labelled by tool or
+model only; the thread each call belonged to is kept in a bounded log of recent
+calls instead, so labels stay low-cardinality. Cache, rate limiter and connection
+counters of the other modules are collected at export time. Metrics are shown on the
+admin page and exported in the Prometheus text format, optionally over HTTP.
+
+Environment:
+    METRICS_PORT: Serve /metrics on this port (default off)
+    METRICS_HOST: Interface /metrics listens on (default 127.0.0.1; 0.0.0.0 for all)
+"""
+
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+PREFIX = "weeaboo_"
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: Any) -> str:
+    """Escapes a label value for the text exposition format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimates a quantile by interpolating within its bucket, like PromQL."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+@dataclass
+class Call:
+    """One instrumented call, kept in the recent-calls log.
+
+    Attributes:
+        kind: 'tool', 'model', 'checkpoint' or 'turn'
+        name: Tool, model or operation name
+        thread_id: Conversation thread the call belonged to
+        seconds: Duration of the call
+        size: Bytes of output (tools) or output tokens (models)
+        error: Error class name if the call failed
+    """
+
+    kind: str
+    name: str
+    thread_id: Optional[str]
+    seconds: float
+    size: int = 0
+    error: Optional[str] = None
+    at: float = field(default_factory=time.time)
+
+
+class Metrics:
+    """Thread-safe registry of histograms and counters plus the recent-calls log."""
+
+    def __init__(self, recent: int = 500) -> None:
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.help: Dict[str, str] = {}
+        self.recent: Deque[Call] = deque(maxlen=recent)
+        # Functions returning {metric name: {labels: value}} read at export time
+        self.collectors: List[Callable[[], Dict[str, Dict[Labels, float]]]] = []
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        help: str = "",
+    ) -> None:
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+            self.help.setdefault(name, help)
+
+    def inc(
+        self,
+        name: str,
+        labels: Optional[Dict[str, str]] = None,
+        value: float = 1,
+        help: str = "",
+    ) -> None:
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            self.help.setdefault(name, help)
+
+    def record(self, call: Call) -> None:
+        with self._lock:
+            self.recent.append(call)
+
+    def summary(self, name: str, label: str) -> List[Dict[str, Any]]:
+        """Count, mean and estimated p50/p95 of a histogram, one row per label value."""
+        with self._lock:
+            series = dict(self.histograms.get(name, {}))
+        rows = []
+        for key, histogram in sorted(series.items()):
+            rows.append(
+                {
+                    label: dict(key).get(label, ""),
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+            )
+        return rows
+
+    def counter(self, name: str) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self.counters.get(name, {}))
+
+    def calls(
+        self, kind: Optional[str] = None, thread_id: Optional[str] = None
+    ) -> List[Call]:
+        """Recent calls, newest first, optionally of one kind or thread."""
+        with self._lock:
+            calls = list(self.recent)
+        return [
+            c
+            for c in reversed(calls)
+            if (kind is None or c.kind == kind)
+            and (thread_id is None or c.thread_id == thread_id)
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.recent.clear()
+
+    def prometheus(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def labels(key: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = [*key, *extra]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            histograms = {n: dict(s) for n, s in self.histograms.items()}
+            counters = {n: dict(s) for n, s in self.counters.items()}
+            help = dict(self.help)
+        for collect in self.collectors:
+            try:
+                for name, series in collect().items():
+                    counters.setdefault(name, {}).update(series)
+            except Exception:
+                logger.exception("Metrics collector failed")
+
+        for name, series in sorted(histograms.items()):
+            full = PREFIX + name
+            if help.get(name):
+                lines.append(f"# HELP {full} {help[name]}")
+            lines.append(f"# TYPE {full} histogram")
+            for key, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f"{full}_bucket{labels(key, (('le', f'{bound:g}'),))} {cumulative}"
+                    )
+                lines.append(
+                    f"{full}_bucket{labels(key, (('le', '+Inf'),))} {histogram.count}"
+                )
+                lines.append(f"{full}_sum{labels(key)} {histogram.sum:.6g}")
+                lines.append(f"{full}_count{labels(key)} {histogram.count}")
+        for name, series in sorted(counters.items()):
+            full = PREFIX + name
+            if help.get(name):
+                lines.append(f"# HELP {full} {help[name]}")
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {full} {kind}")
+            for key, value in sorted(series.items()):
+                lines.append(f"{full}{labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _size(value: Any) -> int:
+    """Bytes of a tool output as it is sent to the model."""
+    content = getattr(value, "content", value)
+    if isinstance(content, (bytes, str)):
+        return len(content.encode() if isinstance(content, str) else content)
+    return len(json.dumps(content, default=str).encode())
+
+
+def _is_throttled(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429 or "429" in str(error)[:200]
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times tool and model calls of the agent graph and records them in metrics.
+
+    Attach it to the compiled graph with agent.with_config(callbacks=[handler]); the
+    run config passes it down to every model and tool call.
+    """
+
+    # Handlers run inline instead of in an executor, even in async runs
+    run_inline = True
+
+    def __init__(self, registry: Metrics = metrics) -> None:
+        self.metrics = registry
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str, metadata: Optional[Dict]) -> None:
+        with self._lock:
+            self._runs[run_id] = {
+                "name": name,
+                "thread_id": (metadata or {}).get("thread_id"),
+                "started": time.perf_counter(),
+                "first_token": None,
+            }
+
+    def _finish(self, run_id: UUID) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            run["seconds"] = time.perf_counter() - run["started"]
+        return run
+
+    # --- Tools ---
+
+    def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._start(run_id, name, metadata)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._finish(run_id)
+        if run is None:
+            return
+        size = _size(output)
+        labels = {"tool": run["name"]}
+        self.metrics.observe(
+            "tool_latency_seconds", run["seconds"], labels, help="Tool call latency"
+        )
+        self.metrics.observe(
+            "tool_output_bytes",
+            size,
+            labels,
+            SIZE_BUCKETS,
+            help="Bytes of tool output returned to the model",
+        )
+        self.metrics.inc(
+            "tool_calls_total", {**labels, "status": "ok"}, help="Tool calls"
+        )
+        self.metrics.record(
+            Call("tool", run["name"], run["thread_id"], run["seconds"], size)
+        )
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        run = self._finish(run_id)
+        if run is None:
+            return
+        status = "throttled" if _is_throttled(error) else "error"
+        labels = {"tool": run["name"]}
+        self.metrics.observe("tool_latency_seconds", run["seconds"], labels)
+        self.metrics.inc("tool_calls_total", {**labels, "status": status})
+        self.metrics.record(
+            Call(
+                "tool",
+                run["name"],
+                run["thread_id"],
+                run["seconds"],
+                error=type(error).__name__,
+            )
+        )
+
+    # --- Models ---
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        params = kwargs.get("invocation_params") or {}
+        name = (
+            params.get("model")
+            or params.get("model_name")
+            or (metadata or {}).get("ls_model_name")
+            or (serialized or {}).get("name")
+            or "model"
+        )
+        self._start(run_id, str(name).removeprefix("models/"), metadata)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None and run["first_token"] is None and token:
+                run["first_token"] = time.perf_counter() - run["started"]
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._finish(run_id)
+        if run is None:
+            return
+        labels = {"model": run["name"]}
+        self.metrics.observe(
+            "model_latency_seconds", run["seconds"], labels, help="Model call latency"
+        )
+        if run["first_token"] is not None:
+            self.metrics.observe(
+                "model_ttft_seconds",
+                run["first_token"],
+                labels,
+                help="Time to the first streamed token of a model call",
+            )
+        self.metrics.inc(
+            "model_calls_total", {**labels, "status": "ok"}, help="Model calls"
+        )
+        output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    self.metrics.inc(
+                        "model_tokens_total",
+                        {**labels, "direction": "input"},
+                        usage.get("input_tokens", 0),
+                        help="Tokens reported by the model",
+                    )
+                    self.metrics.inc(
+                        "model_tokens_total",
+                        {**labels, "direction": "output"},
+                        usage.get("output_tokens", 0),
+                    )
+                    output_tokens += usage.get("output_tokens", 0)
+        self.metrics.record(
+            Call("model", run["name"], run["thread_id"], run["seconds"], output_tokens)
+        )
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        run = self._finish(run_id)
+        if run is None:
+            return
+        status = "throttled" if _is_throttled(error) else "error"
+        labels = {"model": run["name"]}
+        self.metrics.observe("model_latency_seconds", run["seconds"], labels)
+        self.metrics.inc("model_calls_total", {**labels, "status": status})
+        self.metrics.record(
+            Call(
+                "model",
+                run["name"],
+                run["thread_id"],
+                run["seconds"],
+                error=type(error).__name__,
+            )
+        )
+
+
+# Shared handler attached to every agent graph and direct answer
+handler = MetricsCallbackHandler()
+
+
+def observe_checkpoint(op: str, seconds: float, thread_id: Optional[str]) -> None:
+    """Records one checkpoint write ('put' or 'put_writes')."""
+    labels = {"op": op}
+    metrics.observe(
+        "checkpoint_latency_seconds", seconds, labels, help="Checkpoint write latency"
+    )
+    metrics.record(Call("checkpoint", op, thread_id, seconds))
+
+
+def observe_turn(
+    seconds: float,
+    ttft: Optional[float],
+    route: str,
+    thread_id: Optional[str],
+) -> None:
+    """Records one finished turn, by how it was answered."""
+    labels = {"route": route}
+    metrics.observe("turn_latency_seconds", seconds, labels, help="Turn latency")
+    if ttft is not None:
+        metrics.observe(
+            "turn_ttft_seconds", ttft, labels, help="Time to the first answer token"
+        )
+    metrics.record(Call("turn", route, thread_id, seconds))
+
+
+def _flatten(
+    prefix: str, stats: Dict[str, Any], labels: Labels = ()
+) -> Dict[str, Dict[Labels, float]]:
+    """Turns a nested stats dict of numbers into gauge series."""
+    series: Dict[str, Dict[Labels, float]] = {}
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        series.setdefault(f"{prefix}_{key}", {})[labels] = value
+    return series
+
+
+def _collect_upstream() -> Dict[str, Dict[Labels, float]]:
+    from .tools import ratelimit
+    from .tools.client import cache
+    from .tools.tracemoe import scene_cache
+    from .tools.warmer import get_warmer
+    from .tools.websearch import search_stats
+    from . import transport
+
+    series: Dict[str, Dict[Labels, float]] = {}
+    jikan = cache.stats()
+    series.update(_flatten("jikan_cache", jikan))
+    lookups: Dict[Labels, float] = {}
+    for endpoint, counts in jikan.get("endpoints", {}).items():
+        for result, value in counts.items():
+            lookups[(("endpoint", endpoint), ("result", result))] = value
+    series["jikan_cache_lookups_total"] = lookups
+    limits = ratelimit.stats()
+    series["jikan_throttled_total"] = {(): limits.get("rate_limited", 0)}
+    series["jikan_retries_total"] = {(): limits.get("retries", 0)}
+    series["jikan_failed_total"] = {(): limits.get("failed", 0)}
+    series["scene_cache_lookups_total"] = {
+        (("result", k),): v for k, v in scene_cache.stats.items()
+    }
+    warm = get_warmer().report()
+    series["jikan_warm_lookups_total"] = {
+        (("result", "hit"),): warm["warm_hits"],
+        (("result", "miss"),): warm["warm_misses"],
+    }
+    series["jikan_warm_refreshes_total"] = {
+        (("status", "ok"),): warm["refreshes"],
+        (("status", "error"),): warm["failures"],
+        (("status", "skipped"),): warm["skipped"],
+    }
+    web = search_stats.snapshot()
+    series["web_search_cache_lookups_total"] = {
+        (("result", k),): v for k, v in web["cache"].items()
+    }
+    series["web_search_escalations_total"] = {(): web["escalations"]}
+    reuse = transport.stats()
+    for mode in ("sync", "async"):
+        for host, counts in reuse[mode].items():
+            labels = (("host", host), ("mode", mode))
+            for key in ("requests", "connections"):
+                series.setdefault(f"http_{key}_total", {})[labels] = counts[key]
+    return series
+
+
+metrics.collectors.append(_collect_upstream)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_server(
+    port: Optional[int] = None, host: Optional[str] = None
+) -> Optional[ThreadingHTTPServer]:
+    """Serves /metrics for Prometheus on METRICS_HOST:METRICS_PORT (or host:port), once
+    per process. Only the local interface listens unless a host is configured.
+
+    Returns:
+        The server, or None when no port is configured
+    """
+    global _server
+    port = port or (int(METRICS_PORT) if METRICS_PORT else None)
+    if port is None:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(
+                (host or METRICS_HOST, port), _MetricsRequestHandler
+            )
+            _server.daemon_threads = True
+            threading.Thread(
+                target=_server.serve_forever, name="metrics", daemon=True
+            ).start()
+        return _server
@@ -0,0 +1,322 @@
+"""
+Local intent router in front of the agent.
+Obvious questions are recognised with rules, without a model call. Some can be
+answered straight from one tool call plus a single formatting call with no tools
+bound: the schedule for a day, the current, upcoming or a named season, a plain top
+list, or a title the local catalog knows for certain. Others run the agent with only
+the tools their intent needs, so fewer tool schemas go into every request. Anything
+else, and anything that refers back to the conversation, takes the full agent.
+"""
+
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from .semantic_cache import is_contextual, key_terms, stem
+from .tools.catalog import get_catalog
+import json
+import re
+import threading
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+SEASONS = {"winter": "winter", "spring": "spring", "summer": "summer"}
+SEASONS.update(fall="fall", autumn="fall")
+# Catalog similarity above which a title lookup skips the search step
+TITLE_SIMILARITY = 0.9
+# Upper bound of a "top N" list Jikan returns in one page
+TOP_LIMIT = 25
+# Jikan's schedule days are Japanese broadcast days; Japan has no daylight saving
+JST = timezone(timedelta(hours=9), "JST")
+
+# Tools bound for each intent that still needs the agent to plan
+LOOKUP_TOOLS = (
+    "catalog_search",
+    "jikan_search",
+    "jikan_anime",
+    "jikan_manga",
+    "jikan_characters",
+    "jikan_people",
+    "jikan_batch",
+    "jikan_full_profile",
+    "tavily_search",
+)
+INTENT_TOOLS: Dict[str, Tuple[str, ...]] = {
+    "schedule": ("jikan_schedules", "jikan_fetch_all", "jikan_batch", "catalog_search"),
+    "season": (
+        "jikan_seasons",
+        "jikan_season_history",
+        "jikan_fetch_all",
+        "jikan_genres",
+        "jikan_batch",
+    ),
+    "top": (
+        "jikan_top",
+        "jikan_search",
+        "jikan_genres",
+        "jikan_fetch_all",
+        "jikan_batch",
+        "catalog_search",
+    ),
+    "lookup": LOOKUP_TOOLS,
+}
+
+FORMAT_PROMPT = """
+    **Answering from tool data:**
+    * The data below was already fetched for the user's question with the {tool} tool.
+    * Answer from this data only; do not say that you called a tool.
+    """
+
+_SCHEDULE = re.compile(
+    r"\b(air|airs|airing|schedule|scheduled|broadcast|broadcasts|releas\w*|"
+    r"come out|comes out|coming out|new episodes?)\b"
+)
+_CURRENT = re.compile(
+    r"\b(this|current|ongoing)\s+season\b|\bseason(al)?\s+(anime|line-?up|chart)\b"
+    r"|\bairing\s+(right\s+)?now\b|\bcurrently\s+airing\b|\bwhat'?s\s+airing\b"
+)
+_UPCOMING = re.compile(r"\b(next|upcoming|coming)\s+season\b")
+_NAMED = re.compile(r"\b(winter|spring|summer|fall|autumn)\s+(?:of\s+)?(\d{4})\b")
+_TOP = re.compile(
+    r"\b(top|best|highest[- ]rated|most\s+popular|most\s+favou?rited|greatest)\b"
+)
+_LOOKUP = re.compile(
+    r"^\s*(?:tell me about|what is|what's|whats|who is|who's|info(?:rmation)? "
+    r"(?:on|about)|details (?:on|about)|synopsis of|summary of|look up)\s+"
+    r"(?:the\s+)?(?:(anime|manga|series|show)\s+)?(.+?)[\s?.!]*$"
+)
+
+# Words a question may contain and still be served by the intent's direct call
+_VOCABULARY = frozenset(
+    stem(w)
+    for w in (
+        "air airs airing aired schedule scheduled broadcast broadcasts release "
+        "releases releasing released come comes coming out new episode episodes "
+        "season seasonal seasons lineup line-up line up chart ongoing next "
+        "upcoming top best highest rated highest-rated most popular favorited "
+        "favourited favorite favourite greatest ever time ranked ranking mal "
+        "myanimelist manga character characters people voice actor actors seiyuu "
+        "movie movies tv on tonight tomorrow week airs winter spring summer fall "
+        "autumn "
+    ).split()
+    + list(DAYS)
+)
+
+
+@dataclass
+class Route:
+    """How one turn is answered.
+
+    Attributes:
+        intent: Recognised intent ('schedule', 'season', 'top', 'lookup' or 'general')
+        tools: Names of the tools to bind; None binds all of them
+        call: Tool name and arguments that answer the question directly, if any
+    """
+
+    intent: str
+    tools: Optional[Tuple[str, ...]] = None
+    call: Optional[Tuple[str, Dict[str, Any]]] = None
+
+
+def _day(question: str, now: datetime) -> Optional[str]:
+    words = re.findall(r"[a-z]+", question)
+    for day in DAYS:
+        if day in words or f"{day}s" in words:
+            return day
+    if "today" in words or "tonight" in words:
+        return DAYS[now.weekday()]
+    if "tomorrow" in words:
+        return DAYS[(now + timedelta(days=1)).weekday()]
+    return None
+
+
+def _extra_terms(question: str, allowed: FrozenSet[str] = frozenset()) -> set:
+    """Content words the direct call of an intent would not account for."""
+    return {
+        term
+        for term in key_terms(question)
+        if term not in _VOCABULARY and term not in allowed and not term.isdigit()
+    }
+
+
+def _top_call(question: str) -> Tuple[str, Dict[str, Any]]:
+    kind = "anime"
+    if re.search(r"\bmanga\b", question):
+        kind = "manga"
+    elif re.search(r"\bcharacters?\b", question):
+        kind = "characters"
+    elif re.search(r"\b(people|voice actors?|seiyuu)\b", question):
+        kind = "people"
+    parameters: Dict[str, Any] = {}
+    if kind in ("anime", "manga"):
+        if re.search(r"\bmost\s+popular\b", question):
+            parameters["filter"] = "bypopularity"
+        elif re.search(r"\bfavou?rite", question):
+            parameters["filter"] = "favorite"
+        elif re.search(r"\bupcoming\b", question):
+            parameters["filter"] = "upcoming"
+        elif re.search(r"\b(airing|publishing)\b", question):
+            parameters["filter"] = "airing" if kind == "anime" else "publishing"
+        if kind == "anime" and re.search(r"\bmovies?\b", question):
+            parameters["type"] = "movie"
+    limit = re.search(r"\btop\s+(\d{1,2})\b", question)
+    if limit:
+        parameters["limit"] = min(int(limit.group(1)), TOP_LIMIT)
+    return "jikan_top", {"type": kind, "parameters": parameters or None}
+
+
+def _lookup_call(title: str, kind: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Fetches a title directly when the local catalog knows it for certain."""
+    results = get_catalog().search(title, kind, limit=2)
+    if not results or results[0]["similarity"] < TITLE_SIMILARITY:
+        return None
+    # Two near-equal matches (a sequel, a remake) need the agent to pick one
+    if len(results) > 1 and results[1]["similarity"] >= TITLE_SIMILARITY:
+        return None
+    return "jikan_full_profile", {"type": kind, "id": results[0]["mal_id"]}
+
+
+def classify(question: str, now: Optional[datetime] = None) -> Route:
+    """Recognises the intent of a question with local rules.
+
+    Args:
+        question: The user's message
+        now: Current time, for 'today' and 'tomorrow' (default now in JST, the
+            timezone of Jikan's broadcast days)
+
+    Returns:
+        The Route to answer it with
+    """
+    text = question.lower().strip()
+    lookup = _LOOKUP.match(text)
+    # The direct call sees no history, and subsets may miss what a follow-up needs;
+    # "tell me about ..." itself does not refer to the user
+    if not text or is_contextual(lookup.group(2) if lookup else text):
+        return Route("general")
+    now = now or datetime.now(JST)
+
+    day = _day(text, now)
+    if day is not None and _SCHEDULE.search(text):
+        if _extra_terms(text, frozenset({"today", "day"})):
+            return Route("schedule", INTENT_TOOLS["schedule"])
+        return Route(
+            "schedule", INTENT_TOOLS["schedule"], ("jikan_schedules", {"day": day})
+        )
+
+    named = _NAMED.search(text)
+    if named or _CURRENT.search(text) or _UPCOMING.search(text):
+        if named:
+            arguments: Dict[str, Any] = {
+                "year": int(named.group(2)),
+                "season": SEASONS[named.group(1)],
+            }
+        else:
+            arguments = {"extension": "upcoming" if _UPCOMING.search(text) else "now"}
+        if _TOP.search(text) or _extra_terms(text):
+            return Route("season", INTENT_TOOLS["season"])
+        return Route("season", INTENT_TOOLS["season"], ("jikan_seasons", arguments))
+
+    if _TOP.search(text):
+        if _extra_terms(text):
+            return Route("top", INTENT_TOOLS["top"])
+        return Route("top", INTENT_TOOLS["top"], _top_call(text))
+
+    if lookup:
+        kind = "manga" if lookup.group(1) == "manga" else "anime"
+        title = lookup.group(2)
+        call = _lookup_call(title, kind) if len(title) >= 3 else None
+        return Route("lookup", INTENT_TOOLS["lookup"], call)
+    return Route("general")
+
+
+def _schema_tokens(tool: BaseTool) -> int:
+    return len(json.dumps(convert_to_openai_tool(tool))) // 4
+
+
+class IntentRouter:
+    """Routes turns to a direct tool call, an agent with fewer tools, or the full agent.
+
+    Attributes:
+        tools: Every tool the full agent binds, by name
+        prompt: System prompt used for direct answers
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        tools: Sequence[BaseTool],
+        agent_for: Callable[[Optional[Sequence[str]]], Any],
+        prompt: str,
+        callbacks: Optional[List[Any]] = None,
+    ) -> None:
+        # The formatting call streams through the model directly, not through a graph
+        self.model = model
+        self.tools = {tool.name: tool for tool in tools}
+        self.agent_for = agent_for
+        self.prompt = prompt
+        self.callbacks = callbacks or []
+        self._lock = threading.Lock()
+        self._schema = {name: _schema_tokens(t) for name, t in self.tools.items()}
+        self.counts: Counter = Counter()
+        self.schema_tokens_saved = 0
+
+    def route(self, question: str) -> Route:
+        """Classifies a question, keeping only routes whose tools are available."""
+        try:
+            route = classify(question)
+        except Exception:
+            # The catalog is an optimisation; without it the full agent still answers
+            route = Route("general")
+        if route.call is not None and route.call[0] not in self.tools:
+            route.call = None
+        if route.tools is not None:
+            route.tools = tuple(name for name in route.tools if name in self.tools)
+        mode = "direct" if route.call else "subset" if route.tools else "full"
+        with self._lock:
+            self.counts[f"{route.intent}:{mode}"] += 1
+            if route.tools and not route.call:
+                bound = sum(self._schema[name] for name in route.tools)
+                self.schema_tokens_saved += sum(self._schema.values()) - bound
+        return route
+
+    def agent(self, route: Route) -> Any:
+        """Returns the agent bound to the route's tools."""
+        return self.agent_for(route.tools)
+
+    def run_config(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Config for direct calls, so callbacks see them like the agent's calls."""
+        thread_id = config.get("configurable", {}).get("thread_id")
+        return {"callbacks": self.callbacks, "metadata": {"thread_id": thread_id}}
+
+    async def call(self, route: Route, config: Dict[str, Any]) -> Any:
+        """Runs the route's direct tool call."""
+        name, arguments = route.call
+        return await self.tools[name].ainvoke(arguments, self.run_config(config))
+
+    def format_input(
+        self, question: str, route: Route, result: Any
+    ) -> List[BaseMessage]:
+        """Builds the single model request that turns tool data into the answer."""
+        data = json.dumps(result, default=str, ensure_ascii=False)
+        return [
+            SystemMessage(
+                content=self.prompt + FORMAT_PROMPT.format(tool=route.call[0])
+            ),
+            HumanMessage(content=f"{question}\n\nData:\n{data}"),
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns turns per intent and route, and tool schema tokens saved."""
+        with self._lock:
+            counts = dict(self.counts)
+        turns = sum(counts.values())
+        direct = sum(n for key, n in counts.items() if key.endswith(":direct"))
+        return {
+            "turns": turns,
+            "routes": counts,
+            "direct_ratio": direct / turns if turns else 0.0,
+            "schema_tokens_full": sum(self._schema.values()),
+            "schema_tokens_saved": self.schema_tokens_saved,
+        }
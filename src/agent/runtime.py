@@ -0,0 +1,80 @@
+"""
+Background event loop for the agent's async entry points.
+Streamlit scripts and the CLI are synchronous, so they hand coroutines and async
+iterators to one long-lived loop. Keeping a single loop lets pooled async clients
+(e.g., the aiohttp session behind the async Jikan tools) be reused across turns.
+"""
+
+from typing import Any, AsyncIterable, Coroutine, Iterator, Optional, TypeVar
+import asyncio
+import threading
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Returns the runtime event loop, starting its thread on first use."""
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_loop.run_forever, name="agent-runtime", daemon=True
+            )
+            _thread.start()
+        return _loop
+
+
+def run(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """Runs a coroutine on the runtime loop and blocks until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+
+def iterate(aiterable: AsyncIterable[T]) -> Iterator[T]:
+    """Consumes an async iterable on the runtime loop from synchronous code.
+
+    Args:
+        aiterable: Async iterable to drain (e.g., agent.astream(...))
+
+    Yields:
+        Each item as soon as the runtime loop produces it
+    """
+    iterator = aiterable.__aiter__()
+
+    async def next_item() -> T:
+        return await iterator.__anext__()
+
+    try:
+        while True:
+            try:
+                yield run(next_item())
+            except StopAsyncIteration:
+                return
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            run(aclose())
+
+
+def shutdown() -> None:
+    """Closes async clients and stops the runtime loop."""
+    global _loop, _thread
+    from .tools.client import aclose_aio_jikan
+    from .transport import aclose_aio_sessions, close_sessions
+
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+    close_sessions()
+    if loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(aclose_aio_jikan(), loop).result(10)
+    asyncio.run_coroutine_threadsafe(aclose_aio_sessions(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    if thread is not None:
+        thread.join(10)
+    loop.close()
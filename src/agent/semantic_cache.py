@@ -0,0 +1,207 @@
+"""
+Semantic answer cache for recurring questions.
+Questions are embedded offline with a hashing vectorizer (word and character n-grams
+hashed into a fixed-size vector), so no model or network call is needed. The nearest
+cached question above a similarity threshold, with the same key terms, serves its
+answer directly. Answers expire according to the most time-sensitive tool the
+original turn used, and turns that depend on the user or the conversation are never
+cached.
+
+Environment:
+    SEMANTIC_CACHE_THRESHOLD: Minimum cosine similarity for a hit (default 0.8)
+    SEMANTIC_CACHE_SIZE: Answers kept in memory (default 1000)
+"""
+
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+from dataclasses import dataclass
+from .tools.cache import DAY, DEFAULT_TTL, DEFAULT_TTLS, HOUR
+import numpy as np
+import os
+import re
+import threading
+import time
+import zlib
+
+THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+DIMENSIONS = 2**11
+
+# Answer lifetimes for tools that are not plain Jikan endpoints; 0 means never cache
+TOOL_TTLS: Dict[str, int] = {
+    "catalog_search": 7 * DAY,
+    "jikan_batch": DEFAULT_TTLS["anime"],
+    "jikan_full_profile": DEFAULT_TTLS["anime"],
+    "jikan_fetch_all": HOUR,
+    "jikan_random": 0,
+    "jikan_users": 0,
+    "jikan_user_analytics": 0,
+    "jikan_user_by_id": 0,
+    "trace_moe_search": 0,
+    "tavily_search": 6 * HOUR,
+}
+# Lifetime of answers that needed no tool at all
+NO_TOOL_TTL = DAY
+
+STOPWORDS = frozenset(
+    "a an the of in on at for to from by with about and or is are was were be been "
+    "do does did can could would should will me my i you your we our us please "
+    "what whats what's which who whos who's whom when where why how there "
+    "this that these those tell show give list find get know some any all "
+    "anime animes series show shows currently current right now today's".split()
+)
+# Words that point back into the conversation or at the user
+CONTEXTUAL = frozenset(
+    "it its they them those he she him her his hers their more another else again "
+    "previous above earlier same i me my mine".split()
+)
+
+
+def words(text: str) -> List[str]:
+    return re.findall(r"[\w']+", text.lower())
+
+
+def stem(word: str) -> str:
+    """Strips a plural 's', so 'movies' and 'movie' count as one term."""
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def key_terms(text: str) -> FrozenSet[str]:
+    """Content words that must match exactly, e.g. 'manga', 'luffy' or '2024'."""
+    return frozenset(stem(w) for w in words(text) if w not in STOPWORDS)
+
+
+def embed(text: str) -> np.ndarray:
+    """Hashes content-word uni/bigrams and character trigrams into a unit vector.
+
+    Filler words are left out so differently phrased versions of a question land
+    close together; key_terms() keeps apart questions about different things.
+    """
+    tokens = [stem(w) for w in words(text) if w not in STOPWORDS] or words(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    joined = f" {' '.join(tokens)} "
+    features += [joined[i : i + 3] for i in range(len(joined) - 2)]
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for feature in features:
+        h = zlib.crc32(feature.encode())
+        # The sign bit keeps hash collisions from only ever adding up
+        vector[h % DIMENSIONS] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def is_contextual(question: str) -> bool:
+    """Whether a question refers to earlier turns or to the user themselves."""
+    return any(w in CONTEXTUAL for w in words(question))
+
+
+def ttl_for_tools(tools: Iterable[str]) -> int:
+    """Seconds an answer stays fresh, given the tools used to produce it."""
+    ttls = []
+    for name in tools:
+        if name in TOOL_TTLS:
+            ttls.append(TOOL_TTLS[name])
+        elif name.startswith("jikan_"):
+            ttls.append(DEFAULT_TTLS.get(name[len("jikan_") :], DEFAULT_TTL))
+        else:
+            ttls.append(DEFAULT_TTL)
+    return min(ttls) if ttls else NO_TOOL_TTL
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    tools: List[str]
+    terms: FrozenSet[str]
+    expires_at: float
+    hits: int = 0
+
+
+class SemanticCache:
+    """In-memory nearest-neighbour index of answered questions.
+
+    Attributes:
+        threshold: Minimum cosine similarity for a hit
+        max_entries: Answers kept; the least recently used are evicted
+    """
+
+    def __init__(
+        self, threshold: float = THRESHOLD, max_entries: int = MAX_ENTRIES
+    ) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self._entries: List[CachedAnswer] = []
+        self._used: List[float] = []
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0}
+
+    def get(self, question: str) -> Optional[CachedAnswer]:
+        """Returns the cached answer of the most similar fresh question, if any."""
+        if is_contextual(question):
+            return None
+        vector, terms, now = embed(question), key_terms(question), time.time()
+        with self._lock:
+            self._expire(now)
+            if self._entries:
+                scores = self._vectors @ vector
+                for index in np.argsort(scores)[::-1][:5]:
+                    if scores[index] < self.threshold:
+                        break
+                    entry = self._entries[index]
+                    if entry.terms == terms:
+                        entry.hits += 1
+                        self._used[index] = now
+                        self.stats["hits"] += 1
+                        return entry
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, question: str, answer: str, tools: Iterable[str]) -> bool:
+        """Caches an answer unless the question or the tools make it unshareable.
+
+        Returns:
+            True if the answer was cached
+        """
+        tools = list(tools)
+        ttl = ttl_for_tools(tools)
+        if not answer.strip() or ttl <= 0 or is_contextual(question):
+            return False
+        entry = CachedAnswer(
+            question, answer, tools, key_terms(question), time.time() + ttl
+        )
+        with self._lock:
+            self._expire(time.time())
+            if len(self._entries) >= self.max_entries:
+                self._drop([int(np.argmin(self._used))])
+            self._vectors = np.vstack([self._vectors, embed(question)])
+            self._entries.append(entry)
+            self._used.append(time.time())
+            self.stats["stores"] += 1
+        return True
+
+    def _expire(self, now: float) -> None:
+        expired = [i for i, e in enumerate(self._entries) if e.expires_at <= now]
+        if expired:
+            self._drop(expired)
+
+    def _drop(self, indices: List[int]) -> None:
+        keep = sorted(set(range(len(self._entries))) - set(indices))
+        self._vectors = self._vectors[keep]
+        self._entries = [self._entries[i] for i in keep]
+        self._used = [self._used[i] for i in keep]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors = np.zeros((0, DIMENSIONS), dtype=np.float32)
+            self._entries, self._used = [], []
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns hit/miss counts and the size of the index."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+            }
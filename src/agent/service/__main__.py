@@ -0,0 +1,48 @@
+"""
+Runs the agent service as its own process.
+
+Usage:
+    python -m src.agent.service [--host 0.0.0.0] [--port 8700] [--workers 8]
+
+Point the Streamlit app at it with AGENT_SERVICE_URL=http://<host>:<port>. Run one
+service per core (on different ports) to spread turns across cores.
+"""
+
+from ..agent import get_agent, run_turn, shutdown_agent
+from ..metrics import metrics
+from .. import runtime
+from .jobs import WORKERS, AgentService
+from .server import serve
+import argparse
+import threading
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve agent turns over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument(
+        "--workers", type=int, default=WORKERS, help="Turns run concurrently"
+    )
+    args = parser.parse_args()
+
+    # Build the graph before accepting turns, not on the first one
+    get_agent()
+    service = AgentService(run_turn, workers=args.workers).start(runtime.get_loop())
+    metrics.collectors.append(service.collect)
+    server = serve(service, args.host, args.port)
+    print(f"Agent service on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        # shutdown_agent only stops the app's own service; finish this one's workers
+        # and running turns before the runtime loop and the sessions close
+        runtime.run(service.stop(), timeout=10)
+        shutdown_agent()
+
+
+if __name__ == "__main__":
+    main()
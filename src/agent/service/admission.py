@@ -0,0 +1,158 @@
+"""
+Admission control for the agent service's job queue.
+Queued turns are grouped by user and dispatched round-robin across users, so one
+user sending many questions cannot starve the others. Each user may have a limited
+number of turns running and waiting at once, and the queue as a whole is bounded:
+turns beyond those limits are shed with a message the chat page can show, instead
+of piling up and slowing everyone down.
+
+Environment:
+    AGENT_QUEUE_SIZE: Turns waiting across all users (default 32)
+    AGENT_USER_RUNNING: Turns running at once per user (default 1)
+    AGENT_USER_QUEUED: Turns waiting per user (default 2)
+"""
+
+from typing import Any, Deque, Dict, List, Optional
+from collections import deque
+import os
+
+QUEUE_SIZE = int(os.getenv("AGENT_QUEUE_SIZE", "32"))
+USER_RUNNING = int(os.getenv("AGENT_USER_RUNNING", "1"))
+USER_QUEUED = int(os.getenv("AGENT_USER_QUEUED", "2"))
+
+BUSY_MESSAGE = (
+    "Weeaboo-Buddy is answering a lot of questions right now. "
+    "Please try again in a minute!"
+)
+USER_BUSY_MESSAGE = (
+    "You already have {count} questions waiting for an answer. "
+    "Please wait for those before asking more!"
+)
+
+
+class QueueFull(Exception):
+    """Raised when a turn is shed instead of queued.
+
+    Attributes:
+        reason: 'queue' when the whole queue is full, 'user' when the user's share is
+    """
+
+    def __init__(self, message: str, reason: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+
+def user_key(job: Any) -> str:
+    """Who a job counts against: its user, else its thread, else the job alone."""
+    return job.user or job.thread_id or job.id
+
+
+class FairQueue:
+    """Bounded per-user queues served round-robin, with per-user running limits.
+
+    Not thread-safe; the agent service guards it with its lock.
+
+    Attributes:
+        max_size: Jobs waiting across all users
+        user_running: Jobs running at once per user
+        user_queued: Jobs waiting per user
+    """
+
+    def __init__(
+        self,
+        max_size: int = QUEUE_SIZE,
+        user_running: int = USER_RUNNING,
+        user_queued: int = USER_QUEUED,
+    ) -> None:
+        self.max_size = max_size
+        self.user_running = user_running
+        self.user_queued = user_queued
+        self._queues: Dict[str, Deque[Any]] = {}
+        # Users with waiting jobs, in the order they are next served
+        self._turns: Deque[str] = deque()
+        self._running: Dict[str, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, job: Any) -> bool:
+        return job in self._queues.get(user_key(job), ())
+
+    def push(self, job: Any) -> None:
+        """Queues a job behind the user's earlier ones.
+
+        Raises:
+            QueueFull: If the queue or the user's share of it is full
+        """
+        user = user_key(job)
+        queue = self._queues.get(user)
+        waiting = len(queue) if queue else 0
+        if waiting >= self.user_queued:
+            raise QueueFull(USER_BUSY_MESSAGE.format(count=waiting), "user")
+        if self._size >= self.max_size:
+            raise QueueFull(BUSY_MESSAGE, "queue")
+        if queue is None:
+            queue = self._queues[user] = deque()
+            self._turns.append(user)
+        queue.append(job)
+        self._size += 1
+
+    def remove(self, job: Any) -> bool:
+        user = user_key(job)
+        queue = self._queues.get(user)
+        if not queue or job not in queue:
+            return False
+        queue.remove(job)
+        self._size -= 1
+        if not queue:
+            del self._queues[user]
+            self._turns.remove(user)
+        return True
+
+    def pop(self) -> Optional[Any]:
+        """Takes the next job of the first user in turn below their running limit."""
+        for _ in range(len(self._turns)):
+            user = self._turns.popleft()
+            if self._running.get(user, 0) >= self.user_running:
+                self._turns.append(user)
+                continue
+            queue = self._queues[user]
+            job = queue.popleft()
+            self._size -= 1
+            if queue:
+                self._turns.append(user)
+            else:
+                del self._queues[user]
+            self._running[user] = self._running.get(user, 0) + 1
+            return job
+        return None
+
+    def finished(self, job: Any) -> None:
+        """Frees the running slot of a job taken with pop()."""
+        user = user_key(job)
+        running = self._running.get(user, 0) - 1
+        if running > 0:
+            self._running[user] = running
+        else:
+            self._running.pop(user, None)
+
+    def order(self) -> List[Any]:
+        """Waiting jobs in the order they would be dispatched, one per user in turn.
+
+        Users at their running limit are served after the others.
+        """
+        busy = [u for u in self._turns if self._running.get(u, 0) >= self.user_running]
+        free = [u for u in self._turns if u not in busy]
+        queues = [list(self._queues[user]) for user in free + busy]
+        ordered = []
+        for depth in range(max((len(q) for q in queues), default=0)):
+            ordered += [q[depth] for q in queues if depth < len(q)]
+        return ordered
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._size,
+            "waiting_users": len(self._queues),
+            "running_users": len(self._running),
+        }
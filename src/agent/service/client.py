@@ -0,0 +1,89 @@
+"""
+Client for an agent service running in another process.
+Mirrors the AgentService methods the chat page uses (submit, status, follow, cancel
+and stats) over the service's HTTP API, so the page works the same whether turns run
+in-process or on a separate pool of workers.
+"""
+
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlparse
+from ..streaming import StreamEvent
+from ..transport import CONNECT_TIMEOUT, get_session
+from .admission import QueueFull
+from .jobs import event_from_dict
+from .server import HEARTBEAT
+import json
+
+
+class RemoteAgentService:
+    """AgentService interface backed by the service's HTTP API.
+
+    Attributes:
+        url: Root URL of the service, e.g. http://localhost:8700
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.session = get_session(urlparse(self.url).netloc)
+
+    def submit(
+        self,
+        question: str,
+        thread_id: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> str:
+        """Queues a turn on the service.
+
+        Raises:
+            QueueFull: If the service shed the turn
+        """
+        response = self.session.post(
+            f"{self.url}/jobs",
+            json={"question": question, "thread_id": thread_id, "user": user},
+        )
+        if response.status_code == 429:
+            body = response.json()
+            raise QueueFull(body["error"], body["reason"])
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        response = self.session.get(f"{self.url}/jobs/{job_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def position(self, job_id: str) -> Optional[int]:
+        status = self.status(job_id)
+        return status["position"] if status else None
+
+    def follow(self, job_id: str, start: int = 0) -> Iterator[StreamEvent]:
+        """Streams a job's events from start on until it finishes.
+
+        Raises:
+            KeyError: If the service does not know the job
+        """
+        with self.session.get(
+            f"{self.url}/jobs/{job_id}/events",
+            params={"start": start},
+            stream=True,
+            # The service sends a keep-alive line every HEARTBEAT seconds
+            timeout=(CONNECT_TIMEOUT, 3 * HEARTBEAT),
+        ) as response:
+            if response.status_code == 404:
+                raise KeyError(job_id)
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield event_from_dict(json.loads(line))
+
+    def cancel(self, job_id: str) -> bool:
+        response = self.session.delete(f"{self.url}/jobs/{job_id}")
+        response.raise_for_status()
+        return response.json()["cancelled"]
+
+    def stats(self) -> Dict[str, Any]:
+        response = self.session.get(f"{self.url}/stats")
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,480 @@
+"""
+Job queue and worker pool that run agent turns off the Streamlit script thread.
+A turn is submitted as a job and queued; a fixed number of worker tasks on an event
+loop (the most turns in flight at once) take jobs fairly across users and run them
+through astream_turn, buffering the stream events on the job. Waiting jobs get an
+event whenever their place in line changes, and turns over the queue limits are
+shed up front (see admission). Readers attach to a job by id and follow its events from any
+offset, so a page rerun or a reconnect picks the stream up where it left off while
+the turn keeps running. Finished jobs are kept for a while so late readers can still
+collect their answer.
+
+Environment:
+    AGENT_WORKERS: Turns in flight at once per process (default 4)
+    AGENT_JOB_RETENTION: Seconds finished jobs stay readable (default 600)
+"""
+
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+from dataclasses import asdict, dataclass, field
+from langchain_core.messages import BaseMessage, HumanMessage
+from ..metrics import metrics
+from ..streaming import StreamEvent, TurnStats
+from .admission import FairQueue, QueueFull
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("AGENT_WORKERS", "4"))
+RETENTION = float(os.getenv("AGENT_JOB_RETENTION", "600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Runs one turn: (messages, config) -> stream of events, e.g. astream_turn bound to
+# the agent, the answer cache and the router
+TurnRunner = Callable[[List[BaseMessage], Dict[str, Any]], AsyncIterator[StreamEvent]]
+
+
+def event_to_dict(event: StreamEvent) -> Dict[str, Any]:
+    data = asdict(event)
+    if event.stats is not None:
+        # started is a perf_counter reading, meaningless in another process
+        data["stats"].pop("started", None)
+    return data
+
+
+def event_from_dict(data: Dict[str, Any]) -> StreamEvent:
+    stats = data.get("stats")
+    return StreamEvent(
+        kind=data["kind"],
+        text=data.get("text", ""),
+        delta=data.get("delta", ""),
+        stats=TurnStats(**stats) if stats else None,
+    )
+
+
+def _merge_tokens(events: List[StreamEvent]) -> List[StreamEvent]:
+    """Merges each run of token events into its last one, which carries the text."""
+    merged: List[StreamEvent] = []
+    deltas = ""
+    for i, event in enumerate(events):
+        if event.kind == "token":
+            if i + 1 < len(events) and events[i + 1].kind == "token":
+                deltas += event.delta
+                continue
+            if deltas:
+                event = StreamEvent(
+                    "token", text=event.text, delta=deltas + event.delta
+                )
+                deltas = ""
+        merged.append(event)
+    return merged
+
+
+@dataclass(eq=False)
+class Job:
+    """One submitted turn and the events it has streamed so far.
+
+    Attributes:
+        id: Job id readers attach with
+        question: The user's message
+        thread_id: Conversation thread, or None to run without memory
+        user: Who submitted the turn
+        status: 'queued', 'running', 'done', 'failed' or 'cancelled'
+        position: 1-based place in line while queued
+        events: Stream events so far; only the last of a run of tokens keeps its
+            text, since every token event repeats the whole answer so far
+        error: Message of the failure, if any
+    """
+
+    question: str
+    thread_id: Optional[str] = None
+    user: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    position: Optional[int] = None
+    events: List[StreamEvent] = field(default_factory=list)
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        self._changed = threading.Condition()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._task: Optional[asyncio.Task] = None
+        # Set under the service lock by cancel(); a worker that already took the job
+        # but has not started it yet finishes it as cancelled instead
+        self._cancel_requested = False
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": self.thread_id}}
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    def _notify(self) -> None:
+        self._changed.notify_all()
+        for loop, event in self._waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def append(self, event: StreamEvent) -> None:
+        with self._changed:
+            if (
+                event.kind == "token"
+                and self.events
+                and self.events[-1].kind == "token"
+            ):
+                # Drop the superseded copy of the answer; readers that have not
+                # reached the last token yet skip to it (see since())
+                last = self.events[-1]
+                self.events[-1] = StreamEvent("token", delta=last.delta)
+            self.events.append(event)
+            self._notify()
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        with self._changed:
+            self.status = status
+            self.error = error
+            self.finished = time.time()
+            self._notify()
+
+    def since(self, start: int) -> List[StreamEvent]:
+        """Events from index start on, each run of tokens merged into its last one."""
+        with self._changed:
+            return _merge_tokens(self.events[start:])
+
+    def follow(self, start: int = 0, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Yields events from start on as they arrive, until the job finishes.
+
+        Blocks the calling thread between events. With a timeout, None is yielded
+        whenever that many seconds pass without an event (e.g., for keep-alives).
+        """
+        index = start
+        while True:
+            with self._changed:
+                if len(self.events) <= index and not self.done:
+                    self._changed.wait(timeout)
+                # Sliced under the lock: the last token still has its text
+                events, done = self.events[index:], self.done
+            if events:
+                yield from _merge_tokens(events)
+                index += len(events)
+            elif done:
+                return
+            else:
+                yield None
+
+    async def afollow(self, start: int = 0) -> AsyncIterator[StreamEvent]:
+        """Async version of follow() for readers on any event loop."""
+        wakeup = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wakeup)
+        with self._changed:
+            self._waiters.append(waiter)
+        index = start
+        try:
+            while True:
+                with self._changed:
+                    events, done = self.events[index:], self.done
+                    wakeup.clear()
+                if events:
+                    for event in _merge_tokens(events):
+                        yield event
+                    index += len(events)
+                elif done:
+                    return
+                else:
+                    await wakeup.wait()
+        finally:
+            with self._changed:
+                self._waiters.remove(waiter)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "user": self.user,
+            "thread_id": self.thread_id,
+            "events": len(self.events),
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class AgentService:
+    """Queue of agent turns served by a pool of worker tasks on one event loop.
+
+    Attributes:
+        run_turn: Runs one turn and streams its events
+        workers: Number of turns run concurrently
+        retention: Seconds finished jobs stay readable
+        queue: Admission policy for waiting jobs (default limits from the environment)
+    """
+
+    def __init__(
+        self,
+        run_turn: TurnRunner,
+        workers: int = WORKERS,
+        retention: float = RETENTION,
+        queue: Optional[FairQueue] = None,
+    ) -> None:
+        self.run_turn = run_turn
+        self.workers = workers
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._pending = queue if queue is not None else FairQueue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.counts = {
+            "submitted": 0,
+            "rejected": 0,
+            DONE: 0,
+            FAILED: 0,
+            CANCELLED: 0,
+        }
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> "AgentService":
+        """Starts the workers on loop, which must be running (or about to run)."""
+        with self._lock:
+            if self._loop is not None:
+                return self
+            self._loop = loop
+        loop.call_soon_threadsafe(self._spawn)
+        return self
+
+    def _spawn(self) -> None:
+        self._ready = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        self._wake()
+
+    async def stop(self) -> None:
+        """Cancels the workers and the jobs they are running. Call on the loop."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _wake(self) -> None:
+        if self._ready is not None:
+            self._ready.set()
+
+    def submit(
+        self,
+        question: str,
+        thread_id: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> str:
+        """Queues a turn; safe to call from any thread.
+
+        Returns:
+            Id of the queued job
+
+        Raises:
+            QueueFull: If the turn was shed; its message is meant for the user
+        """
+        if self._loop is None:
+            raise RuntimeError("AgentService.start() was not called")
+        job = Job(question, thread_id, user)
+        with self._lock:
+            self._prune()
+            try:
+                self._pending.push(job)
+            except QueueFull as e:
+                self.counts["rejected"] += 1
+                metrics.inc(
+                    "agent_jobs_total",
+                    {"status": "rejected", "reason": e.reason},
+                    help="Agent turns by outcome",
+                )
+                raise
+            self._jobs[job.id] = job
+            self.counts["submitted"] += 1
+            self._announce()
+        self._loop.call_soon_threadsafe(self._wake)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Summary of a job with its queue position, None if it is unknown."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return {**job.summary(), "position": self.position(job_id)}
+
+    def follow(self, job_id: str, start: int = 0) -> Iterator[StreamEvent]:
+        """Streams a job's events from start on, blocking until it finishes.
+
+        Raises:
+            KeyError: If the job is unknown or was pruned
+        """
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        for event in job.follow(start):
+            if event is not None:
+                yield event
+
+    async def afollow(self, job_id: str, start: int = 0) -> AsyncIterator[StreamEvent]:
+        """Async version of follow(), for readers on any event loop."""
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        async for event in job.afollow(start):
+            yield event
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place of a queued job in line, None once it has started."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.position if job is not None else None
+
+    def _announce(self) -> None:
+        """Tells waiting jobs whose place in line changed. Call under the lock."""
+        for i, job in enumerate(self._pending.order()):
+            if job.position != i + 1:
+                job.position = i + 1
+                job.append(StreamEvent("queued", text=str(job.position)))
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued or running job; returns whether there was one to cancel."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            if self._pending.remove(job):
+                self.counts[CANCELLED] += 1
+                job.position = None
+                job.finish(CANCELLED)
+                self._announce()
+                return True
+            job._cancel_requested = True
+            task = job._task
+        if task is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        for job_id in [
+            j.id for j in self._jobs.values() if j.done and j.finished < cutoff
+        ]:
+            del self._jobs[job_id]
+
+    async def _next(self) -> Job:
+        while True:
+            with self._lock:
+                job = self._pending.pop()
+                if job is not None:
+                    job.position = None
+                    self._announce()
+                    return job
+                # Nothing waiting, or only users already at their running limit
+                self._ready.clear()
+            await self._ready.wait()
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._next()
+            with self._lock:
+                cancelled = job._cancel_requested
+                if not cancelled:
+                    job._task = asyncio.ensure_future(self._run(job))
+            if cancelled:
+                # Cancelled between leaving the queue and starting
+                self._finish(job, CANCELLED)
+                continue
+            try:
+                await job._task
+            except asyncio.CancelledError:
+                # Cancelling the worker also cancels the turn it awaits, so only the
+                # worker's own cancel count tells a stop apart from cancel()
+                if asyncio.current_task().cancelling():
+                    job._task.cancel()
+                    raise
+
+    async def _run(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started = time.time()
+        metrics.observe(
+            "agent_queue_wait_seconds",
+            job.started - job.submitted,
+            help="Time turns waited for a worker",
+        )
+        job.append(StreamEvent("started"))
+        messages: List[BaseMessage] = [HumanMessage(content=job.question)]
+        status, error = DONE, None
+        try:
+            async for event in self.run_turn(messages, job.config):
+                job.append(event)
+        except asyncio.CancelledError:
+            status = CANCELLED
+            raise
+        except Exception as e:
+            logger.exception("Agent job %s failed", job.id)
+            status, error = FAILED, str(e)
+        finally:
+            self._finish(job, status, error)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        """Records the outcome of a job taken from the queue and frees its slot."""
+        with self._lock:
+            self.counts[status] += 1
+            self._pending.finished(job)
+            self._announce()
+        metrics.inc("agent_jobs_total", {"status": status})
+        job.finish(status, error)
+        # The user may have more turns waiting on this one's slot
+        self._wake()
+
+    def collect(self) -> Dict[str, Dict[Any, float]]:
+        """Queue depth and running turns as gauge series for the metrics registry."""
+        stats = self.stats()
+        return {
+            "agent_queued": {(): stats["queued"]},
+            "agent_running": {(): stats["running"]},
+            "agent_workers": {(): stats["workers"]},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j.status == RUNNING)
+            waits = [
+                j.started - j.submitted
+                for j in self._jobs.values()
+                if j.started is not None
+            ]
+            return {
+                "workers": self.workers,
+                **self._pending.stats(),
+                "running": running,
+                "jobs": len(self._jobs),
+                "mean_wait": sum(waits) / len(waits) if waits else None,
+                **self.counts,
+            }
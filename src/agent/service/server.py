@@ -0,0 +1,128 @@
+"""
+HTTP front end of the agent service, for running agent workers in their own process.
+Streamlit replicas (or a load test) submit turns with POST /jobs and follow them with
+GET /jobs/<id>/events, a newline-delimited JSON stream of the turn's events that can
+be resumed from any offset. Jobs live in the process that accepted them.
+
+Routes:
+    POST /jobs                       {"question", "thread_id", "user"} -> {"id", ...},
+                                     or 429 {"error", "reason"} when the turn is shed
+    GET /jobs/<id>                   Job status and queue position
+    GET /jobs/<id>/events?start=N    NDJSON stream of events from offset N
+    DELETE /jobs/<id>                Cancel the job
+    GET /stats                       Queue and worker statistics
+"""
+
+from typing import Any, Dict, List, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from .admission import QueueFull
+from .jobs import AgentService, event_to_dict
+import json
+import threading
+
+# Seconds between blank keep-alive lines while a followed job is quiet
+HEARTBEAT = 10.0
+
+
+def _handler(service: AgentService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, status: int, body: Any) -> None:
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _route(self) -> Tuple[List[str], Dict[str, List[str]]]:
+            parts = urlsplit(self.path)
+            segments = [s for s in parts.path.split("/") if s]
+            return segments, parse_qs(parts.query)
+
+        def do_POST(self) -> None:
+            segments, _ = self._route()
+            if segments != ["jobs"]:
+                self._json(404, {"error": "not found"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body: Dict[str, Any] = json.loads(self.rfile.read(length) or b"{}")
+                question = body["question"]
+            except (ValueError, KeyError):
+                self._json(400, {"error": "expected a JSON body with a question"})
+                return
+            try:
+                job_id = service.submit(
+                    question, body.get("thread_id"), body.get("user")
+                )
+            except QueueFull as e:
+                self._json(429, {"error": str(e), "reason": e.reason})
+                return
+            self._json(202, service.status(job_id))
+
+        def do_GET(self) -> None:
+            segments, query = self._route()
+            if segments == ["stats"]:
+                self._json(200, service.stats())
+                return
+            if len(segments) < 2 or segments[0] != "jobs":
+                self._json(404, {"error": "not found"})
+                return
+            job = service.get(segments[1])
+            if job is None:
+                self._json(404, {"error": "unknown job"})
+                return
+            if len(segments) == 2:
+                self._json(200, service.status(job.id))
+                return
+            if segments[2:] != ["events"]:
+                self._json(404, {"error": "not found"})
+                return
+            try:
+                start = int(query.get("start", ["0"])[0])
+            except ValueError:
+                start = -1
+            if start < 0:
+                self._json(400, {"error": "start must be a non-negative integer"})
+                return
+            # No Content-Length: the stream ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                for event in job.follow(start, timeout=HEARTBEAT):
+                    line = "" if event is None else json.dumps(event_to_dict(event))
+                    self.wfile.write(line.encode() + b"\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The reader went away; the job carries on and can be followed again
+                pass
+
+        def do_DELETE(self) -> None:
+            segments, _ = self._route()
+            if len(segments) != 2 or segments[0] != "jobs":
+                self._json(404, {"error": "not found"})
+                return
+            self._json(200, {"cancelled": service.cancel(segments[1])})
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def serve(
+    service: AgentService, host: str = "127.0.0.1", port: int = 8700
+) -> ThreadingHTTPServer:
+    """Serves the service's HTTP API in a daemon thread.
+
+    Returns:
+        The running server (server_address holds the bound port)
+    """
+    server = ThreadingHTTPServer((host, port), _handler(service))
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="agent-service", daemon=True
+    ).start()
+    return server
@@ -0,0 +1,264 @@
+"""
+Token-level streaming of agent turns.
+Runs the agent with stream_mode="messages" and turns LLM token chunks and tool
+messages into a small event stream the chat page and the CLI render incrementally:
+answer tokens as they arrive, tool calls as they start and finish, and per-turn
+timings including time to first token.
+"""
+
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+from collections import deque
+from dataclasses import dataclass, field
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from .metrics import observe_turn
+from .router import IntentRouter, Route
+from .semantic_cache import SemanticCache
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TurnStats:
+    """Timings of one agent turn, in seconds since it started.
+
+    Attributes:
+        ttft: Time until the first answer token arrived
+        total: Time until the turn finished
+        tools: Names of the tools called, in order
+        cached: Whether the answer came from the semantic answer cache
+        intent: Intent the router recognised, if a router was used
+        direct: Whether the answer came from a direct tool call without the agent
+    """
+
+    started: float = field(default_factory=time.perf_counter)
+    ttft: Optional[float] = None
+    total: Optional[float] = None
+    tools: List[str] = field(default_factory=list)
+    cached: bool = False
+    intent: Optional[str] = None
+    direct: bool = False
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+@dataclass
+class StreamEvent:
+    """One update of a streamed turn.
+
+    Attributes:
+        kind: 'token', 'tool_start', 'tool_end' or 'done'; turns run by the agent
+            service also get 'queued' while they wait and 'started'
+        text: Answer so far ('token', 'done'), the tool's name (tool events) or the
+            place in line ('queued')
+        delta: Text added by this token
+        stats: Timings of the turn ('done' only)
+    """
+
+    kind: str
+    text: str = ""
+    delta: str = ""
+    stats: Optional[TurnStats] = None
+
+
+def _text(content: Any) -> str:
+    """Extracts the text of a message's content (a string or a list of parts)."""
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content or []:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+
+def _tool_names(message: BaseMessage) -> List[str]:
+    if isinstance(message, AIMessageChunk):
+        return [c["name"] for c in message.tool_call_chunks if c.get("name")]
+    return [c["name"] for c in getattr(message, "tool_calls", None) or []]
+
+
+async def astream_turn(
+    agent: Any,
+    messages: List[BaseMessage],
+    config: Dict[str, Any],
+    cache: Optional[SemanticCache] = None,
+    router: Optional[IntentRouter] = None,
+) -> AsyncIterator[StreamEvent]:
+    """Streams one agent turn as tokens and tool progress.
+
+    Args:
+        agent: Compiled agent graph
+        messages: New input messages for the turn
+        config: Run config (thread_id, etc.)
+        cache: Answer cache to serve recurring questions from and store answers in
+        router: Intent router choosing a direct answer or a smaller set of tools
+
+    Yields:
+        StreamEvents, ending with a 'done' event carrying the final answer
+    """
+    stats = TurnStats()
+    answer = ""
+    question = _text(messages[-1].content) if messages[-1].type == "human" else ""
+    hit = cache.get(question) if cache is not None and question else None
+    if hit is not None:
+        stats.cached = True
+        stats.ttft = stats.total = stats.elapsed()
+        if config.get("configurable", {}).get("thread_id"):
+            # Keep the thread's history complete as if the agent had answered
+            await agent.aupdate_state(
+                config,
+                {"messages": [*messages, AIMessage(content=hit.answer)]},
+                as_node="agent",
+            )
+        _record(stats, config)
+        yield StreamEvent("token", text=hit.answer, delta=hit.answer)
+        yield StreamEvent("done", text=hit.answer, stats=stats)
+        return
+
+    route = router.route(question) if router is not None and question else None
+    if route is not None:
+        stats.intent = route.intent
+        if route.call is not None:
+            direct = _astream_direct(agent, router, route, messages, config, stats)
+            async for event in direct:
+                yield event
+            if stats.direct:
+                if cache is not None:
+                    cache.put(question, event.text, stats.tools)
+                return
+            stats.tools.clear()
+        agent = router.agent(route)
+
+    async for message, metadata in agent.astream(
+        {"messages": messages}, config, stream_mode="messages"
+    ):
+        if message.type == "tool" and metadata.get("langgraph_node") == "tools":
+            # Text the model wrote before calling tools is not part of the answer
+            answer = ""
+            yield StreamEvent("tool_end", text=message.name or "")
+            continue
+        if message.type not in ("ai", "AIMessageChunk"):
+            continue
+        # Only the agent node's output is the answer; hooks may call the model too
+        if metadata.get("langgraph_node", "agent") != "agent":
+            continue
+        for name in _tool_names(message):
+            stats.tools.append(name)
+            yield StreamEvent("tool_start", text=name)
+        delta = _text(message.content)
+        if delta:
+            if stats.ttft is None:
+                stats.ttft = stats.elapsed()
+            answer += delta
+            yield StreamEvent("token", text=answer, delta=delta)
+
+    stats.total = stats.elapsed()
+    _record(stats, config)
+    if cache is not None and question:
+        cache.put(question, answer, stats.tools)
+    yield StreamEvent("done", text=answer, stats=stats)
+
+
+async def _astream_direct(
+    agent: Any,
+    router: IntentRouter,
+    route: Route,
+    messages: List[BaseMessage],
+    config: Dict[str, Any],
+    stats: TurnStats,
+) -> AsyncIterator[StreamEvent]:
+    """Answers from the route's tool call and one formatting call, without the agent.
+
+    If the tool call fails, returns without a 'done' event and stats.direct unset so
+    the caller falls back to the agent.
+    """
+    name, arguments = route.call
+    yield StreamEvent("tool_start", text=name)
+    stats.tools.append(name)
+    try:
+        result = await router.call(route, config)
+    except Exception:
+        logger.exception("Direct %s call failed; falling back to the agent", name)
+        return
+    yield StreamEvent("tool_end", text=name)
+
+    answer = ""
+    question = _text(messages[-1].content)
+    async for chunk in router.model.astream(
+        router.format_input(question, route, result), router.run_config(config)
+    ):
+        delta = _text(chunk.content)
+        if delta:
+            if stats.ttft is None:
+                stats.ttft = stats.elapsed()
+            answer += delta
+            yield StreamEvent("token", text=answer, delta=delta)
+
+    stats.direct = True
+    stats.total = stats.elapsed()
+    if config.get("configurable", {}).get("thread_id"):
+        # Record the call and its result too, so follow-ups can refer to the data
+        call_id = f"call_{uuid.uuid4().hex[:12]}"
+        await agent.aupdate_state(
+            config,
+            {
+                "messages": [
+                    *messages,
+                    AIMessage(
+                        content="",
+                        tool_calls=[{"name": name, "args": arguments, "id": call_id}],
+                    ),
+                    ToolMessage(
+                        content=json.dumps(result, default=str, ensure_ascii=False),
+                        name=name,
+                        tool_call_id=call_id,
+                    ),
+                    AIMessage(content=answer),
+                ]
+            },
+            as_node="agent",
+        )
+    _record(stats, config)
+    yield StreamEvent("done", text=answer, stats=stats)
+
+
+_lock = threading.Lock()
+_recent: Deque[TurnStats] = deque(maxlen=200)
+
+
+def _record(stats: TurnStats, config: Dict[str, Any]) -> None:
+    with _lock:
+        _recent.append(stats)
+    route = "cache" if stats.cached else "direct" if stats.direct else "agent"
+    observe_turn(
+        stats.total or stats.elapsed(),
+        stats.ttft,
+        route,
+        config.get("configurable", {}).get("thread_id"),
+    )
+
+
+def stats() -> Dict[str, Any]:
+    """Returns time-to-first-token and turn duration over recent turns."""
+    with _lock:
+        turns = list(_recent)
+    ttfts = sorted(t.ttft for t in turns if t.ttft is not None)
+    totals = sorted(t.total for t in turns if t.total is not None)
+
+    def median(values: List[float]) -> Optional[float]:
+        return values[len(values) // 2] if values else None
+
+    return {
+        "turns": len(turns),
+        "ttft_median": median(ttfts),
+        "total_median": median(totals),
+        "last": turns[-1].__dict__ if turns else None,
+    }
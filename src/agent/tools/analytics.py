@@ -0,0 +1,340 @@
+"""
+Statistics over a user's complete MyAnimeList anime list.
+Answering "what genres do I watch most" used to mean the model paging through
+jikan_users(extension='animelist') and counting by eye. Analytics pull every page of
+the list once, join each entry with its genres, themes, studios and duration from the
+local catalog (falling back to cached Jikan responses, then a bounded number of
+fresh lookups that are written back to the catalog), load the result into a pandas
+frame and compute the aggregates locally. Only the compact summary reaches the model.
+
+Environment:
+    ANALYTICS_MAX_PAGES: List pages read per user (default 40)
+    ANALYTICS_FETCH: Entries without known details looked up per call (default 25)
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+from .batch import Call, afetch_many, fetch_many
+from .cache import MISSING, make_key
+from .catalog import details, get_catalog
+from .client import cache
+from .pagination import aiter_pages, iter_pages
+import asyncio
+import os
+import time
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+MAX_LIST_PAGES = int(os.getenv("ANALYTICS_MAX_PAGES", "40"))
+MAX_FETCH = int(os.getenv("ANALYTICS_FETCH", "25"))
+# Jikan's numeric watching statuses; 5 is unused
+STATUSES = {
+    1: "watching",
+    2: "completed",
+    3: "on_hold",
+    4: "dropped",
+    6: "plan_to_watch",
+}
+# Groups smaller than this are left out of the best-rated rankings
+MIN_GROUP = 3
+# Minutes per episode assumed when an entry's duration is unknown
+DEFAULT_DURATION = 24.0
+GROUPS = ("genres", "themes", "studios")
+
+
+def _status(value: Any) -> Optional[str]:
+    if isinstance(value, int):
+        return STATUSES.get(value)
+    if isinstance(value, str):
+        return value.strip().lower().replace(" ", "_").replace("-", "_") or None
+    return None
+
+
+def _row(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """One list entry as a flat row, or None when it has no MyAnimeList ID."""
+    anime = item.get("anime") or item.get("entry") or {}
+    if anime.get("mal_id") is None:
+        return None
+    return {
+        "mal_id": anime["mal_id"],
+        "title": anime.get("title"),
+        "status": _status(item.get("watching_status") or item.get("status")),
+        # MAL stores "no score" as 0
+        "score": item.get("score") or None,
+        "watched": item.get("episodes_watched") or 0,
+        "episodes": anime.get("episodes"),
+        "type": anime.get("type"),
+        "year": anime.get("year"),
+    }
+
+
+def _rows(responses: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rows: Dict[int, Dict[str, Any]] = {}
+    for response in responses:
+        for item in response.get("data") or []:
+            row = _row(item)
+            if row:
+                rows.setdefault(row["mal_id"], row)
+    return list(rows.values())
+
+
+def _cached_details(mal_id: int) -> Optional[Dict[str, Any]]:
+    """Details from a cached jikan_anime response, without touching the network."""
+    for extension in (None, "full"):
+        key = make_key("anime", {"id": mal_id, "extension": extension})
+        response = cache.get("anime", key, count=False)
+        if response is not MISSING and (response or {}).get("data"):
+            return details(response["data"])
+    return None
+
+
+def _known(
+    rows: List[Dict[str, Any]],
+) -> Tuple[Dict[int, Dict[str, Any]], Dict[str, int]]:
+    """Details from the catalog and the response cache, and where each came from."""
+    ids = [row["mal_id"] for row in rows]
+    known = get_catalog().details("anime", ids)
+    coverage = {"catalog": len(known), "cache": 0}
+    for mal_id in ids:
+        if mal_id not in known:
+            cached = _cached_details(mal_id)
+            if cached:
+                known[mal_id] = cached
+                coverage["cache"] += 1
+    return known, coverage
+
+
+def _lookups(rows: List[Dict[str, Any]], known: Dict[int, Any]) -> Dict[int, Call]:
+    """Calls for the entries without details, those the user has watched first."""
+    unknown = [row for row in rows if row["mal_id"] not in known]
+    unknown.sort(key=lambda row: row["status"] == "plan_to_watch")
+    return {
+        row["mal_id"]: ("anime", {"id": row["mal_id"]}) for row in unknown[:MAX_FETCH]
+    }
+
+
+def _store(
+    fetched: Dict[int, Any], known: Dict[int, Dict[str, Any]], coverage: Dict[str, int]
+) -> None:
+    """Writes fresh lookups to the catalog and adds their details to known."""
+    items = [
+        response["data"]
+        for response in fetched.values()
+        if not isinstance(response, BaseException) and (response or {}).get("data")
+    ]
+    get_catalog().upsert("anime", items)
+    known.update((item["mal_id"], details(item)) for item in items)
+    coverage["fetched"] = len(items)
+
+
+def frame(
+    rows: List[Dict[str, Any]], known: Dict[int, Dict[str, Any]]
+) -> "pd.DataFrame":
+    """The list as a frame with one row per entry, joined with its details."""
+    # Imported here so building the agent does not pay for pandas until it is used
+    import pandas as pd
+
+    data = pd.DataFrame(
+        rows,
+        columns=[
+            "mal_id",
+            "title",
+            "status",
+            "score",
+            "watched",
+            "episodes",
+            "type",
+            "year",
+        ],
+    )
+    info = pd.DataFrame.from_dict(known, orient="index")
+    info = info.reindex(
+        columns=["type", "year", "score", "episodes", "duration", *GROUPS]
+    ).rename(columns={"score": "community"})
+    data = data.join(info, on="mal_id", rsuffix="_known")
+    # The list's own fields win; details fill the gaps
+    for column in ("type", "year", "episodes"):
+        fallback = data.pop(f"{column}_known")
+        data[column] = data[column].where(data[column].notna(), fallback)
+    for column in GROUPS:
+        data[column] = data[column].apply(lambda v: v if isinstance(v, list) else [])
+    for column in ("score", "watched", "episodes", "year", "community", "duration"):
+        data[column] = pd.to_numeric(data[column], errors="coerce")
+    return data
+
+
+def _round(value: Any, digits: int = 2) -> Optional[float]:
+    return None if value != value or value is None else round(float(value), digits)
+
+
+def _counts(series: "pd.Series") -> Dict[str, int]:
+    return {
+        str(key): int(value) for key, value in series.dropna().value_counts().items()
+    }
+
+
+def _groups(data: "pd.DataFrame", column: str, top: int) -> Dict[str, Any]:
+    """Entry counts, mean scores and completions per genre, theme or studio."""
+    exploded = data[[column, "score", "status"]].explode(column).dropna(subset=[column])
+    if exploded.empty:
+        return {"most_watched": [], "best_rated": []}
+    grouped = exploded.groupby(column).agg(
+        count=("status", "size"),
+        mean_score=("score", "mean"),
+        completed=("status", lambda s: int((s == "completed").sum())),
+    )
+
+    def records(rows: "pd.DataFrame") -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": name,
+                "count": int(row["count"]),
+                "share": _round(row["count"] / len(data), 3),
+                "mean_score": _round(row["mean_score"]),
+                "completed": int(row["completed"]),
+            }
+            for name, row in rows.iterrows()
+        ]
+
+    rated = grouped[grouped["count"] >= MIN_GROUP].dropna(subset=["mean_score"])
+    return {
+        "most_watched": records(
+            grouped.sort_values(["count", "mean_score"], ascending=False).head(top)
+        ),
+        "best_rated": records(
+            rated.sort_values(["mean_score", "count"], ascending=False).head(top)
+        ),
+    }
+
+
+def summarize(
+    data: "pd.DataFrame", top: int = 10, status: Optional[str] = None
+) -> Dict[str, Any]:
+    """Aggregates a list frame into the compact summary returned to the model.
+
+    Status counts and rates cover the whole list. Everything else covers the entries
+    with the given status, or every entry the user has started (all but
+    plan_to_watch) when no status is given.
+    """
+    statuses = data["status"].value_counts()
+    completed = int(statuses.get("completed", 0))
+    dropped = int(statuses.get("dropped", 0))
+    started = len(data) - int(statuses.get("plan_to_watch", 0))
+    summary: Dict[str, Any] = {
+        "entries": len(data),
+        "status": _counts(data["status"]),
+        "rates": {
+            # Share of started entries that were finished or abandoned
+            "completion": _round(completed / started, 3) if started else None,
+            "drop": _round(dropped / started, 3) if started else None,
+        },
+    }
+
+    if status:
+        subset = data[data["status"] == _status(status)]
+    else:
+        subset = data[data["status"] != "plan_to_watch"]
+    summary["scope"] = _status(status) if status else "started"
+    summary["scope_entries"] = len(subset)
+
+    scores = subset["score"].dropna()
+    summary["scores"] = {
+        "scored": len(scores),
+        "mean": _round(scores.mean()),
+        "median": _round(scores.median()),
+        "std": _round(scores.std()),
+        "distribution": {
+            str(s): int(c)
+            for s, c in scores.astype(int).value_counts().sort_index().items()
+        },
+    }
+    # Positive when the user rates higher than MyAnimeList does
+    difference = (subset["score"] - subset["community"]).dropna()
+    summary["scores"]["vs_community"] = _round(difference.mean())
+
+    # Entries with an unknown duration count at DEFAULT_DURATION per episode
+    minutes = subset["watched"].fillna(0) * subset["duration"].fillna(DEFAULT_DURATION)
+    summary["time_watched"] = {
+        "episodes": int(subset["watched"].fillna(0).sum()),
+        "hours": _round(minutes.sum() / 60, 1),
+        "days": _round(minutes.sum() / 60 / 24, 1),
+        "estimated_entries": int(
+            ((subset["watched"] > 0) & subset["duration"].isna()).sum()
+        ),
+    }
+
+    summary["types"] = _counts(subset["type"])
+    decades = (subset["year"] // 10 * 10).dropna().astype(int)
+    by_decade = subset.groupby(decades)["score"].agg(["size", "mean"])
+    summary["decades"] = {
+        f"{int(decade)}s": {
+            "count": int(row["size"]),
+            "mean_score": _round(row["mean"]),
+        }
+        for decade, row in by_decade.iterrows()
+    }
+    for column in GROUPS:
+        summary[column] = _groups(subset, column, top)
+    return summary
+
+
+def _result(
+    username: str,
+    rows: List[Dict[str, Any]],
+    known: Dict[int, Dict[str, Any]],
+    coverage: Dict[str, int],
+    top: int,
+    status: Optional[str],
+) -> Dict[str, Any]:
+    if not rows:
+        return {"username": username, "entries": 0}
+    started = time.perf_counter()
+    summary = summarize(frame(rows, known), top, status)
+    coverage["missing"] = sum(row["mal_id"] not in known for row in rows)
+    return {
+        "username": username,
+        **summary,
+        "details": coverage,
+        "computed_ms": _round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def user_analytics(
+    username: str, top: int = 10, status: Optional[str] = None
+) -> Dict[str, Any]:
+    """Computes statistics over a user's complete anime list.
+
+    Args:
+        username: MyAnimeList username
+        top: Entries kept in each genre, theme and studio ranking
+        status: Restrict the breakdowns to one list status (e.g. 'completed')
+
+    Returns:
+        Dictionary with status counts and rates, score statistics, time watched and
+        type, decade, genre, theme and studio breakdowns
+    """
+    arguments = {"username": username, "extension": "animelist"}
+    rows = _rows(iter_pages("users", arguments, MAX_LIST_PAGES))
+    known, coverage = _known(rows)
+    _store(fetch_many(_lookups(rows, known)), known, coverage)
+    return _result(username, rows, known, coverage, top, status)
+
+
+async def auser_analytics(
+    username: str, top: int = 10, status: Optional[str] = None
+) -> Dict[str, Any]:
+    """Async version of user_analytics.
+
+    The catalog reads and writes and the aggregation run in a worker thread, off the
+    event loop.
+    """
+    arguments = {"username": username, "extension": "animelist"}
+    rows = _rows(
+        [page async for page in aiter_pages("users", arguments, MAX_LIST_PAGES)]
+    )
+    known, coverage = await asyncio.to_thread(_known, rows)
+    fetched = await afetch_many(_lookups(rows, known))
+    await asyncio.to_thread(_store, fetched, known, coverage)
+    return await asyncio.to_thread(
+        _result, username, rows, known, coverage, top, status
+    )
@@ -0,0 +1,201 @@
+"""
+Batch lookups of anime, manga, characters and people by MyAnimeList ID.
+IDs are deduplicated and checked against the response cache; the misses are fetched
+concurrently (the shared rate limiter still paces them) and every entry is flattened
+into one row of a compact table. fetch_many and afetch_many run any set of Jikan calls
+this way and are shared with the profile and analytics tools.
+"""
+
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from .cache import MISSING, make_key
+from .client import UPSTREAM_ERRORS, acache_get, ajikan_call, cache, jikan_call
+from .projection import project
+import asyncio
+import os
+
+MAX_BATCH = int(os.getenv("JIKAN_MAX_BATCH", "25"))
+BATCH_CONCURRENCY = int(os.getenv("JIKAN_BATCH_CONCURRENCY", "3"))
+
+# Columns returned for each resource type unless the caller asks for others
+COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "anime": (
+        "mal_id",
+        "title",
+        "title_english",
+        "type",
+        "episodes",
+        "status",
+        "year",
+        "score",
+        "rank",
+        "popularity",
+        "members",
+        "genres",
+        "studios",
+    ),
+    "manga": (
+        "mal_id",
+        "title",
+        "title_english",
+        "type",
+        "chapters",
+        "volumes",
+        "status",
+        "score",
+        "rank",
+        "popularity",
+        "members",
+        "genres",
+        "authors",
+    ),
+    "characters": ("mal_id", "name", "name_kanji", "nicknames", "favorites"),
+    "people": ("mal_id", "name", "given_name", "family_name", "birthday", "favorites"),
+}
+
+
+def _unique(type: str, ids: Iterable[int]) -> Tuple[List[int], List[int]]:
+    """Drops duplicate IDs and splits off those past the first MAX_BATCH.
+
+    Returns:
+        The IDs to look up and the skipped ones, both in order
+    """
+    if type not in COLUMNS:
+        raise ValueError(f"Unsupported type '{type}'; use one of {tuple(COLUMNS)}")
+    unique = list(dict.fromkeys(int(i) for i in ids))
+    return unique[:MAX_BATCH], unique[MAX_BATCH:]
+
+
+# A Jikan call as (endpoint, keyword arguments)
+Call = Tuple[str, Dict[str, Any]]
+
+
+def is_cached(endpoint: str, arguments: Dict[str, Any]) -> bool:
+    """Whether a call would be answered from the response cache (not counted)."""
+    return (
+        cache.get(endpoint, make_key(endpoint, arguments), count=False) is not MISSING
+    )
+
+
+async def ais_cached(endpoint: str, arguments: Dict[str, Any]) -> bool:
+    """Async version of is_cached."""
+    key = make_key(endpoint, arguments)
+    return await acache_get(endpoint, key, count=False) is not MISSING
+
+
+def fetch_many(calls: Dict[Hashable, Call]) -> Dict[Hashable, Any]:
+    """Runs Jikan calls concurrently, at most BATCH_CONCURRENCY at a time.
+
+    Args:
+        calls: Calls by key
+
+    Returns:
+        Each key's response, or the upstream error its call raised
+    """
+
+    def fetch(call: Call) -> Any:
+        try:
+            return jikan_call(call[0], **call[1])
+        except UPSTREAM_ERRORS as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as pool:
+        return dict(zip(calls, pool.map(fetch, calls.values())))
+
+
+async def afetch_many(calls: Dict[Hashable, Call]) -> Dict[Hashable, Any]:
+    """Async version of fetch_many."""
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def fetch(call: Call) -> Any:
+        async with semaphore:
+            try:
+                return await ajikan_call(call[0], **call[1])
+            except UPSTREAM_ERRORS as e:
+                return e
+
+    return dict(zip(calls, await asyncio.gather(*map(fetch, calls.values()))))
+
+
+def _calls(type: str, ids: List[int], extension: Optional[str]) -> Dict[int, Call]:
+    return {id: (type, {"id": id, "extension": extension}) for id in ids}
+
+
+def _cell(value: Any) -> Any:
+    """Flattens a projected value into a single table cell."""
+    if isinstance(value, list):
+        return ", ".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return value.get("name") or value.get("title") or value.get("url")
+    return value
+
+
+def _table(
+    type: str,
+    ids: List[int],
+    skipped: List[int],
+    responses: Dict[int, Any],
+    columns: Optional[List[str]],
+    extension: Optional[str],
+    cached: int,
+) -> Dict[str, Any]:
+    """Builds the compact result from per-ID responses or errors."""
+    columns = list(columns or COLUMNS[type])
+    rows, errors = [], {}
+    for id in ids:
+        response = responses.get(id)
+        if isinstance(response, BaseException):
+            errors[id] = str(response) or response.__class__.__name__
+            continue
+        item = project(response, type, extension).get("data") or {}
+        rows.append([_cell(item.get(column)) for column in columns])
+    return {
+        "columns": columns,
+        "rows": rows,
+        "errors": errors,
+        "requested": len(ids) + len(skipped),
+        # Over the MAX_BATCH limit; look these up in another call
+        "skipped": skipped,
+        "cached": cached,
+        "fetched": len(ids) - cached,
+    }
+
+
+def batch_lookup(
+    type: str,
+    ids: Iterable[int],
+    columns: Optional[List[str]] = None,
+    extension: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Looks up many entries of one type by ID.
+
+    Args:
+        type: 'anime', 'manga', 'characters' or 'people'
+        ids: MyAnimeList IDs; duplicates are dropped and IDs past the first MAX_BATCH
+            are returned as 'skipped'
+        columns: Fields to return for each entry (defaults to COLUMNS[type])
+        extension: 'full' for the full resources
+
+    Returns:
+        Dictionary with 'columns', one row per entry found, per-ID 'errors' and the
+        'skipped' IDs
+    """
+    ids, skipped = _unique(type, ids)
+    calls = _calls(type, ids, extension)
+    cached = sum(is_cached(*call) for call in calls.values())
+    responses = fetch_many(calls)
+    return _table(type, ids, skipped, responses, columns, extension, cached)
+
+
+async def abatch_lookup(
+    type: str,
+    ids: Iterable[int],
+    columns: Optional[List[str]] = None,
+    extension: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Async version of batch_lookup."""
+    ids, skipped = _unique(type, ids)
+    calls = _calls(type, ids, extension)
+    cached = sum([await ais_cached(*call) for call in calls.values()])
+    responses = await afetch_many(calls)
+    return _table(type, ids, skipped, responses, columns, extension, cached)
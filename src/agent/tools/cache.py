@@ -0,0 +1,285 @@
+"""
+Tiered response cache for the Jikan tools.
+An in-process LRU sits in front of a persistent SQLite store. Entries are keyed on the
+endpoint plus its normalized arguments and expire according to per-endpoint TTLs.
+"""
+
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+
+MISSING = object()
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Seconds each endpoint's responses stay fresh. 0 disables caching for the endpoint.
+DEFAULT_TTLS: Dict[str, int] = {
+    "anime": 6 * HOUR,
+    "anime_episode_by_id": DAY,
+    "characters": DAY,
+    "clubs": 6 * HOUR,
+    "genres": 7 * DAY,
+    "manga": 6 * HOUR,
+    "people": DAY,
+    "producers": DAY,
+    "random": 0,
+    "recommendations": HOUR,
+    "reviews": HOUR,
+    "schedules": 10 * 60,
+    "search": HOUR,
+    "season_history": 7 * DAY,
+    "seasons": HOUR,
+    "top": 6 * HOUR,
+    "user_by_id": HOUR,
+    "users": 15 * 60,
+    "watch": 5 * 60,
+}
+DEFAULT_TTL = HOUR
+
+
+def _normalize(value: Any) -> Any:
+    """Normalizes argument values so equivalent calls share a cache key."""
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, dict):
+        return {
+            str(k).strip().lower(): _normalize(v)
+            for k, v in value.items()
+            if v is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(endpoint: str, arguments: Dict[str, Any]) -> str:
+    """Builds a cache key from an endpoint name and its call arguments.
+
+    Args:
+        endpoint: Name of the Jikan endpoint (e.g., 'anime', 'top')
+        arguments: Keyword arguments the endpoint is called with
+
+    Returns:
+        A stable string key; argument order, casing and None values do not matter
+    """
+    normalized = _normalize({k: v for k, v in arguments.items() if v is not None})
+    return f"{endpoint}:{json.dumps(normalized, sort_keys=True, default=str)}"
+
+
+class TieredCache:
+    """In-process LRU in front of an optional SQLite store, with per-endpoint TTLs.
+
+    Attributes:
+        ttls: Seconds each endpoint's entries stay fresh
+        max_memory_entries: Size bound of the in-process LRU
+        max_disk_entries: Size bound of the SQLite store
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttls: Optional[Dict[str, int]] = None,
+        max_memory_entries: int = 512,
+        max_disk_entries: int = 20000,
+    ) -> None:
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._counters: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        self._endpoint_counters: Dict[str, Dict[str, int]] = {}
+        self._writes_since_prune = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "TieredCache":
+        """Builds a cache configured from environment variables.
+
+        JIKAN_CACHE_PATH sets the SQLite file (empty disables the disk tier),
+        JIKAN_CACHE_TTLS takes a JSON object of per-endpoint TTL overrides in seconds,
+        and JIKAN_CACHE_MEMORY_ENTRIES / JIKAN_CACHE_DISK_ENTRIES bound each tier.
+        """
+        path = os.getenv("JIKAN_CACHE_PATH", os.path.join(".cache", "jikan.sqlite3"))
+        ttls = json.loads(os.getenv("JIKAN_CACHE_TTLS", "{}"))
+        return cls(
+            path=path or None,
+            ttls={k: int(v) for k, v in ttls.items()},
+            max_memory_entries=int(os.getenv("JIKAN_CACHE_MEMORY_ENTRIES", "512")),
+            max_disk_entries=int(os.getenv("JIKAN_CACHE_DISK_ENTRIES", "20000")),
+        )
+
+    def ttl_for(self, endpoint: str) -> int:
+        """Returns the TTL in seconds for an endpoint."""
+        return self.ttls.get(endpoint, DEFAULT_TTL)
+
+    def _count(self, endpoint: str, counter: str) -> None:
+        self._counters[counter] += 1
+        per_endpoint = self._endpoint_counters.setdefault(
+            endpoint, {"hits": 0, "misses": 0}
+        )
+        per_endpoint["misses" if counter == "misses" else "hits"] += 1
+
+    @property
+    def persistent(self) -> bool:
+        """Whether the cache has a disk tier, whose lookups and writes block."""
+        return self._db is not None
+
+    def peek(self, endpoint: str, key: str, count: bool = True) -> Any:
+        """Looks a key up in memory only, never touching the disk tier.
+
+        A hit is counted like one from get; a miss is not, since the caller is
+        expected to follow up with get.
+
+        Returns:
+            The cached value, or MISSING if it is not fresh in memory
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or entry[0] <= time.time():
+                return MISSING
+            self._memory.move_to_end(key)
+            if count:
+                self._count(endpoint, "memory_hits")
+            return entry[1]
+
+    def get(self, endpoint: str, key: str, count: bool = True) -> Any:
+        """Looks a key up in memory, then on disk.
+
+        Args:
+            endpoint: Endpoint the key belongs to
+            key: Key built with make_key
+            count: Whether the lookup is recorded in the hit/miss counters
+
+        Returns:
+            The cached value, or MISSING if absent or expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    if count:
+                        self._count(endpoint, "memory_hits")
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._db.execute(
+                        "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                        (now, key),
+                    )
+                    self._db.commit()
+                    self._remember(key, row[1], value)
+                    if count:
+                        self._count(endpoint, "disk_hits")
+                    return value
+
+            if count:
+                self._count(endpoint, "misses")
+            return MISSING
+
+    def set(self, endpoint: str, key: str, value: Any) -> None:
+        """Stores a value in both tiers using the endpoint's TTL."""
+        ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            return
+        now = time.time()
+        expires_at = now + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._counters["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, endpoint, json.dumps(value), expires_at, now),
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 100:
+                    self._prune_disk(now)
+                self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _prune_disk(self, now: float) -> None:
+        """Drops expired rows, then the least recently used rows over the size bound."""
+        self._writes_since_prune = 0
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))  # type: ignore
+        self._db.execute(  # type: ignore
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def clear(self) -> None:
+        """Empties both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters overall and per endpoint."""
+        with self._lock:
+            lookups = (
+                self._counters["memory_hits"]
+                + self._counters["disk_hits"]
+                + self._counters["misses"]
+            )
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "memory_entries": len(self._memory),
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "endpoints": {k: dict(v) for k, v in self._endpoint_counters.items()},
+            }
+
+    def close(self) -> None:
+        """Closes the SQLite connection."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,468 @@
+"""
+Local anime/manga catalog for resolving titles to MyAnimeList IDs without a network
+round trip. A sync job pages through Jikan into SQLite with an FTS5 trigram index over
+every title variant (default, English, Japanese and synonyms); searches gather
+candidates from the index and rank them by trigram similarity, so romaji, English and
+misspelled titles all resolve. Entries also keep the genres, themes, studios, episode
+count and duration that analytics join against.
+
+Usage:
+    python -m src.agent.tools.catalog sync anime           # incremental refresh
+    python -m src.agent.tools.catalog sync manga --full    # full rebuild
+    python -m src.agent.tools.catalog search anime "frieren"
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from collections import OrderedDict
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+KINDS = ("anime", "manga")
+PAGE_SIZE = 25
+# Columns added after the first release, created on existing databases at open
+DETAIL_COLUMNS = {
+    "genres": "TEXT",
+    "themes": "TEXT",
+    "studios": "TEXT",
+    "episodes": "INTEGER",
+    "duration": "REAL",
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercases a title and strips punctuation so variants compare equal."""
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    """Returns the padded character trigrams of a normalized title."""
+    padded = f"  {normalize(text)} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query: str, name: str) -> float:
+    """Trigram Jaccard similarity, boosted for exact, prefix and substring matches."""
+    q, n = normalize(query), normalize(name)
+    if not q or not n:
+        return 0.0
+    if q == n:
+        return 1.0
+    a, b = trigrams(q), trigrams(n)
+    score = len(a & b) / len(a | b)
+    if n.startswith(q):
+        score = max(score, 0.9)
+    elif q in n:
+        score = max(score, 0.75)
+    return score
+
+
+def _row_id(kind: str, mal_id: int) -> int:
+    """Packs kind and MAL ID into the integer key shared by entries and the FTS index."""
+    return mal_id * len(KINDS) + KINDS.index(kind)
+
+
+def _names(item: Dict[str, Any]) -> List[str]:
+    """Collects every title variant of a Jikan anime/manga item."""
+    names = [
+        item.get("title"),
+        item.get("title_english"),
+        item.get("title_japanese"),
+        *(item.get("title_synonyms") or []),
+        *(t.get("title") for t in item.get("titles") or []),
+    ]
+    return list(dict.fromkeys(n for n in names if n))
+
+
+def duration_minutes(duration: Optional[str]) -> Optional[float]:
+    """Parses a Jikan duration ('24 min per ep', '1 hr 55 min') into minutes."""
+    if not duration:
+        return None
+    minutes = 0.0
+    for amount, unit in re.findall(r"(\d+)\s*(hr|min|sec)", duration):
+        minutes += int(amount) * {"hr": 60, "min": 1, "sec": 1 / 60}[unit]
+    return round(minutes, 2) or None
+
+
+def details(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The analytics fields of a Jikan anime/manga item."""
+
+    def names(*keys: str) -> List[str]:
+        return [v["name"] for key in keys for v in item.get(key) or [] if v.get("name")]
+
+    year = item.get("year")
+    if year is None:
+        dates = item.get("aired") or item.get("published") or {}
+        year = ((dates.get("prop") or {}).get("from") or {}).get("year")
+    return {
+        "type": item.get("type"),
+        "year": year,
+        "score": item.get("score"),
+        "episodes": item.get("episodes") or item.get("chapters"),
+        "duration": duration_minutes(item.get("duration")),
+        "genres": names("genres", "explicit_genres"),
+        "themes": names("themes", "demographics"),
+        # Manga have no studios; their serializations play the same role
+        "studios": names("studios", "serializations"),
+    }
+
+
+class Catalog:
+    """SQLite-backed title index for anime and manga."""
+
+    # Recent searches kept in memory; cleared whenever the index changes
+    MEMO_SIZE = 256
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._memo: "OrderedDict[Tuple[str, Optional[str], int], List[Dict[str, Any]]]" = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                mal_id INTEGER NOT NULL,
+                title TEXT,
+                title_english TEXT,
+                title_japanese TEXT,
+                names TEXT NOT NULL,
+                type TEXT,
+                year INTEGER,
+                score REAL,
+                members INTEGER,
+                updated_at REAL NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS entries_kind_id ON entries (kind, mal_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS titles USING fts5(
+                names, tokenize='trigram'
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                kind TEXT PRIMARY KEY, synced_at REAL NOT NULL, entries INTEGER NOT NULL
+            );
+            """
+        )
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        for column, declaration in DETAIL_COLUMNS.items():
+            if column not in existing:
+                self._db.execute(
+                    f"ALTER TABLE entries ADD COLUMN {column} {declaration}"
+                )
+        self._db.commit()
+
+    def count(self, kind: Optional[str] = None) -> int:
+        """Returns the number of indexed entries, optionally for one kind."""
+        with self._lock:
+            if kind is None:
+                row = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+            else:
+                row = self._db.execute(
+                    "SELECT COUNT(*) FROM entries WHERE kind = ?", (kind,)
+                ).fetchone()
+            return row[0]
+
+    def known_ids(self, kind: str, ids: Iterable[int]) -> Set[int]:
+        """Returns which of the given IDs are already indexed."""
+        ids = list(ids)
+        if not ids:
+            return set()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT mal_id FROM entries WHERE kind = ? AND mal_id IN "
+                f"({','.join('?' * len(ids))})",
+                (kind, *ids),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def details(self, kind: str, ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Returns the analytics fields of the given IDs, as details() builds them.
+
+        Entries indexed before the detail columns existed are left out, so callers
+        look them up elsewhere.
+        """
+        ids = list(ids)
+        found: Dict[int, Dict[str, Any]] = {}
+        # Stay well under SQLite's bound-parameter limit on long lists
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT mal_id, type, year, score, episodes, duration, genres, "
+                    f"themes, studios FROM entries WHERE kind = ? AND genres IS NOT NULL "
+                    f"AND mal_id IN ({','.join('?' * len(chunk))})",
+                    (kind, *chunk),
+                ).fetchall()
+            for row in rows:
+                found[row[0]] = {
+                    "type": row[1],
+                    "year": row[2],
+                    "score": row[3],
+                    "episodes": row[4],
+                    "duration": row[5],
+                    "genres": json.loads(row[6]),
+                    "themes": json.loads(row[7] or "[]"),
+                    "studios": json.loads(row[8] or "[]"),
+                }
+        return found
+
+    def upsert(self, kind: str, items: Iterable[Dict[str, Any]]) -> int:
+        """Adds or refreshes Jikan anime/manga items in the index.
+
+        Returns:
+            Number of items written
+        """
+        now = time.time()
+        written = 0
+        with self._lock:
+            for item in items:
+                mal_id = item.get("mal_id")
+                names = _names(item)
+                if mal_id is None or not names:
+                    continue
+                info = details(item)
+                row_id = _row_id(kind, mal_id)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (id, kind, mal_id, title, "
+                    "title_english, title_japanese, names, type, year, score, members, "
+                    "updated_at, genres, themes, studios, episodes, duration) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        row_id,
+                        kind,
+                        mal_id,
+                        item.get("title"),
+                        item.get("title_english"),
+                        item.get("title_japanese"),
+                        json.dumps(names, ensure_ascii=False),
+                        info["type"],
+                        info["year"],
+                        info["score"],
+                        item.get("members"),
+                        now,
+                        json.dumps(info["genres"], ensure_ascii=False),
+                        json.dumps(info["themes"], ensure_ascii=False),
+                        json.dumps(info["studios"], ensure_ascii=False),
+                        info["episodes"],
+                        info["duration"],
+                    ),
+                )
+                self._db.execute("DELETE FROM titles WHERE rowid = ?", (row_id,))
+                self._db.execute(
+                    "INSERT INTO titles (rowid, names) VALUES (?, ?)",
+                    (row_id, " | ".join(names)),
+                )
+                written += 1
+            self._db.commit()
+            self._memo.clear()
+        return written
+
+    def search(
+        self, query: str, kind: Optional[str] = None, limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Finds the entries whose titles best match a query.
+
+        Args:
+            query: Title in any language or spelling
+            kind: Restrict to 'anime' or 'manga'
+            limit: Maximum number of results
+
+        Returns:
+            Matching entries, best first, each with a 'similarity' in [0, 1]
+        """
+        memo_key = (normalize(query), kind, limit)
+        with self._lock:
+            if memo_key in self._memo:
+                self._memo.move_to_end(memo_key)
+                return [dict(r) for r in self._memo[memo_key]]
+
+        # Exact substrings are selective and cheap; only fall back to the OR of every
+        # trigram (typos, reordered words) when they do not produce a close match
+        results = []
+        phrase = query.strip()
+        if len(phrase) >= 3:
+            results = self._rank(query, '"' + phrase.replace('"', '""') + '"', kind)
+        if not results or results[0]["similarity"] < 0.75:
+            grams = sorted(g for g in trigrams(query) if g.strip())
+            if grams:
+                match = " OR ".join(
+                    '"' + g.replace('"', '""') + '"' for g in grams[:40]
+                )
+                results = self._rank(query, match, kind)
+        results = results[:limit]
+
+        with self._lock:
+            self._memo[memo_key] = results
+            if len(self._memo) > self.MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return [dict(r) for r in results]
+
+    def _rank(
+        self, query: str, match: str, kind: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """Fetches FTS candidates for a MATCH expression and ranks them by similarity."""
+        sql = (
+            "SELECT e.kind, e.mal_id, e.title, e.title_english, e.title_japanese, "
+            "e.names, e.type, e.year, e.score, e.members FROM titles "
+            "JOIN entries e ON e.id = titles.rowid WHERE titles MATCH ?"
+        )
+        params: List[Any] = [match]
+        if kind is not None:
+            sql += " AND e.kind = ?"
+            params.append(kind)
+        sql += " ORDER BY rank LIMIT 200"
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+
+        results = []
+        for row in rows:
+            names = json.loads(row[5])
+            best = max(similarity(query, name) for name in names)
+            results.append(
+                {
+                    "kind": row[0],
+                    "mal_id": row[1],
+                    "title": row[2],
+                    "title_english": row[3],
+                    "title_japanese": row[4],
+                    "type": row[6],
+                    "year": row[7],
+                    "score": row[8],
+                    "members": row[9],
+                    "similarity": round(best, 3),
+                }
+            )
+        results.sort(key=lambda r: (r["similarity"], r["members"] or 0), reverse=True)
+        return results
+
+    def mark_synced(self, kind: str) -> None:
+        """Records that a sync of the given kind just finished."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, "
+                "(SELECT COUNT(*) FROM entries WHERE kind = ?))",
+                (kind, time.time(), kind),
+            )
+            self._db.commit()
+
+    def sync_state(self) -> Dict[str, Dict[str, Any]]:
+        """Returns when each kind was last synced and how many entries it has."""
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM sync_state").fetchall()
+        return {row[0]: {"synced_at": row[1], "entries": row[2]} for row in rows}
+
+    def clear(self) -> None:
+        """Removes every entry and the sync state."""
+        with self._lock:
+            self._db.executescript(
+                "DELETE FROM entries; DELETE FROM titles; DELETE FROM sync_state;"
+            )
+            self._db.commit()
+            self._memo.clear()
+
+    def close(self) -> None:
+        """Closes the SQLite connection."""
+        with self._lock:
+            self._db.close()
+
+
+def sync(
+    catalog: Catalog,
+    kind: str = "anime",
+    full: bool = False,
+    max_pages: Optional[int] = None,
+) -> int:
+    """Pages through Jikan into the catalog, newest MyAnimeList IDs first.
+
+    An incremental sync stops at the first page whose entries are all already indexed;
+    a full sync walks every page. Requests go through the shared rate limiter but not
+    the response cache.
+
+    Args:
+        catalog: Catalog to fill
+        kind: 'anime' or 'manga'
+        full: Walk every page instead of stopping at known entries
+        max_pages: Upper bound on pages fetched
+
+    Returns:
+        Number of entries written
+    """
+    from .client import jikan
+    from .ratelimit import call_with_retry
+
+    page, written = 1, 0
+    while max_pages is None or page <= max_pages:
+        response = call_with_retry(
+            lambda: jikan.search(
+                search_type=kind,
+                query="",
+                page=page,
+                parameters={"order_by": "mal_id", "sort": "desc", "limit": PAGE_SIZE},
+            )
+        )
+        items = response.get("data") or []
+        known = catalog.known_ids(kind, (item["mal_id"] for item in items))
+        written += catalog.upsert(kind, items)
+        if not items or not response.get("pagination", {}).get("has_next_page"):
+            break
+        if not full and len(known) == len(items):
+            break
+        page += 1
+    catalog.mark_synced(kind)
+    return written
+
+
+_catalog: Optional[Catalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """Returns the process-wide catalog (JIKAN_CATALOG_PATH, default .cache/)."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = Catalog(
+                os.getenv(
+                    "JIKAN_CATALOG_PATH", os.path.join(".cache", "catalog.sqlite3")
+                )
+            )
+        return _catalog
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the local title catalog.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sync_parser = commands.add_parser("sync", help="Fetch entries from Jikan")
+    sync_parser.add_argument("kind", choices=KINDS)
+    sync_parser.add_argument("--full", action="store_true")
+    sync_parser.add_argument("--max-pages", type=int)
+    search_parser = commands.add_parser("search", help="Search the local index")
+    search_parser.add_argument("kind", choices=KINDS)
+    search_parser.add_argument("query")
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    if args.command == "sync":
+        start = time.perf_counter()
+        written = sync(catalog, args.kind, full=args.full, max_pages=args.max_pages)
+        print(
+            f"Synced {written} {args.kind} entries in "
+            f"{time.perf_counter() - start:.1f}s ({catalog.count(args.kind)} indexed)"
+        )
+    else:
+        start = time.perf_counter()
+        results = catalog.search(args.query, args.kind)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"{len(results)} results in {elapsed:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
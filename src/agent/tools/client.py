@@ -0,0 +1,215 @@
+"""
+Shared Jikan clients used by every Jikan tool.
+Calls are routed through the tiered response cache, then coalesced and rate limited
+process-wide before reaching the API. jikan_call is the blocking path and ajikan_call
+the native asyncio one; both share the cache and the rate limiter. The async path
+reads and writes the cache's SQLite tier in worker threads, off the event loop.
+
+Environment:
+    JIKAN_BASE_URL: Jikan API root to call instead of the public one, e.g. a local
+        stand-in (default https://api.jikan.moe/v4)
+"""
+
+from typing import Dict, Any
+from urllib.parse import urlparse
+from jikanpy import AioJikan, APIException, Jikan
+from ..transport import get_aio_session, get_session
+from .cache import TieredCache, MISSING, make_key
+from .ratelimit import (
+    acall_with_retry,
+    arecord_retry_after,
+    async_single_flight,
+    call_with_retry,
+    record_retry_after,
+    single_flight,
+)
+import aiohttp
+import asyncio
+import os
+import requests
+import threading
+import weakref
+
+JIKAN_BASE_URL = os.getenv("JIKAN_BASE_URL") or None
+JIKAN_HOST = urlparse(JIKAN_BASE_URL).netloc if JIKAN_BASE_URL else "api.jikan.moe"
+
+# Initialize Jikan client (on the shared pooled session) and response cache
+session = get_session(JIKAN_HOST)
+session.hooks["response"].append(record_retry_after)
+jikan = Jikan(selected_base=JIKAN_BASE_URL, session=session)
+cache = TieredCache.from_env()
+
+# aiohttp sessions are bound to the event loop that created them, so async clients
+# are pooled per loop (in practice, the single agent runtime loop)
+_aio_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AioJikan]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# Errors meaning Jikan could not be reached or refused the request
+UPSTREAM_ERRORS = (
+    APIException,
+    requests.RequestException,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+)
+
+
+# Lookups of the keys the cache warmer keeps fresh: key -> {"hits": n, "misses": n};
+# updated from executor threads and the runtime loop alike
+warm_lookups: Dict[str, Dict[str, int]] = {}
+_warm_lock = threading.Lock()
+
+
+def watch_warm(key: str) -> None:
+    """Starts counting user lookups of a key the cache warmer keeps fresh."""
+    with _warm_lock:
+        warm_lookups.setdefault(key, {"hits": 0, "misses": 0})
+
+
+def warm_counts(key: str) -> Dict[str, int]:
+    """A copy of a warmed key's lookup counts."""
+    with _warm_lock:
+        return dict(warm_lookups.get(key) or {"hits": 0, "misses": 0})
+
+
+def _track(key: str, hit: bool) -> None:
+    with _warm_lock:
+        counts = warm_lookups.get(key)
+        if counts is not None:
+            counts["hits" if hit else "misses"] += 1
+
+
+def _copy_arguments(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Copies dict arguments, since jikanpy pops query parameters while building URLs."""
+    return {k: dict(v) if isinstance(v, dict) else v for k, v in arguments.items()}
+
+
+def _fetch(endpoint: str, key: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Performs the upstream request for a cache miss and stores the response."""
+    # A flight that finished just before this one started may have filled the cache
+    cached = cache.get(endpoint, key, count=False)
+    if cached is not MISSING:
+        return cached
+
+    method = getattr(jikan, endpoint)
+    response = call_with_retry(lambda: method(**_copy_arguments(arguments)))
+    cache.set(endpoint, key, response)
+    return response
+
+
+def jikan_call(endpoint: str, **arguments: Any) -> Dict[str, Any]:
+    """Calls a Jikan endpoint, serving fresh cached responses when available.
+
+    Args:
+        endpoint: Name of the Jikan client method (e.g., 'anime', 'top', 'seasons')
+        **arguments: Keyword arguments for that method
+
+    Returns:
+        Dictionary containing the Jikan response
+    """
+    key = make_key(endpoint, arguments)
+    if cache.ttl_for(endpoint) > 0:
+        cached = cache.get(endpoint, key)
+        _track(key, cached is not MISSING)
+        if cached is not MISSING:
+            return cached
+
+    if endpoint == "random":
+        # Identical random calls are expected to return different results
+        return call_with_retry(lambda: jikan.random(**arguments))
+    return single_flight.do(key, lambda: _fetch(endpoint, key, arguments))
+
+
+def refresh(endpoint: str, **arguments: Any) -> Dict[str, Any]:
+    """Fetches a Jikan endpoint upstream and replaces its cache entry, fresh or not.
+
+    Args:
+        endpoint: Name of the Jikan client method
+        **arguments: Keyword arguments for that method, as the tools pass them
+
+    Returns:
+        Dictionary containing the Jikan response
+    """
+    key = make_key(endpoint, arguments)
+
+    def fetch() -> Dict[str, Any]:
+        method = getattr(jikan, endpoint)
+        response = call_with_retry(lambda: method(**_copy_arguments(arguments)))
+        cache.set(endpoint, key, response)
+        return response
+
+    return single_flight.do(key, fetch)
+
+
+def get_aio_jikan() -> AioJikan:
+    """Returns the async Jikan client for the running event loop, creating it once."""
+    loop = asyncio.get_running_loop()
+    client = _aio_clients.get(loop)
+    if client is None or client.session.closed:
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(arecord_retry_after)
+        client = _aio_clients[loop] = AioJikan(
+            selected_base=JIKAN_BASE_URL, session=get_aio_session(JIKAN_HOST, [trace])
+        )
+    return client
+
+
+async def aclose_aio_jikan() -> None:
+    """Closes the async Jikan client of the running event loop, if any."""
+    client = _aio_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def acache_get(endpoint: str, key: str, count: bool = True) -> Any:
+    """cache.get for the event loop: memory is checked in place, the disk tier (SQLite
+    behind the cache's lock) in a worker thread."""
+    cached = cache.peek(endpoint, key, count)
+    if cached is not MISSING:
+        return cached
+    if not cache.persistent:
+        # Memory only: nothing blocks, and get records the miss
+        return cache.get(endpoint, key, count)
+    return await asyncio.to_thread(cache.get, endpoint, key, count)
+
+
+async def acache_set(endpoint: str, key: str, value: Any) -> None:
+    """cache.set for the event loop; disk writes run in a worker thread."""
+    if cache.persistent:
+        await asyncio.to_thread(cache.set, endpoint, key, value)
+    else:
+        cache.set(endpoint, key, value)
+
+
+async def _afetch(endpoint: str, key: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Async version of _fetch."""
+    cached = await acache_get(endpoint, key, count=False)
+    if cached is not MISSING:
+        return cached
+
+    method = getattr(get_aio_jikan(), endpoint)
+    response = await acall_with_retry(lambda: method(**_copy_arguments(arguments)))
+    await acache_set(endpoint, key, response)
+    return response
+
+
+async def ajikan_call(endpoint: str, **arguments: Any) -> Dict[str, Any]:
+    """Async version of jikan_call.
+
+    Args:
+        endpoint: Name of the Jikan client method (e.g., 'anime', 'top', 'seasons')
+        **arguments: Keyword arguments for that method
+
+    Returns:
+        Dictionary containing the Jikan response
+    """
+    key = make_key(endpoint, arguments)
+    if cache.ttl_for(endpoint) > 0:
+        cached = await acache_get(endpoint, key)
+        _track(key, cached is not MISSING)
+        if cached is not MISSING:
+            return cached
+
+    if endpoint == "random":
+        return await acall_with_retry(lambda: get_aio_jikan().random(**arguments))
+    return await async_single_flight.do(key, lambda: _afetch(endpoint, key, arguments))
@@ -0,0 +1,270 @@
+"""
+Multi-page fetching for paginated Jikan endpoints.
+Page generators walk 'pagination.has_next_page' (the async one fetches a bounded
+window of pages concurrently), and a collector merges the pages into one compact,
+deduplicated result, stopping early once a limit or stop condition is reached.
+"""
+
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from .client import ajikan_call, jikan_call
+from .projection import project
+import asyncio
+import json
+import operator
+import os
+
+# Endpoints whose client method takes a 'page' argument
+PAGINATED = (
+    "top",
+    "seasons",
+    "reviews",
+    "recommendations",
+    "users",
+    "search",
+    "schedules",
+)
+MAX_PAGES = int(os.getenv("JIKAN_MAX_PAGES", "10"))
+PAGE_CONCURRENCY = int(os.getenv("JIKAN_PAGE_CONCURRENCY", "3"))
+
+# Suffixes accepted on 'where'/'stop_when' keys, longest first so '>=' wins over '>'
+OPERATORS = (
+    (">=", operator.ge),
+    ("<=", operator.le),
+    ("!=", operator.ne),
+    (">", operator.gt),
+    ("<", operator.lt),
+)
+
+
+def _has_next(response: Dict[str, Any]) -> bool:
+    return bool((response.get("pagination") or {}).get("has_next_page"))
+
+
+def _without_page(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """The call arguments minus any 'page' the caller passed; pages are walked here."""
+    return {key: value for key, value in arguments.items() if key != "page"}
+
+
+def iter_pages(
+    endpoint: str, arguments: Dict[str, Any], max_pages: int = MAX_PAGES
+) -> Iterator[Dict[str, Any]]:
+    """Yields successive pages of a Jikan endpoint until the last one or max_pages.
+
+    Args:
+        endpoint: Name of a paginated Jikan client method
+        arguments: Keyword arguments for that method; a 'page' among them is ignored
+        max_pages: Upper bound on pages fetched
+
+    Yields:
+        Raw Jikan responses, in page order
+    """
+    arguments = _without_page(arguments)
+    for page in range(1, max_pages + 1):
+        response = jikan_call(endpoint, **arguments, page=page)
+        yield response
+        if not _has_next(response):
+            return
+
+
+async def aiter_pages(
+    endpoint: str,
+    arguments: Dict[str, Any],
+    max_pages: int = MAX_PAGES,
+    concurrency: int = PAGE_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Async version of iter_pages that fetches up to `concurrency` pages at once.
+
+    Once the first page reports 'last_visible_page', the following pages are requested
+    in concurrent windows (still subject to the shared rate limiter) and yielded in
+    order. Pages still in flight are cancelled when the consumer stops early.
+    """
+    arguments = _without_page(arguments)
+    response = await ajikan_call(endpoint, **arguments, page=1)
+    yield response
+    last = (response.get("pagination") or {}).get("last_visible_page")
+    if not _has_next(response):
+        return
+    if not last:
+        # Without a page count, walk one page at a time
+        for page in range(2, max_pages + 1):
+            response = await ajikan_call(endpoint, **arguments, page=page)
+            yield response
+            if not _has_next(response):
+                return
+        return
+
+    last = min(last, max_pages)
+    for start in range(2, last + 1, max(1, concurrency)):
+        window = range(start, min(start + concurrency, last + 1))
+        tasks = [
+            asyncio.ensure_future(ajikan_call(endpoint, **arguments, page=page))
+            for page in window
+        ]
+        try:
+            for task in tasks:
+                response = await task
+                yield response
+                if not _has_next(response):
+                    return
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def item_key(item: Any) -> str:
+    """Identity of a list item, used to drop duplicates across pages."""
+    if isinstance(item, dict):
+        if item.get("mal_id") is not None:
+            return str(item["mal_id"])
+        # User list and recommendation entries wrap the anime/manga they refer to
+        for field in ("entry", "anime", "manga"):
+            nested = item.get(field)
+            if isinstance(nested, dict) and nested.get("mal_id") is not None:
+                return f"{field}:{nested['mal_id']}"
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def matches(item: Any, conditions: Optional[Dict[str, Any]]) -> bool:
+    """Checks an item against conditions like {"score>=": 8, "genres": "Action"}.
+
+    A bare key tests equality, or membership when the item's field is a list; keys may
+    end in >=, <=, >, < or != for comparisons. Missing fields never match.
+    """
+    if not conditions:
+        return True
+    if not isinstance(item, dict):
+        return False
+    for key, expected in conditions.items():
+        op = None
+        for suffix, candidate in OPERATORS:
+            if key.endswith(suffix):
+                key, op = key[: -len(suffix)].strip(), candidate
+                break
+        actual = item.get(key)
+        if actual is None:
+            return False
+        if op is None:
+            if isinstance(actual, list):
+                if expected not in actual:
+                    return False
+            elif actual != expected:
+                return False
+            continue
+        try:
+            if not op(actual, expected):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+class PageCollector:
+    """Merges projected pages into one result, deduplicating items as they arrive.
+
+    Attributes:
+        limit: Maximum number of items kept
+        where: Conditions an item must meet to be kept
+        stop_when: Conditions that end pagination at the first item meeting them
+        fields: Keys kept on each item (None keeps the projected item)
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        extension: Optional[str] = None,
+        limit: int = 100,
+        where: Optional[Dict[str, Any]] = None,
+        stop_when: Optional[Dict[str, Any]] = None,
+        fields: Optional[List[str]] = None,
+    ) -> None:
+        self.endpoint = endpoint
+        self.extension = extension
+        self.limit = limit
+        self.where = where
+        self.stop_when = stop_when
+        self.fields = fields
+        self.items: List[Any] = []
+        self.seen: set = set()
+        self.pages = 0
+        self.scanned = 0
+        self.duplicates = 0
+        self.done = False
+        self.has_more = False
+
+    def add(self, response: Dict[str, Any]) -> bool:
+        """Adds one raw page.
+
+        Returns:
+            True once no further pages are needed
+        """
+        self.pages += 1
+        self.has_more = _has_next(response)
+        data = project(response, self.endpoint, self.extension).get("data") or []
+        for item in data if isinstance(data, list) else [data]:
+            self.scanned += 1
+            if self.stop_when and matches(item, self.stop_when):
+                self.done = True
+                break
+            key = item_key(item)
+            if key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+            if not matches(item, self.where):
+                continue
+            if self.fields and isinstance(item, dict):
+                item = {k: item[k] for k in self.fields if k in item}
+            self.items.append(item)
+            if len(self.items) >= self.limit:
+                self.done = True
+                break
+        return self.done or not self.has_more
+
+    def result(self) -> Dict[str, Any]:
+        """Returns the merged, compact tool result."""
+        return {
+            "data": self.items,
+            "count": len(self.items),
+            "pages_fetched": self.pages,
+            "items_scanned": self.scanned,
+            "duplicates_dropped": self.duplicates,
+            "stopped_early": self.done,
+            "has_more": self.has_more or self.done,
+        }
+
+
+def fetch_all(
+    endpoint: str, arguments: Dict[str, Any], **options: Any
+) -> Dict[str, Any]:
+    """Fetches and merges pages of a Jikan endpoint.
+
+    Args:
+        endpoint: Name of a paginated Jikan client method
+        arguments: Keyword arguments for that method; a 'page' among them is ignored
+        **options: max_pages, plus PageCollector options (limit, where, stop_when, fields)
+
+    Returns:
+        Dictionary with the merged items and pagination statistics
+    """
+    max_pages = options.pop("max_pages", MAX_PAGES)
+    collector = PageCollector(endpoint, arguments.get("extension"), **options)
+    for response in iter_pages(endpoint, arguments, max_pages):
+        if collector.add(response):
+            break
+    return collector.result()
+
+
+async def afetch_all(
+    endpoint: str, arguments: Dict[str, Any], **options: Any
+) -> Dict[str, Any]:
+    """Async version of fetch_all, fetching pages concurrently."""
+    max_pages = options.pop("max_pages", MAX_PAGES)
+    collector = PageCollector(endpoint, arguments.get("extension"), **options)
+    pages = aiter_pages(endpoint, arguments, max_pages)
+    try:
+        async for response in pages:
+            if collector.add(response):
+                break
+    finally:
+        await pages.aclose()
+    return collector.result()
@@ -0,0 +1,203 @@
+"""
+Full profiles of an anime or manga in one call.
+Describing a title used to take the model one step per resource: the full entry, then
+its characters, staff, episodes and recommendations. The profile fetches all of them
+concurrently, with the same arguments as the jikan_anime/jikan_manga tools so they
+share the response cache and the rate limiter, and folds them into one compact
+document.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .batch import Call, afetch_many, ais_cached, fetch_many, is_cached
+from .projection import project
+
+# Extensions fetched for each type; 'full' is the entry itself
+SECTIONS: Dict[str, Tuple[str, ...]] = {
+    "anime": ("full", "characters", "staff", "episodes", "recommendations"),
+    "manga": ("full", "characters", "recommendations"),
+}
+# Entries kept of each list section; the rest are counted
+MAX_CHARACTERS = 12
+MAX_STAFF = 10
+MAX_EPISODES = 13
+MAX_RECOMMENDATIONS = 8
+# Staff positions listed first, most telling first
+KEY_POSITIONS = (
+    "Director",
+    "Original Creator",
+    "Series Composition",
+    "Script",
+    "Character Design",
+    "Music",
+)
+
+
+def _sections(type: str, sections: Optional[Iterable[str]]) -> List[str]:
+    """The extensions to fetch, always including the entry itself."""
+    if type not in SECTIONS:
+        raise ValueError(f"Unsupported type '{type}'; use one of {tuple(SECTIONS)}")
+    wanted = set(sections or SECTIONS[type]) | {"full"}
+    unknown = wanted - set(SECTIONS[type])
+    if unknown:
+        raise ValueError(
+            f"Unsupported sections {sorted(unknown)} for {type}; "
+            f"use any of {SECTIONS[type]}"
+        )
+    return [s for s in SECTIONS[type] if s in wanted]
+
+
+def _calls(type: str, id: int, sections: List[str]) -> Dict[str, Call]:
+    """One call per section, with the arguments the jikan_anime/jikan_manga tools use."""
+    return {section: (type, {"id": id, "extension": section}) for section in sections}
+
+
+def _name(value: Any) -> Optional[str]:
+    return (value or {}).get("name") or (value or {}).get("title")
+
+
+def _listing(items: List[Any], limit: int) -> Dict[str, Any]:
+    listing: Dict[str, Any] = {"items": items[:limit]}
+    if len(items) > limit:
+        listing["more"] = len(items) - limit
+    return listing
+
+
+def _characters(response: Dict[str, Any]) -> Dict[str, Any]:
+    """Main characters first, then by favorites, with their Japanese voice actor."""
+    entries = sorted(
+        response.get("data") or [],
+        key=lambda c: (c.get("role") != "Main", -(c.get("favorites") or 0)),
+    )
+    characters = []
+    for entry in entries:
+        character = {
+            "mal_id": (entry.get("character") or {}).get("mal_id"),
+            "name": _name(entry.get("character")),
+            "role": entry.get("role"),
+        }
+        actors = entry.get("voice_actors") or []
+        japanese = [a for a in actors if a.get("language") == "Japanese"] or actors
+        if japanese:
+            character["voice_actor"] = _name(japanese[0].get("person"))
+        characters.append(character)
+    return _listing(characters, MAX_CHARACTERS)
+
+
+def _staff(response: Dict[str, Any]) -> Dict[str, Any]:
+    """Staff holding the key positions first."""
+
+    def rank(entry: Dict[str, Any]) -> int:
+        positions = entry.get("positions") or []
+        return min(
+            (KEY_POSITIONS.index(p) for p in positions if p in KEY_POSITIONS),
+            default=len(KEY_POSITIONS),
+        )
+
+    staff = [
+        {"name": _name(entry.get("person")), "positions": entry.get("positions")}
+        for entry in sorted(response.get("data") or [], key=rank)
+    ]
+    return _listing(staff, MAX_STAFF)
+
+
+def _episodes(response: Dict[str, Any]) -> Dict[str, Any]:
+    """The first episodes as compact rows, plus filler and recap counts."""
+    episodes = response.get("data") or []
+    listing = _listing(
+        [
+            {
+                "episode": e.get("mal_id"),
+                "title": e.get("title"),
+                "aired": (e.get("aired") or "")[:10] or None,
+                "score": e.get("score"),
+            }
+            for e in episodes
+        ],
+        MAX_EPISODES,
+    )
+    listing["filler"] = sum(bool(e.get("filler")) for e in episodes)
+    listing["recap"] = sum(bool(e.get("recap")) for e in episodes)
+    if (response.get("pagination") or {}).get("has_next_page"):
+        listing["more_pages"] = True
+    return listing
+
+
+def _recommendations(response: Dict[str, Any]) -> Dict[str, Any]:
+    entries = sorted(response.get("data") or [], key=lambda r: -(r.get("votes") or 0))
+    return _listing(
+        [
+            {
+                "mal_id": (r.get("entry") or {}).get("mal_id"),
+                "title": _name(r.get("entry")),
+                "votes": r.get("votes"),
+            }
+            for r in entries
+        ],
+        MAX_RECOMMENDATIONS,
+    )
+
+
+SECTION_BUILDERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "characters": _characters,
+    "staff": _staff,
+    "episodes": _episodes,
+    "recommendations": _recommendations,
+}
+
+
+def _profile(
+    type: str,
+    id: int,
+    sections: List[str],
+    responses: Dict[str, Any],
+    cached: int,
+) -> Dict[str, Any]:
+    """Builds the compact profile from per-extension responses or errors."""
+    profile: Dict[str, Any] = {"type": type, "id": id}
+    errors = {}
+    for section in sections:
+        response = responses[section]
+        if isinstance(response, BaseException):
+            errors[section] = str(response) or response.__class__.__name__
+        elif section == "full":
+            # Kept apart from the sections; the entry has an 'episodes' count too
+            profile["entry"] = project(response, type, "full").get("data") or {}
+        else:
+            profile[section] = SECTION_BUILDERS[section](response)
+    return {
+        **profile,
+        "errors": errors,
+        "cached": cached,
+        "fetched": len(sections) - cached,
+    }
+
+
+def full_profile(
+    type: str, id: int, sections: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """Looks up an anime or manga together with its related resources.
+
+    Args:
+        type: 'anime' or 'manga'
+        id: MyAnimeList ID
+        sections: Extensions to include (defaults to SECTIONS[type]); 'full' is always
+            fetched
+
+    Returns:
+        Dictionary with the projected 'entry', one key per other section, per-section
+        'errors' and cache counts
+    """
+    wanted = _sections(type, sections)
+    calls = _calls(type, id, wanted)
+    cached = sum(is_cached(*call) for call in calls.values())
+    return _profile(type, id, wanted, fetch_many(calls), cached)
+
+
+async def afull_profile(
+    type: str, id: int, sections: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """Async version of full_profile."""
+    wanted = _sections(type, sections)
+    calls = _calls(type, id, wanted)
+    cached = sum([await ais_cached(*call) for call in calls.values()])
+    return _profile(type, id, wanted, await afetch_many(calls), cached)
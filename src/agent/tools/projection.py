@@ -0,0 +1,299 @@
+"""
+Payload projection for Jikan tool outputs.
+Raw Jikan responses carry image URL sets in several formats, trailers, licensor lists,
+relation blobs, response headers and pagination metadata, all of which end up in the
+model context. Projections slim responses down before they are returned to the LLM:
+per-endpoint field allowlists, list truncation with counts, image-set collapse and
+text clipping. The cache always stores the raw response; projection happens on return.
+"""
+
+from typing import Any, Deque, Dict, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass
+import json
+import os
+import threading
+
+
+@dataclass(frozen=True)
+class Projection:
+    """How to slim down one endpoint's response.
+
+    Attributes:
+        fields: Allowlist of keys kept on each item in 'data' (None keeps every key)
+        max_items: Longest list kept anywhere in the response; the rest is counted
+        max_text: Longest string kept anywhere in the response, in characters
+    """
+
+    fields: Optional[Tuple[str, ...]] = None
+    max_items: int = 25
+    max_text: int = 1200
+
+
+ANIME_FIELDS = (
+    "mal_id",
+    "url",
+    "images",
+    "trailer",
+    "title",
+    "title_english",
+    "title_japanese",
+    "type",
+    "source",
+    "episodes",
+    "status",
+    "aired",
+    "duration",
+    "rating",
+    "score",
+    "scored_by",
+    "rank",
+    "popularity",
+    "members",
+    "favorites",
+    "synopsis",
+    "background",
+    "season",
+    "year",
+    "broadcast",
+    "studios",
+    "genres",
+    "explicit_genres",
+    "themes",
+    "demographics",
+    "relations",
+    "theme",
+    "streaming",
+)
+MANGA_FIELDS = (
+    "mal_id",
+    "url",
+    "images",
+    "title",
+    "title_english",
+    "title_japanese",
+    "type",
+    "chapters",
+    "volumes",
+    "status",
+    "published",
+    "score",
+    "scored_by",
+    "rank",
+    "popularity",
+    "members",
+    "favorites",
+    "synopsis",
+    "background",
+    "authors",
+    "serializations",
+    "genres",
+    "explicit_genres",
+    "themes",
+    "demographics",
+    "relations",
+)
+CHARACTER_FIELDS = (
+    "mal_id",
+    "url",
+    "images",
+    "name",
+    "name_kanji",
+    "nicknames",
+    "favorites",
+    "about",
+    "anime",
+    "manga",
+    "voices",
+)
+PERSON_FIELDS = (
+    "mal_id",
+    "url",
+    "images",
+    "name",
+    "given_name",
+    "family_name",
+    "birthday",
+    "favorites",
+    "about",
+    "anime",
+    "manga",
+    "voices",
+)
+
+ENTITY_FIELDS = tuple(
+    dict.fromkeys(ANIME_FIELDS + MANGA_FIELDS + CHARACTER_FIELDS + PERSON_FIELDS)
+)
+
+DEFAULT_PROJECTION = Projection()
+
+# Keyed on (endpoint, extension); extension None is the base resource, and "*" matches
+# any extension of the endpoint
+PROJECTIONS: Dict[Tuple[str, Optional[str]], Projection] = {
+    ("anime", None): Projection(fields=ANIME_FIELDS),
+    ("anime", "full"): Projection(fields=ANIME_FIELDS),
+    ("manga", None): Projection(fields=MANGA_FIELDS),
+    ("manga", "full"): Projection(fields=MANGA_FIELDS),
+    ("characters", None): Projection(fields=CHARACTER_FIELDS),
+    ("characters", "full"): Projection(fields=CHARACTER_FIELDS),
+    ("people", None): Projection(fields=PERSON_FIELDS),
+    ("people", "full"): Projection(fields=PERSON_FIELDS),
+    ("search", "*"): Projection(fields=ENTITY_FIELDS, max_text=400),
+    ("seasons", "*"): Projection(fields=ANIME_FIELDS, max_text=400),
+    ("schedules", "*"): Projection(fields=ANIME_FIELDS, max_text=300),
+    ("top", "*"): Projection(fields=ENTITY_FIELDS, max_text=400),
+    ("users", "*"): Projection(max_text=600),
+    ("reviews", "*"): Projection(max_items=10, max_text=800),
+}
+
+# Resource references like {"mal_id", "type", "name", "url"} collapse to their name
+NAMED_LISTS = {
+    "genres",
+    "explicit_genres",
+    "themes",
+    "demographics",
+    "studios",
+    "producers",
+    "licensors",
+    "authors",
+    "serializations",
+}
+DROPPED_KEYS = {"headers", "jikan_url", "titles", "title_synonyms", "external"}
+
+
+def _collapse_images(images: Any) -> Any:
+    """Collapses Jikan's jpg/webp image sets into one URL."""
+    if not isinstance(images, dict):
+        return images
+    for fmt in ("jpg", "webp"):
+        urls = images.get(fmt)
+        if isinstance(urls, dict) and urls.get("image_url"):
+            return urls["image_url"]
+    return images.get("image_url", images)
+
+
+def _slim(value: Any, projection: Projection, key: Optional[str] = None) -> Any:
+    """Applies the generic slimming rules recursively."""
+    if key == "images":
+        return _collapse_images(value)
+    if key == "trailer" and isinstance(value, dict):
+        return value.get("url")
+    if key in NAMED_LISTS and isinstance(value, list):
+        return [v.get("name") if isinstance(v, dict) else v for v in value]
+    if key == "pagination" and isinstance(value, dict):
+        return {
+            "current_page": value.get("current_page"),
+            "last_visible_page": value.get("last_visible_page"),
+            "has_next_page": value.get("has_next_page"),
+        }
+
+    if isinstance(value, dict):
+        # Date ranges and broadcast slots carry a human readable 'string' form
+        if "string" in value and ("prop" in value or "timezone" in value):
+            return value["string"]
+        slimmed = {}
+        for k, v in value.items():
+            if k in DROPPED_KEYS or v is None:
+                continue
+            slimmed[k] = _slim(v, projection, k)
+            if isinstance(v, list) and len(slimmed[k]) < len(v):
+                slimmed[f"{k}_total"] = len(v)
+        return slimmed
+    if isinstance(value, list):
+        return [_slim(v, projection) for v in value[: projection.max_items]]
+    if isinstance(value, str) and len(value) > projection.max_text:
+        return value[: projection.max_text].rstrip() + "…"
+    return value
+
+
+def _allow(item: Any, fields: Optional[Tuple[str, ...]]) -> Any:
+    if fields is None or not isinstance(item, dict):
+        return item
+    return {k: v for k, v in item.items() if k in fields}
+
+
+def projection_for(endpoint: str, extension: Optional[str] = None) -> Projection:
+    """Returns the projection registered for an endpoint and extension."""
+    return (
+        PROJECTIONS.get((endpoint, extension))
+        or PROJECTIONS.get((endpoint, "*"))
+        or DEFAULT_PROJECTION
+    )
+
+
+def project(
+    response: Dict[str, Any],
+    endpoint: str,
+    extension: Optional[str] = None,
+    raw: bool = False,
+) -> Dict[str, Any]:
+    """Slims a Jikan response down before it is handed to the model.
+
+    Args:
+        response: Raw Jikan response
+        endpoint: Name of the Jikan endpoint that produced it
+        extension: Extension the endpoint was called with, if any
+        raw: Return the response untouched (opt-in full mode)
+
+    Returns:
+        A new, projected dictionary; the input is never mutated
+    """
+    if raw or os.getenv("JIKAN_PROJECTION", "on").lower() == "off":
+        return response
+
+    projection = projection_for(endpoint, extension)
+    data = response.get("data")
+    if isinstance(data, list):
+        data = [_allow(item, projection.fields) for item in data]
+    else:
+        data = _allow(data, projection.fields)
+    projected = _slim({**response, "data": data}, projection)
+    stats.record(endpoint, response, projected)
+    return projected
+
+
+class ProjectionStats:
+    """Bytes and estimated tokens saved by projection, per call and per endpoint."""
+
+    # Rough characters-per-token ratio for JSON payloads
+    BYTES_PER_TOKEN = 4
+
+    def __init__(self, history: int = 100) -> None:
+        self._lock = threading.Lock()
+        self.calls: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.endpoints: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, raw: Any, projected: Any) -> Dict[str, Any]:
+        """Measures one projection and returns its report."""
+        raw_bytes = len(json.dumps(raw, default=str).encode())
+        projected_bytes = len(json.dumps(projected, default=str).encode())
+        saved = raw_bytes - projected_bytes
+        report = {
+            "endpoint": endpoint,
+            "raw_bytes": raw_bytes,
+            "projected_bytes": projected_bytes,
+            "saved_bytes": saved,
+            "saved_tokens": saved // self.BYTES_PER_TOKEN,
+        }
+        with self._lock:
+            self.calls.append(report)
+            totals = self.endpoints.setdefault(
+                endpoint,
+                {"calls": 0, "raw_bytes": 0, "projected_bytes": 0, "saved_tokens": 0},
+            )
+            totals["calls"] += 1
+            totals["raw_bytes"] += raw_bytes
+            totals["projected_bytes"] += projected_bytes
+            totals["saved_tokens"] += report["saved_tokens"]
+        return report
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns recent per-call reports and per-endpoint totals."""
+        with self._lock:
+            return {
+                "recent": list(self.calls),
+                "endpoints": {k: dict(v) for k, v in self.endpoints.items()},
+            }
+
+
+stats = ProjectionStats()
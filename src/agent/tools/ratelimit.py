@@ -0,0 +1,304 @@
+"""
+Process-wide rate limiting and request coalescing for the Jikan API.
+Jikan allows roughly 3 requests/second and 60 requests/minute; every thread in the
+process draws from the same token buckets, identical in-flight calls are collapsed
+into a single upstream request, and 429 responses are retried honoring Retry-After.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from jikanpy import APIException
+import asyncio
+import os
+import random
+import threading
+import time
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+# Retry-After header of the most recent throttled response, per thread / asyncio task
+_last_retry_after: ContextVar[Optional[str]] = ContextVar(
+    "jikan_retry_after", default=None
+)
+
+
+def parse_limits(spec: str) -> List[Tuple[int, float]]:
+    """Parses a limit spec like '3/1,60/60' into (requests, seconds) pairs."""
+    limits = []
+    for part in spec.split(","):
+        count, _, period = part.strip().partition("/")
+        limits.append((int(count), float(period or 1)))
+    return limits
+
+
+class RateLimiter:
+    """Thread-safe token buckets; a request needs a token from every bucket.
+
+    Tokens are reserved up front (a bucket may go into debt), so callers get back how
+    long to wait and can sleep either blocking or with asyncio.
+    """
+
+    def __init__(self, limits: Optional[List[Tuple[int, float]]] = None) -> None:
+        limits = limits or [(3, 1.0), (60, 60.0)]
+        now = time.monotonic()
+        # Each bucket is [capacity, tokens, refill rate per second]
+        self._buckets = [[float(n), float(n), n / period] for n, period in limits]
+        self._updated = now
+        self._blocked_until = now
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {"acquired": 0, "throttled": 0, "waited": 0.0}
+
+    def reserve(self) -> float:
+        """Takes a token from every bucket.
+
+        Returns:
+            Seconds the caller must wait before sending the request
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            delay = max(0.0, self._blocked_until - now)
+            for bucket in self._buckets:
+                capacity, tokens, rate = bucket
+                tokens = min(capacity, tokens + elapsed * rate) - 1
+                bucket[1] = tokens
+                if tokens < 0:
+                    delay = max(delay, -tokens / rate)
+            self.stats["acquired"] += 1
+            if delay > 0:
+                self.stats["throttled"] += 1
+                self.stats["waited"] += delay
+            return delay
+
+    def available(self) -> float:
+        """Tokens left right now in the most depleted bucket, without taking any."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return 0.0
+            elapsed = now - self._updated
+            return min(
+                min(capacity, tokens + elapsed * rate)
+                for capacity, tokens, rate in self._buckets
+            )
+
+    def acquire(self) -> None:
+        """Blocks until a request may be sent."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self) -> None:
+        """Waits without blocking the event loop until a request may be sent."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Holds every caller back for the given number of seconds (e.g., Retry-After)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller runs the function; everyone arriving while it is in flight waits
+    and receives the same result (or exception).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.stats: Dict[str, int] = {"executed": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Runs fn for key, or waits for the identical call already in flight."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.stats["executed"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight; flights are tracked per event loop."""
+
+    def __init__(self) -> None:
+        self._flights: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.stats: Dict[str, int] = {"executed": 0, "coalesced": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Awaits fn for key, or the identical call already in flight.
+
+        If the caller running a flight is cancelled, its followers are not: the
+        first of them to wake up runs fn itself and the others follow it.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        while (future := self._flights.get(flight_key)) is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not future.cancelled() or (task and task.cancelling()):
+                    raise
+
+        future = self._flights[flight_key] = loop.create_future()
+        self.stats["executed"] += 1
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._flights[flight_key]
+
+
+def record_retry_after(response: Any, *args: Any, **kwargs: Any) -> Any:
+    """Requests response hook remembering Retry-After of throttled responses."""
+    if response.status_code in RETRYABLE_STATUS:
+        _last_retry_after.set(response.headers.get("Retry-After"))
+    return response
+
+
+async def arecord_retry_after(session: Any, context: Any, params: Any) -> None:
+    """aiohttp on_request_end trace hook remembering Retry-After of throttled responses."""
+    if params.response.status in RETRYABLE_STATUS:
+        _last_retry_after.set(params.response.headers.get("Retry-After"))
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Converts a Retry-After header (seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float], base: float) -> float:
+    """Returns how long to wait before retry number `attempt` (0-based)."""
+    if retry_after is not None:
+        return retry_after
+    return base * (2**attempt) + random.uniform(0, base)
+
+
+# Shared process-wide instances
+limiter = RateLimiter(parse_limits(os.getenv("JIKAN_RATE_LIMITS", "3/1,60/60")))
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
+MAX_RETRIES = int(os.getenv("JIKAN_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("JIKAN_BACKOFF_BASE", "1.0"))
+retry_stats: Dict[str, int] = {"retries": 0, "rate_limited": 0, "failed": 0}
+
+
+def _retry_delay(error: APIException, attempt: int) -> Optional[float]:
+    """Returns how long to wait before retrying, or None if the error is final."""
+    if error.status_code == 429:
+        retry_stats["rate_limited"] += 1
+    if error.status_code not in RETRYABLE_STATUS or attempt == MAX_RETRIES:
+        retry_stats["failed"] += 1
+        return None
+    retry_stats["retries"] += 1
+    retry_after = retry_after_seconds(_last_retry_after.get())
+    delay = backoff_delay(attempt, retry_after, BACKOFF_BASE)
+    if error.status_code == 429:
+        # Holds back every caller; the next acquire waits it out
+        limiter.pause(delay)
+        return 0.0
+    return delay
+
+
+def call_with_retry(fn: Callable[[], Any]) -> Any:
+    """Runs a Jikan request under the rate limiter, retrying throttled/5xx responses.
+
+    Args:
+        fn: Zero-argument callable performing one Jikan request
+
+    Returns:
+        Whatever fn returns once it succeeds
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        _last_retry_after.set(None)
+        try:
+            return fn()
+        except APIException as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+async def acall_with_retry(fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Async version of call_with_retry.
+
+    Args:
+        fn: Zero-argument callable returning an awaitable Jikan request
+
+    Returns:
+        Whatever the awaitable resolves to once it succeeds
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.aacquire()
+        _last_retry_after.set(None)
+        try:
+            return await fn()
+        except APIException as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+
+
+def stats() -> Dict[str, Any]:
+    """Returns limiter, coalescing and retry counters."""
+    return {
+        "limiter": dict(limiter.stats),
+        "single_flight": dict(single_flight.stats),
+        "async_single_flight": dict(async_single_flight.stats),
+        **retry_stats,
+    }
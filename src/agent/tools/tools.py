@@ -3,20 +3,58 @@ LangChain Tools for Jikan API (MyAnimeList unofficial API), and Trace Moe API (I
 Provides tools for accessing anime, manga, character, and user information from MyAnimeList, and scene locater tools.
 """
 
-from typing import Dict, Any, Optional, List
-from langchain_core.tools import tool
-from jikanpy import Jikan
-import requests
+from typing import Dict, Any, Optional, List, Callable
+from langchain_core.tools import tool, BaseTool
+from .analytics import auser_analytics, user_analytics
+from .batch import abatch_lookup, batch_lookup
+from .catalog import get_catalog
+from .client import jikan_call, ajikan_call, UPSTREAM_ERRORS
+from .pagination import PAGINATED, afetch_all, fetch_all
+from .profile import afull_profile, full_profile
+from .projection import project
+from . import tracemoe
+import asyncio
 import json
 
-# Initialize Jikan client
-jikan = Jikan()
-trace_moe = "https://api.trace.moe"
 
+def with_coroutine(coroutine: Callable[..., Any]) -> Callable[[BaseTool], BaseTool]:
+    """Attaches a native async implementation to a tool.
 
+    The agent's async entry points (astream/ainvoke) use it so that several tool calls
+    in one step run concurrently instead of one after another.
+
+    Args:
+        coroutine: Async function taking the same arguments as the tool
+    """
+
+    def decorator(async_tool: BaseTool) -> BaseTool:
+        async_tool.coroutine = coroutine  # type: ignore
+        return async_tool
+
+    return decorator
+
+
+def with_async(endpoint: str) -> Callable[[BaseTool], BaseTool]:
+    """Attaches the generic async implementation of a Jikan endpoint to its tool.
+
+    Args:
+        endpoint: Name of the Jikan client method the tool wraps
+    """
+
+    async def coroutine(raw: bool = False, **arguments: Any) -> Dict[str, Any]:
+        response = await ajikan_call(endpoint, **arguments)
+        return project(response, endpoint, arguments.get("extension"), raw)
+
+    return with_coroutine(coroutine)
+
+
+@with_async("anime")
 @tool
 def jikan_anime(
-    id: int, extension: Optional[str] = None, page: Optional[int] = None
+    id: int,
+    extension: Optional[str] = None,
+    page: Optional[int] = None,
+    raw: bool = False,
 ) -> Dict[str, Any]:
     """Gets information on an anime by ID.
 
@@ -24,13 +62,16 @@ def jikan_anime(
         id: ID of the anime to get information of
         extension: Special information to get (e.g., 'episodes', 'news', 'characters')
         page: Page number of results (for paginated extensions)
+        raw: Return the unabridged Jikan response instead of the slimmed one
 
     Returns:
         Dictionary containing anime information
     """
-    return jikan.anime(id=id, extension=extension, page=page)
+    response = jikan_call("anime", id=id, extension=extension, page=page)
+    return project(response, "anime", extension, raw)
 
 
+@with_async("anime_episode_by_id")
 @tool
 def jikan_anime_episode_by_id(anime_id: int, episode_id: int) -> Dict[str, Any]:
     """Gets specific episode information by anime ID and episode ID.
@@ -42,23 +83,32 @@ def jikan_anime_episode_by_id(anime_id: int, episode_id: int) -> Dict[str, Any]:
     Returns:
         Dictionary containing episode information
     """
-    return jikan.anime_episode_by_id(anime_id=anime_id, episode_id=episode_id)
+    response = jikan_call(
+        "anime_episode_by_id", anime_id=anime_id, episode_id=episode_id
+    )
+    return project(response, "anime_episode_by_id")
 
 
+@with_async("characters")
 @tool
-def jikan_characters(id: int, extension: Optional[str] = None) -> Dict[str, Any]:
+def jikan_characters(
+    id: int, extension: Optional[str] = None, raw: bool = False
+) -> Dict[str, Any]:
     """Gets information on a character by ID.
 
     Args:
         id: ID of the character
         extension: Special information to get (e.g., 'full', 'anime', 'manga')
+        raw: Return the unabridged Jikan response instead of the slimmed one
 
     Returns:
         Dictionary containing character information
     """
-    return jikan.characters(id=id, extension=extension)
+    response = jikan_call("characters", id=id, extension=extension)
+    return project(response, "characters", extension, raw)
 
 
+@with_async("clubs")
 @tool
 def jikan_clubs(id: int, extension: Optional[str] = None) -> Dict[str, Any]:
     """Gets information on a club by ID.
@@ -70,9 +120,11 @@ def jikan_clubs(id: int, extension: Optional[str] = None) -> Dict[str, Any]:
     Returns:
         Dictionary containing club information
     """
-    return jikan.clubs(id=id, extension=extension)
+    response = jikan_call("clubs", id=id, extension=extension)
+    return project(response, "clubs", extension)
 
 
+@with_async("genres")
 @tool
 def jikan_genres(type: str, filter: Optional[str] = None) -> Dict[str, Any]:
     """Gets anime or manga genres.
@@ -84,12 +136,17 @@ def jikan_genres(type: str, filter: Optional[str] = None) -> Dict[str, Any]:
     Returns:
         Dictionary containing genre information
     """
-    return jikan.genres(type=type, filter=filter)
+    response = jikan_call("genres", type=type, filter=filter)
+    return project(response, "genres")
 
 
+@with_async("manga")
 @tool
 def jikan_manga(
-    id: int, extension: Optional[str] = None, page: Optional[int] = None
+    id: int,
+    extension: Optional[str] = None,
+    page: Optional[int] = None,
+    raw: bool = False,
 ) -> Dict[str, Any]:
     """Gets information on a manga by ID.
 
@@ -97,27 +154,35 @@ def jikan_manga(
         id: ID of the manga
         extension: Special information to get (e.g., 'characters', 'news', 'reviews')
         page: Page number of results (for paginated extensions)
+        raw: Return the unabridged Jikan response instead of the slimmed one
 
     Returns:
         Dictionary containing manga information
     """
-    return jikan.manga(id=id, extension=extension, page=page)
+    response = jikan_call("manga", id=id, extension=extension, page=page)
+    return project(response, "manga", extension, raw)
 
 
+@with_async("people")
 @tool
-def jikan_people(id: int, extension: Optional[str] = None) -> Dict[str, Any]:
+def jikan_people(
+    id: int, extension: Optional[str] = None, raw: bool = False
+) -> Dict[str, Any]:
     """Gets information on a person by ID.
 
     Args:
         id: ID of the person
         extension: Special information to get (e.g., 'full', 'anime', 'manga', 'voices')
+        raw: Return the unabridged Jikan response instead of the slimmed one
 
     Returns:
         Dictionary containing person information
     """
-    return jikan.people(id=id, extension=extension)
+    response = jikan_call("people", id=id, extension=extension)
+    return project(response, "people", extension, raw)
 
 
+@with_async("producers")
 @tool
 def jikan_producers(id: int, extension: Optional[str] = None) -> Dict[str, Any]:
     """Gets anime by producer/studio/licensor.
@@ -129,9 +194,11 @@ def jikan_producers(id: int, extension: Optional[str] = None) -> Dict[str, Any]:
     Returns:
         Dictionary containing producer information
     """
-    return jikan.producers(id=id, extension=extension)
+    response = jikan_call("producers", id=id, extension=extension)
+    return project(response, "producers", extension)
 
 
+@with_async("random")
 @tool
 def jikan_random(type: str) -> Dict[str, Any]:
     """Gets a random resource of specified type.
@@ -142,9 +209,11 @@ def jikan_random(type: str) -> Dict[str, Any]:
     Returns:
         Dictionary containing random resource information
     """
-    return jikan.random(type=type)
+    response = jikan_call("random", type=type)
+    return project(response, "random")
 
 
+@with_async("recommendations")
 @tool
 def jikan_recommendations(type: str, page: Optional[int] = None) -> Dict[str, Any]:
     """Gets recommendations for anime or manga.
@@ -156,9 +225,11 @@ def jikan_recommendations(type: str, page: Optional[int] = None) -> Dict[str, An
     Returns:
         Dictionary containing recommendations
     """
-    return jikan.recommendations(type=type, page=page)
+    response = jikan_call("recommendations", type=type, page=page)
+    return project(response, "recommendations")
 
 
+@with_async("reviews")
 @tool
 def jikan_reviews(type: str, page: Optional[int] = None) -> Dict[str, Any]:
     """Gets reviews for anime or manga.
@@ -170,9 +241,11 @@ def jikan_reviews(type: str, page: Optional[int] = None) -> Dict[str, Any]:
     Returns:
         Dictionary containing reviews
     """
-    return jikan.reviews(type=type, page=page)
+    response = jikan_call("reviews", type=type, page=page)
+    return project(response, "reviews")
 
 
+@with_async("schedules")
 @tool
 def jikan_schedules(
     day: Optional[str] = None,
@@ -189,32 +262,113 @@ def jikan_schedules(
     Returns:
         Dictionary containing scheduled anime
     """
-    return jikan.schedules(day=day, page=page, parameters=parameters)
+    response = jikan_call("schedules", day=day, page=page, parameters=parameters)
+    return project(response, "schedules")
 
 
+def _local_search(search_type: str, query: str, limit: int = 10) -> Dict[str, Any]:
+    """Answers a title search from the local catalog."""
+    return {
+        "data": get_catalog().search(query, search_type, limit=limit),
+        "source": "local catalog",
+    }
+
+
+def _remember_search(search_type: str, response: Dict[str, Any]) -> None:
+    """Feeds anime/manga search results into the local catalog."""
+    if search_type in ("anime", "manga"):
+        get_catalog().upsert(search_type, response.get("data") or [])
+
+
+async def _ajikan_search(
+    search_type: str,
+    query: str,
+    page: Optional[int] = None,
+    parameters: Optional[Dict[str, Any]] = None,
+    raw: bool = False,
+) -> Dict[str, Any]:
+    try:
+        response = await ajikan_call(
+            "search",
+            search_type=search_type,
+            query=query,
+            page=page,
+            parameters=parameters,
+        )
+    except UPSTREAM_ERRORS:
+        if search_type not in ("anime", "manga"):
+            raise
+        return await asyncio.to_thread(_local_search, search_type, query)
+    # The catalog is SQLite; keep its writes off the event loop
+    await asyncio.to_thread(_remember_search, search_type, response)
+    return project(response, "search", None, raw)
+
+
+@with_coroutine(_ajikan_search)
 @tool
 def jikan_search(
     search_type: str,
     query: str,
     page: Optional[int] = None,
     parameters: Optional[Dict[str, Any]] = None,
+    raw: bool = False,
 ) -> Dict[str, Any]:
-    """Searches MyAnimeList for content.
+    """Searches MyAnimeList for content. To turn an anime/manga title into its ID, use
+    catalog_search instead.
 
     Args:
         search_type: Where to search ('anime', 'manga', 'characters', 'people', 'users', 'clubs', 'producers')
         query: Search query string
         page: Page number of results
         parameters: Additional search parameters (filters, sorting, etc.)
+        raw: Return the unabridged Jikan response instead of the slimmed one
 
     Returns:
         Dictionary containing search results
     """
-    return jikan.search(
-        search_type=search_type, query=query, page=page, parameters=parameters
+    try:
+        response = jikan_call(
+            "search",
+            search_type=search_type,
+            query=query,
+            page=page,
+            parameters=parameters,
+        )
+    except UPSTREAM_ERRORS:
+        # Title lookups can still be answered locally while Jikan is unavailable
+        if search_type not in ("anime", "manga"):
+            raise
+        return _local_search(search_type, query)
+    _remember_search(search_type, response)
+    return project(response, "search", None, raw)
+
+
+@tool
+def catalog_search(query: str, type: str = "anime", limit: int = 5) -> Dict[str, Any]:
+    """Looks up anime or manga by title in the local catalog and returns their MyAnimeList IDs.
+    Handles English, romaji and Japanese titles, synonyms and typos. Use this first whenever
+    you need the ID of a title; it falls back to a MyAnimeList search if nothing matches.
+
+    Args:
+        query: Title to look up, in any language or spelling
+        type: 'anime' or 'manga'
+        limit: Maximum number of matches
+
+    Returns:
+        Dictionary containing the best matches with their IDs and similarity scores
+    """
+    results = get_catalog().search(query, type, limit=limit)
+    if results and results[0]["similarity"] >= 0.5:
+        return {"data": results, "source": "local catalog"}
+
+    response = jikan_call(
+        "search", search_type=type, query=query, parameters={"limit": limit}
     )
+    _remember_search(type, response)
+    return project(response, "search")
 
 
+@with_async("season_history")
 @tool
 def jikan_season_history() -> Dict[str, Any]:
     """Gets all years and their respective season names from MyAnimeList.
@@ -222,9 +376,11 @@ def jikan_season_history() -> Dict[str, Any]:
     Returns:
         Dictionary containing all years and season names
     """
-    return jikan.season_history()
+    response = jikan_call("season_history")
+    return project(response, "season_history")
 
 
+@with_async("seasons")
 @tool
 def jikan_seasons(
     year: Optional[int] = None,
@@ -232,6 +388,7 @@ def jikan_seasons(
     extension: Optional[str] = None,
     page: Optional[int] = None,
     parameters: Optional[Dict[str, Any]] = None,
+    raw: bool = False,
 ) -> Dict[str, Any]:
     """Gets anime from a specific season or current season.
 
@@ -241,18 +398,29 @@ def jikan_seasons(
         extension: Special information ('now', 'upcoming')
         page: Page number of results
         parameters: Additional query parameters
+        raw: Return the unabridged Jikan response instead of the slimmed one
 
     Returns:
         Dictionary containing seasonal anime information
     """
-    return jikan.seasons(
-        year=year, season=season, extension=extension, page=page, parameters=parameters
+    response = jikan_call(
+        "seasons",
+        year=year,
+        season=season,
+        extension=extension,
+        page=page,
+        parameters=parameters,
     )
+    return project(response, "seasons", extension, raw)
 
 
+@with_async("top")
 @tool
 def jikan_top(
-    type: str, page: Optional[int] = None, parameters: Optional[Dict[str, Any]] = None
+    type: str,
+    page: Optional[int] = None,
+    parameters: Optional[Dict[str, Any]] = None,
+    raw: bool = False,
 ) -> Dict[str, Any]:
     """Gets top items from MyAnimeList.
 
@@ -260,13 +428,16 @@ def jikan_top(
         type: Type of top items ('anime', 'manga', 'people', 'characters', 'reviews')
         page: Page number of results
         parameters: Additional query parameters (filters, subtype, etc.)
+        raw: Return the unabridged Jikan response instead of the slimmed one
 
     Returns:
         Dictionary containing top items
     """
-    return jikan.top(type=type, page=page, parameters=parameters)
+    response = jikan_call("top", type=type, page=page, parameters=parameters)
+    return project(response, "top", None, raw)
 
 
+@with_async("user_by_id")
 @tool
 def jikan_user_by_id(user_id: int) -> Dict[str, Any]:
     """Gets user information by MyAnimeList user ID.
@@ -277,15 +448,18 @@ def jikan_user_by_id(user_id: int) -> Dict[str, Any]:
     Returns:
         Dictionary containing user information
     """
-    return jikan.user_by_id(user_id=user_id)
+    response = jikan_call("user_by_id", user_id=user_id)
+    return project(response, "user_by_id")
 
 
+@with_async("users")
 @tool
 def jikan_users(
     username: str,
     extension: Optional[str] = None,
     page: Optional[int] = None,
     parameters: Optional[Dict[str, Any]] = None,
+    raw: bool = False,
 ) -> Dict[str, Any]:
     """Gets information about a user by username.
 
@@ -294,15 +468,22 @@ def jikan_users(
         extension: Special information ('full', 'statistics', 'favorites', 'userupdates', 'about', 'history', 'friends', 'animelist', 'mangalist', 'reviews', 'recommendations', 'clubs', 'external')
         page: Page number of results (for paginated extensions)
         parameters: Additional query parameters
+        raw: Return the unabridged Jikan response instead of the slimmed one
 
     Returns:
         Dictionary containing user information
     """
-    return jikan.users(
-        username=username, extension=extension, page=page, parameters=parameters
+    response = jikan_call(
+        "users",
+        username=username,
+        extension=extension,
+        page=page,
+        parameters=parameters,
     )
+    return project(response, "users", extension, raw)
 
 
+@with_async("watch")
 @tool
 def jikan_watch(
     extension: str, parameters: Optional[Dict[str, Any]] = None
@@ -316,7 +497,136 @@ def jikan_watch(
     Returns:
         Dictionary containing watch information
     """
-    return jikan.watch(extension=extension, parameters=parameters)
+    response = jikan_call("watch", extension=extension, parameters=parameters)
+    return project(response, "watch")
+
+
+async def _ajikan_fetch_all(
+    endpoint: str,
+    arguments: Dict[str, Any],
+    limit: int = 100,
+    max_pages: int = 10,
+    where: Optional[Dict[str, Any]] = None,
+    stop_when: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    if endpoint not in PAGINATED:
+        return {"error": f"'{endpoint}' is not paginated; use one of {PAGINATED}"}
+    return await afetch_all(
+        endpoint,
+        arguments,
+        limit=limit,
+        max_pages=max_pages,
+        where=where,
+        stop_when=stop_when,
+        fields=fields,
+    )
+
+
+@with_coroutine(_ajikan_fetch_all)
+@tool
+def jikan_fetch_all(
+    endpoint: str,
+    arguments: Dict[str, Any],
+    limit: int = 100,
+    max_pages: int = 10,
+    where: Optional[Dict[str, Any]] = None,
+    stop_when: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Fetches several pages of a paginated endpoint in one call and merges them. Use this
+    instead of calling a tool page by page, e.g. for everything airing this season or a
+    whole top list.
+
+    Args:
+        endpoint: One of 'top', 'seasons', 'reviews', 'recommendations', 'users', 'search', 'schedules'
+        arguments: Arguments of the matching jikan_* tool without 'page' (e.g., {"type": "anime"} for top, {"extension": "now"} for seasons)
+        limit: Maximum number of items to return
+        max_pages: Maximum number of pages to fetch
+        where: Only keep items meeting these conditions, e.g. {"score>=": 8, "genres": "Action"}; keys may end in >=, <=, >, < or !=
+        stop_when: Stop at the first item meeting these conditions, e.g. {"score<": 8} on a top list
+        fields: Only keep these keys on each item (e.g., ["mal_id", "title", "score"])
+
+    Returns:
+        Dictionary containing the merged, deduplicated items and how many pages were fetched
+    """
+    if endpoint not in PAGINATED:
+        return {"error": f"'{endpoint}' is not paginated; use one of {PAGINATED}"}
+    return fetch_all(
+        endpoint,
+        arguments,
+        limit=limit,
+        max_pages=max_pages,
+        where=where,
+        stop_when=stop_when,
+        fields=fields,
+    )
+
+
+@with_coroutine(abatch_lookup)
+@tool
+def jikan_batch(
+    type: str,
+    ids: List[int],
+    columns: Optional[List[str]] = None,
+    extension: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Gets many anime, manga, characters or people by ID in one call. Use this instead of
+    calling jikan_anime/jikan_manga/jikan_characters/jikan_people once per ID, e.g. to
+    compare entries from a top list, recommendations or a user's list.
+
+    Args:
+        type: Type of the entries ('anime', 'manga', 'characters', 'people')
+        ids: MyAnimeList IDs (up to 25; the rest are returned as 'skipped')
+        columns: Fields to return for each entry (e.g., ["mal_id", "title", "score", "synopsis"])
+        extension: 'full' to look up the full resources
+
+    Returns:
+        Dictionary containing a table of 'columns' and one row per entry, plus per-ID errors and any 'skipped' IDs to request in another call
+    """
+    return batch_lookup(type, ids, columns, extension)
+
+
+@with_coroutine(afull_profile)
+@tool
+def jikan_full_profile(
+    type: str, id: int, sections: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Gets everything about one anime or manga in one call: the full entry plus its
+    characters (with voice actors), staff, episodes and recommendations. Use this
+    instead of calling jikan_anime/jikan_manga once per extension when describing a
+    title in depth.
+
+    Args:
+        type: Type of the entry ('anime' or 'manga')
+        id: MyAnimeList ID of the entry
+        sections: Only include these of 'characters', 'staff', 'episodes', 'recommendations' (staff and episodes are anime only)
+
+    Returns:
+        Dictionary containing the entry, one key per section and per-section errors
+    """
+    return full_profile(type, id, sections)
+
+
+@with_coroutine(auser_analytics)
+@tool
+def jikan_user_analytics(
+    username: str, top: int = 10, status: Optional[str] = None
+) -> Dict[str, Any]:
+    """Computes statistics over a user's complete anime list: status counts, completion
+    and drop rates, score mean/median/distribution, time watched, and the genres,
+    themes and studios they watch most and rate best. Use this instead of paging
+    jikan_users(extension='animelist') for any question about a user's list or habits.
+
+    Args:
+        username: MyAnimeList username
+        top: Number of genres, themes and studios listed in each ranking
+        status: Restrict the breakdowns to one list status ('watching', 'completed', 'on_hold', 'dropped', 'plan_to_watch'); defaults to every started entry
+
+    Returns:
+        Dictionary containing the list statistics
+    """
+    return user_analytics(username, top, status)
 
 
 @tool
@@ -328,37 +638,21 @@ def trace_moe_search(
     include_anilist_info: bool = True,
 ) -> str:
     """
-    Searches for an anime scene using an image URL or a base64 encoded string.
-    This tool is adapted from the user-provided code snippet.
+    Searches for an anime scene using an image URL, a file path or a base64 encoded string.
+    The image is downscaled and re-encoded before upload, and repeated or near-identical
+    screenshots are answered from a cache.
 
     Args:
-        path: Image URL or base64 encoded image string.
+        path: Image URL, file path or base64 encoded image string.
         is_url: Set to True if the path is a URL.
-        upload_file: This parameter is not used as the image data is handled directly as a base64 string.
+        upload_file: This parameter is not used as the image is always preprocessed and uploaded.
         cut_black_borders: Automatically crops black borders from the image.
         include_anilist_info: Includes additional anime information from AniList.
 
     Returns:
         A JSON string containing the search results or a descriptive error message.
     """
-    url = "https://api.trace.moe/search"
-    params = {}
-
-    if cut_black_borders:
-        params["cutBorders"] = ""
-    if include_anilist_info:
-        params["anilistInfo"] = ""
-
-    if is_url:
-        params["url"] = path
-        response = requests.get(url, params=params)
-    else:
-        f = open(path, "rb")
-        response = requests.post(url, files={"image": f}, params=params)
-
-    response.raise_for_status()
-    data = response.json()
-    result = data.get("result", [])
+    result = tracemoe.search(path, is_url, cut_black_borders, include_anilist_info)
     return json.dumps(result)
 
 
@@ -369,6 +663,7 @@ def get_all_tools() -> List:
         List of all available tools
     """
     return [
+        catalog_search,
         jikan_anime,
         jikan_anime_episode_by_id,
         jikan_characters,
@@ -388,5 +683,9 @@ def get_all_tools() -> List:
         jikan_user_by_id,
         jikan_users,
         jikan_watch,
-        # trace_moe_search,
+        jikan_fetch_all,
+        jikan_batch,
+        jikan_full_profile,
+        jikan_user_analytics,
+        trace_moe_search,
     ]
@@ -0,0 +1,179 @@
+"""
+Scene search through trace.moe.
+Screenshots are preprocessed before upload: black borders are cropped locally, the
+image is downscaled to the resolution trace.moe actually searches at and re-encoded as
+a compact JPEG. Results are cached under a perceptual hash of the preprocessed frame,
+so the same or a near-identical screenshot is answered without another search.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from urllib.parse import urlparse
+from PIL import Image, ImageOps
+from ..transport import get_session
+import base64
+import binascii
+import io
+import os
+import threading
+import time
+
+TRACE_MOE_URL = os.getenv("TRACE_MOE_URL", "https://api.trace.moe/search")
+TRACE_MOE_HOST = urlparse(TRACE_MOE_URL).netloc
+MAX_SIDE = int(os.getenv("TRACE_MOE_MAX_SIDE", "640"))
+JPEG_QUALITY = int(os.getenv("TRACE_MOE_JPEG_QUALITY", "85"))
+# Pixels at or below this luminance count as black border
+BORDER_THRESHOLD = 16
+# Frames whose 64-bit hashes differ in at most this many bits are the same scene
+HASH_DISTANCE = int(os.getenv("TRACE_MOE_HASH_DISTANCE", "6"))
+RESULT_TTL = float(os.getenv("TRACE_MOE_RESULT_TTL", str(7 * 24 * 3600)))
+
+
+def load_image(path: str, is_url: bool = False) -> bytes:
+    """Reads the raw image bytes behind a URL, a file path or a base64 string."""
+    if is_url:
+        response = get_session(urlparse(path).netloc).get(path)
+        response.raise_for_status()
+        return response.content
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            return f.read()
+    data = path.split(",", 1)[1] if path.startswith("data:") else path
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError("path is neither a file, a URL nor a base64 image") from e
+
+
+def crop_borders(image: Image.Image) -> Image.Image:
+    """Crops the black letterbox/pillarbox borders around a frame."""
+    mask = image.convert("L").point(lambda p: 255 if p > BORDER_THRESHOLD else 0)
+    box = mask.getbbox()
+    if box is None or box == (0, 0, *image.size):
+        return image
+    return image.crop(box)
+
+
+def preprocess(data: bytes, cut_black_borders: bool = True) -> Tuple[bytes, int]:
+    """Shrinks a screenshot to what trace.moe needs.
+
+    Args:
+        data: Original image bytes in any format Pillow reads
+        cut_black_borders: Crop black borders before downscaling
+
+    Returns:
+        The re-encoded JPEG and the perceptual hash of the frame
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        # Only the first frame of animated images is searched
+        image = ImageOps.exif_transpose(original).convert("RGB")
+    if cut_black_borders:
+        image = crop_borders(image)
+    image.thumbnail((MAX_SIDE, MAX_SIDE), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), dhash(image)
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """64-bit difference hash; re-encoded or resized copies of a frame hash alike."""
+    small = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class SceneCache:
+    """LRU of search results keyed by perceptual hash, matched by Hamming distance."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = RESULT_TTL) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (hash, search options) -> (expiry, trace.moe matches)
+        self._entries: "OrderedDict[Tuple[int, Tuple[Any, ...]], Tuple[float, Any]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    def get(
+        self, phash: int, options: Tuple[Any, ...]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Returns the cached result of the closest frame searched with the same options."""
+        now = time.time()
+        with self._lock:
+            best, best_distance = None, HASH_DISTANCE + 1
+            for key, (expires, _) in list(self._entries.items()):
+                if expires < now:
+                    del self._entries[key]
+                    continue
+                if key[1] != options:
+                    continue
+                distance = (key[0] ^ phash).bit_count()
+                if distance < best_distance:
+                    best, best_distance = key, distance
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best)
+            self.stats["hits"] += 1
+            return self._entries[best][1]
+
+    def set(
+        self, phash: int, options: Tuple[Any, ...], result: List[Dict[str, Any]]
+    ) -> None:
+        with self._lock:
+            self._entries[(phash, options)] = (time.time() + self.ttl, result)
+            self._entries.move_to_end((phash, options))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+scene_cache = SceneCache()
+
+
+def search(
+    path: str,
+    is_url: bool = False,
+    cut_black_borders: bool = True,
+    include_anilist_info: bool = True,
+) -> List[Dict[str, Any]]:
+    """Finds the anime scene a screenshot comes from.
+
+    Args:
+        path: Image URL, file path or base64 encoded image
+        is_url: Set to True if the path is a URL
+        cut_black_borders: Crop black borders before searching
+        include_anilist_info: Include AniList titles in the results
+
+    Returns:
+        trace.moe matches, best first
+    """
+    jpeg, phash = preprocess(load_image(path, is_url), cut_black_borders)
+    options = (cut_black_borders, include_anilist_info)
+    cached = scene_cache.get(phash, options)
+    if cached is not None:
+        return cached
+
+    # Borders are already cropped locally, so trace.moe does not need to
+    params = {"anilistInfo": ""} if include_anilist_info else {}
+    response = get_session(TRACE_MOE_HOST).post(
+        TRACE_MOE_URL,
+        params=params,
+        data=jpeg,
+        headers={"Content-Type": "image/jpeg"},
+        timeout=60,
+    )
+    response.raise_for_status()
+    result = response.json().get("result", [])
+    scene_cache.set(phash, options, result)
+    return result
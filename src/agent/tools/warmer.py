@@ -0,0 +1,258 @@
+"""
+Background cache warmer for the Jikan endpoints users ask about most.
+The daily schedules, the current season, the top anime and the popular episodes
+change on a predictable cadence, so a daemon thread refetches them shortly before
+their cache entries expire and the matching tool calls are always served warm. The
+warmer only sends a request when the rate limiter has headroom to spare, so user
+traffic is never queued behind it, and it counts how many lookups of the warmed keys
+found them in the cache.
+
+Environment:
+    CACHE_WARM: Set to 0 to disable the warmer (default 1)
+    CACHE_WARM_TARGETS: JSON list of {"endpoint", "arguments", "interval"} objects
+        replacing the default targets; interval is optional
+    CACHE_WARM_FRACTION: Fraction of an endpoint's TTL after which its entries are
+        refreshed, when a target has no interval of its own (default 0.8)
+    CACHE_WARM_HEADROOM: Rate limiter tokens that must be free before the warmer
+        sends a request (default 2)
+"""
+
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+from .cache import make_key
+from .client import UPSTREAM_ERRORS, cache, refresh, warm_counts, watch_warm
+from .ratelimit import limiter
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+REFRESH_FRACTION = float(os.getenv("CACHE_WARM_FRACTION", "0.8"))
+MIN_HEADROOM = float(os.getenv("CACHE_WARM_HEADROOM", "2"))
+# Bounds on how long the warmer thread sleeps between checks
+MIN_SLEEP = 1.0
+MAX_SLEEP = 60.0
+# Seconds before a target whose refresh failed is tried again
+FAILURE_BACKOFF = 60.0
+
+
+@dataclass
+class WarmTarget:
+    """One Jikan call kept warm.
+
+    Attributes:
+        endpoint: Name of the Jikan client method
+        arguments: Keyword arguments as the matching tool passes them to jikan_call
+        interval: Seconds between refreshes (default a fraction of the endpoint's TTL)
+        refreshes: Successful refreshes so far
+        failures: Failed refreshes so far
+        last_refresh: time.time() of the last successful refresh
+        last_error: Message of the last failure
+        last_failure: time.time() of the last failed refresh
+    """
+
+    endpoint: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    interval: Optional[float] = None
+    refreshes: int = 0
+    failures: int = 0
+    last_refresh: Optional[float] = None
+    last_error: Optional[str] = None
+    last_failure: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        return make_key(self.endpoint, self.arguments)
+
+    def period(self) -> float:
+        if self.interval is not None:
+            return self.interval
+        return cache.ttl_for(self.endpoint) * REFRESH_FRACTION
+
+    def due_at(self) -> float:
+        """time.time() at which the target should next be refreshed."""
+        due = 0.0 if self.last_refresh is None else self.last_refresh + self.period()
+        if self.last_failure is not None:
+            due = max(due, self.last_failure + FAILURE_BACKOFF)
+        return due
+
+
+def default_targets() -> List[WarmTarget]:
+    """The schedule of every weekday, this season, the top anime and popular episodes."""
+    return [WarmTarget("schedules", {"day": day}) for day in DAYS] + [
+        WarmTarget("seasons", {"extension": "now"}),
+        WarmTarget("top", {"type": "anime"}),
+        WarmTarget("watch", {"extension": "episodes/popular"}),
+    ]
+
+
+def targets_from_env() -> List[WarmTarget]:
+    configured = os.getenv("CACHE_WARM_TARGETS")
+    if not configured:
+        return default_targets()
+    return [
+        WarmTarget(t["endpoint"], t.get("arguments") or {}, t.get("interval"))
+        for t in json.loads(configured)
+    ]
+
+
+class CacheWarmer:
+    """Refreshes a fixed set of Jikan calls in a daemon thread.
+
+    Attributes:
+        targets: Calls kept warm
+        min_headroom: Rate limiter tokens that must be free before a refresh is sent
+    """
+
+    def __init__(
+        self,
+        targets: Optional[List[WarmTarget]] = None,
+        min_headroom: float = MIN_HEADROOM,
+    ) -> None:
+        self.targets = targets if targets is not None else default_targets()
+        self.min_headroom = min_headroom
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.skipped = 0
+        for target in self.targets:
+            watch_warm(target.key)
+
+    def due(self, now: Optional[float] = None) -> List[WarmTarget]:
+        """Targets whose refresh is due, most overdue first."""
+        now = time.time() if now is None else now
+        return sorted(
+            (t for t in self.targets if t.due_at() <= now), key=WarmTarget.due_at
+        )
+
+    def run_once(self) -> int:
+        """Refreshes the due targets while the rate limiter has headroom.
+
+        Returns:
+            Number of targets refreshed
+        """
+        refreshed = 0
+        for target in self.due():
+            if self._stop.is_set():
+                break
+            if limiter.available() < self.min_headroom:
+                # User requests have the budget; try again on the next pass
+                self.skipped += 1
+                break
+            try:
+                refresh(target.endpoint, **target.arguments)
+            except UPSTREAM_ERRORS as e:
+                target.failures += 1
+                target.last_error = str(e)
+                target.last_failure = time.time()
+                logger.warning("Cache warm of %s failed: %s", target.key, e)
+                continue
+            target.refreshes += 1
+            target.last_refresh = time.time()
+            target.last_error = None
+            target.last_failure = None
+            refreshed += 1
+        return refreshed
+
+    def _sleep_time(self) -> float:
+        if not self.targets:
+            return MAX_SLEEP
+        wait = min(t.due_at() for t in self.targets) - time.time()
+        return max(MIN_SLEEP, min(MAX_SLEEP, wait))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Cache warmer pass failed")
+            self._stop.wait(self._sleep_time())
+
+    def start(self) -> "CacheWarmer":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="cache-warmer", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def report(self) -> Dict[str, Any]:
+        """Warm-hit ratio of user lookups of the warmed keys, plus per-target state."""
+        now = time.time()
+        hits = misses = 0
+        targets = []
+        for target in self.targets:
+            counts = warm_counts(target.key)
+            hits += counts["hits"]
+            misses += counts["misses"]
+            targets.append(
+                {
+                    "key": target.key,
+                    "interval": target.period(),
+                    "refreshes": target.refreshes,
+                    "failures": target.failures,
+                    "age": None
+                    if target.last_refresh is None
+                    else now - target.last_refresh,
+                    "hits": counts["hits"],
+                    "misses": counts["misses"],
+                    "last_error": target.last_error,
+                }
+            )
+        lookups = hits + misses
+        return {
+            "running": self.running,
+            "warm_hits": hits,
+            "warm_misses": misses,
+            "warm_hit_ratio": hits / lookups if lookups else None,
+            "refreshes": sum(t.refreshes for t in self.targets),
+            "failures": sum(t.failures for t in self.targets),
+            "skipped": self.skipped,
+            "targets": targets,
+        }
+
+
+_warmer: Optional[CacheWarmer] = None
+_warmer_lock = threading.Lock()
+
+
+def get_warmer() -> CacheWarmer:
+    """Returns the process-wide warmer, configured from the environment."""
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = CacheWarmer(targets_from_env())
+        return _warmer
+
+
+def start_warmer() -> Optional[CacheWarmer]:
+    """Starts the process-wide warmer unless CACHE_WARM is 0.
+
+    Returns:
+        The warmer, or None when it is disabled
+    """
+    if os.getenv("CACHE_WARM", "1").lower() in ("0", "false", "off"):
+        return None
+    return get_warmer().start()
@@ -0,0 +1,417 @@
+"""
+Tiered, cached web search through Tavily.
+An advanced search for 15 results with image descriptions is Tavily's slowest and
+largest response, and most questions are answered by a few basic results. The search
+starts with a basic search for a handful of results and escalates to an advanced one
+only when too few of them are relevant. Results of both tiers are merged, deduplicated
+by URL and content, and clipped to a character budget before they reach the model.
+Searches are cached under their normalized query, so a repeated search costs nothing.
+
+Environment:
+    WEB_SEARCH_TTL: Seconds results stay cached, 0 disables the cache (default 6 hours)
+    WEB_SEARCH_MIN_RESULTS: Relevant results a basic search must find (default 3)
+    WEB_SEARCH_MIN_SCORE: Tavily score that counts a result as relevant (default 0.6)
+    WEB_SEARCH_BUDGET: Characters of result content returned per search (default 6000)
+"""
+
+from typing import Any, Dict, Generator, List, Literal, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForToolRun,
+)
+from langchain_core.tools import ToolException
+from langchain_tavily import TavilySearch
+from .cache import HOUR, MISSING, TieredCache, make_key
+from ..metrics import metrics
+import json
+import os
+import re
+import threading
+import time
+
+TTL = int(os.getenv("WEB_SEARCH_TTL", str(6 * HOUR)))
+MIN_RESULTS = int(os.getenv("WEB_SEARCH_MIN_RESULTS", "3"))
+MIN_SCORE = float(os.getenv("WEB_SEARCH_MIN_SCORE", "0.6"))
+BUDGET = int(os.getenv("WEB_SEARCH_BUDGET", "6000"))
+# Characters kept of each result's content and each image description
+CONTENT_CHARS = 800
+DESCRIPTION_CHARS = 200
+MAX_IMAGES = 5
+# Results whose content starts the same are mirrors of one page
+DUPLICATE_PREFIX = 160
+
+
+@dataclass(frozen=True)
+class SearchTier:
+    """One Tavily configuration, from cheapest to most thorough.
+
+    Attributes:
+        name: Tier name used in stats and metrics
+        search_depth: Tavily search depth
+        max_results: Results requested
+        include_image_descriptions: Ask for image descriptions with the images
+    """
+
+    name: str
+    search_depth: Literal["basic", "advanced"]
+    max_results: int
+    include_image_descriptions: bool = False
+
+
+TIERS: Tuple[SearchTier, ...] = (
+    SearchTier("basic", "basic", 5),
+    SearchTier("advanced", "advanced", 10, include_image_descriptions=True),
+)
+
+search_cache = TieredCache(ttls={"tavily": TTL}, max_memory_entries=256)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases a query and drops punctuation and extra whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def _url_key(url: str) -> str:
+    parts = urlsplit(url.strip().lower())
+    host = parts.netloc.removeprefix("www.")
+    return f"{host}{parts.path.rstrip('/')}?{parts.query}"
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def merge_results(responses: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Results of several searches, best score first, one per page."""
+    best: Dict[str, Dict[str, Any]] = {}
+    for response in responses:
+        for result in response.get("results") or []:
+            key = _url_key(result.get("url") or "")
+            if key not in best or (result.get("score") or 0) > (
+                best[key].get("score") or 0
+            ):
+                best[key] = result
+    ranked = sorted(best.values(), key=lambda r: -(r.get("score") or 0))
+    unique, seen = [], set()
+    for result in ranked:
+        prefix = normalize_query(result.get("content") or "")[:DUPLICATE_PREFIX]
+        if prefix and prefix in seen:
+            continue
+        seen.add(prefix)
+        unique.append(result)
+    return unique
+
+
+def merge_images(responses: Sequence[Dict[str, Any]]) -> List[Any]:
+    """Up to MAX_IMAGES distinct images, with clipped descriptions."""
+    images, seen = [], set()
+    for response in responses:
+        for image in response.get("images") or []:
+            url = image.get("url") if isinstance(image, dict) else image
+            if not url or url in seen:
+                continue
+            seen.add(url)
+            if isinstance(image, dict) and image.get("description"):
+                image = {
+                    "url": url,
+                    "description": _clip(image["description"], DESCRIPTION_CHARS),
+                }
+            images.append(image)
+            if len(images) == MAX_IMAGES:
+                return images
+    return images
+
+
+def trim(
+    results: Sequence[Dict[str, Any]], budget: int = BUDGET
+) -> List[Dict[str, Any]]:
+    """Clips each result's content and keeps results until the budget is spent."""
+    kept, used = [], 0
+    for result in results:
+        content = _clip(result.get("content") or "", CONTENT_CHARS)
+        if kept and used + len(content) > budget:
+            break
+        used += len(content)
+        kept.append(
+            {
+                "title": result.get("title"),
+                "url": result.get("url"),
+                "content": content,
+                "score": round(result.get("score") or 0, 3),
+            }
+        )
+    return kept
+
+
+def sufficient(results: Sequence[Dict[str, Any]]) -> bool:
+    """Whether enough results are relevant to skip the next tier."""
+    relevant = [r for r in results if (r.get("score") or 0) >= MIN_SCORE]
+    return len(relevant) >= MIN_RESULTS
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, default=str, ensure_ascii=False).encode())
+
+
+class SearchStats:
+    """Latency and payload size of the searches made at each tier."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.tiers: Dict[str, Dict[str, float]] = {}
+        self.escalations = 0
+
+    def _tier(self, name: str) -> Dict[str, float]:
+        return self.tiers.setdefault(
+            name,
+            {
+                "calls": 0,
+                "errors": 0,
+                "seconds": 0.0,
+                "bytes": 0,
+                "answered": 0,
+                "returned_bytes": 0,
+            },
+        )
+
+    def call(self, tier: str, seconds: float, size: Optional[int]) -> None:
+        """Records one Tavily request; size None means it failed."""
+        labels = {"tier": tier}
+        metrics.observe(
+            "web_search_latency_seconds", seconds, labels, help="Tavily request latency"
+        )
+        if size is not None:
+            metrics.inc(
+                "web_search_bytes_total", labels, size, help="Tavily response bytes"
+            )
+        with self._lock:
+            counts = self._tier(tier)
+            counts["calls"] += 1
+            counts["seconds"] += seconds
+            if size is None:
+                counts["errors"] += 1
+            else:
+                counts["bytes"] += size
+
+    def answer(self, tier: str, size: int, escalated: bool) -> None:
+        """Records the result returned to the model and the tier it ended at."""
+        metrics.inc(
+            "web_search_returned_bytes_total",
+            {"tier": tier},
+            size,
+            help="Web search bytes returned to the model",
+        )
+        with self._lock:
+            counts = self._tier(tier)
+            counts["answered"] += 1
+            counts["returned_bytes"] += size
+            self.escalations += escalated
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            tiers = []
+            for name, counts in self.tiers.items():
+                ok = counts["calls"] - counts["errors"]
+                tiers.append(
+                    {
+                        "tier": name,
+                        **counts,
+                        "mean_seconds": counts["seconds"] / counts["calls"]
+                        if counts["calls"]
+                        else None,
+                        "mean_bytes": counts["bytes"] / ok if ok else None,
+                        "mean_returned_bytes": counts["returned_bytes"]
+                        / counts["answered"]
+                        if counts["answered"]
+                        else None,
+                    }
+                )
+            return {
+                "escalations": self.escalations,
+                "tiers": tiers,
+                "cache": search_cache.stats()["endpoints"].get("tavily", {}),
+            }
+
+
+search_stats = SearchStats()
+
+
+class TieredTavilySearch(TavilySearch):
+    """TavilySearch that caches, tiers and trims its results.
+
+    The tool keeps TavilySearch's name and arguments. search_depth='advanced' from
+    the model starts at the advanced tier; fields set on the tool still win over the
+    model's arguments, as in TavilySearch.
+    """
+
+    def _options(
+        self,
+        include_domains: Optional[List[str]],
+        exclude_domains: Optional[List[str]],
+        include_images: Optional[bool],
+        time_range: Optional[str],
+        topic: Optional[str],
+    ) -> Dict[str, Any]:
+        return {
+            "include_domains": self.include_domains or include_domains,
+            "exclude_domains": self.exclude_domains or exclude_domains,
+            "include_images": bool(self.include_images or include_images),
+            "time_range": self.time_range or time_range,
+            "topic": self.topic or topic,
+        }
+
+    def _plan(
+        self, query: str, search_depth: Optional[str], options: Dict[str, Any]
+    ) -> Tuple[Tuple[SearchTier, ...], str]:
+        """The tiers to try, and the cache key of the search."""
+        tiers = TIERS
+        if (self.search_depth or search_depth) == "advanced":
+            tiers = tuple(t for t in TIERS if t.search_depth == "advanced")
+        key = make_key(
+            "tavily",
+            {**options, "query": normalize_query(query), "from": tiers[0].name},
+        )
+        return tiers, key
+
+    def _params(
+        self, query: str, tier: SearchTier, options: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return {
+            **options,
+            "query": query,
+            "search_depth": tier.search_depth,
+            "max_results": tier.max_results,
+            "include_image_descriptions": options["include_images"]
+            and tier.include_image_descriptions,
+            "include_answer": self.include_answer,
+            "include_raw_content": self.include_raw_content,
+            "country": self.country,
+            "auto_parameters": self.auto_parameters,
+        }
+
+    def _record(
+        self,
+        tier: SearchTier,
+        start: float,
+        response: Optional[Dict[str, Any]],
+        responses: List[Dict[str, Any]],
+    ) -> bool:
+        """Records one tier's response (None if it failed); True when done searching."""
+        seconds = time.perf_counter() - start
+        if response is None:
+            search_stats.call(tier.name, seconds, None)
+            # A failed escalation still leaves the earlier results to answer with
+            return True
+        search_stats.call(tier.name, seconds, _size(response))
+        responses.append(response)
+        return sufficient(merge_results(responses))
+
+    def _answer(
+        self, query: str, key: str, tiers: Sequence[SearchTier], responses: List[Any]
+    ) -> Dict[str, Any]:
+        results = merge_results(responses)
+        if not results:
+            raise ToolException(
+                f"No search results found for '{query}'. Try a broader query, a "
+                "longer time range or fewer domain filters."
+            )
+        kept = trim(results)
+        tier = tiers[len(responses) - 1]
+        answer = {
+            "query": query,
+            "search_depth": tier.search_depth,
+            "results": kept,
+            "omitted_results": len(results) - len(kept),
+            "images": merge_images(responses),
+        }
+        search_stats.answer(tier.name, _size(answer), len(responses) > 1)
+        search_cache.set("tavily", key, answer)
+        return answer
+
+    def _search(
+        self, query: str, search_depth: Optional[str], options: Dict[str, Any]
+    ) -> Generator[Dict[str, Any], Any, Dict[str, Any]]:
+        """The cached, tiered search, independent of how requests are sent.
+
+        Yields the parameters of each Tavily request and is sent back its response, or
+        the exception it raised. Returns the answer.
+        """
+        tiers, key = self._plan(query, search_depth, options)
+        cached = search_cache.get("tavily", key)
+        if cached is not MISSING:
+            return cached
+
+        responses: List[Dict[str, Any]] = []
+        for tier in tiers:
+            start = time.perf_counter()
+            response = yield self._params(query, tier, options)
+            if isinstance(response, Exception):
+                if not responses:
+                    search_stats.call(tier.name, time.perf_counter() - start, None)
+                    raise response
+                response = None
+            if self._record(tier, start, response, responses):
+                break
+        return self._answer(query, key, tiers, responses)
+
+    def _run(
+        self,
+        query: str,
+        include_domains: Optional[List[str]] = None,
+        exclude_domains: Optional[List[str]] = None,
+        search_depth: Optional[Literal["basic", "advanced"]] = None,
+        include_images: Optional[bool] = None,
+        time_range: Optional[Literal["day", "week", "month", "year"]] = None,
+        topic: Optional[Literal["general", "news", "finance"]] = None,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Dict[str, Any]:
+        options = self._options(
+            include_domains, exclude_domains, include_images, time_range, topic
+        )
+        search = self._search(query, search_depth, options)
+        try:
+            params = next(search)
+            while True:
+                try:
+                    response = self.api_wrapper.raw_results(**params)
+                except Exception as e:
+                    response = e
+                params = search.send(response)
+        except StopIteration as done:
+            return done.value
+        except ToolException:
+            raise
+        except Exception as e:
+            return {"error": e}
+
+    async def _arun(
+        self,
+        query: str,
+        include_domains: Optional[List[str]] = None,
+        exclude_domains: Optional[List[str]] = None,
+        search_depth: Optional[Literal["basic", "advanced"]] = None,
+        include_images: Optional[bool] = None,
+        time_range: Optional[Literal["day", "week", "month", "year"]] = None,
+        topic: Optional[Literal["general", "news", "finance"]] = None,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> Dict[str, Any]:
+        options = self._options(
+            include_domains, exclude_domains, include_images, time_range, topic
+        )
+        search = self._search(query, search_depth, options)
+        try:
+            params = next(search)
+            while True:
+                try:
+                    response = await self.api_wrapper.raw_results_async(**params)
+                except Exception as e:
+                    response = e
+                params = search.send(response)
+        except StopIteration as done:
+            return done.value
+        except ToolException:
+            raise
+        except Exception as e:
+            return {"error": e}
@@ -0,0 +1,146 @@
+"""
+Shared HTTP transport for every outbound integration.
+Each upstream host gets one pooled keep-alive session (requests for blocking calls,
+aiohttp per event loop for async ones) with the same pool size and connect/read
+timeouts, so repeated calls reuse TCP+TLS connections instead of handshaking again.
+Connection reuse per host is tracked for monitoring.
+
+Environment:
+    HTTP_POOL_SIZE: Connections kept open per host (default 10)
+    HTTP_CONNECT_TIMEOUT: Seconds to establish a connection (default 5)
+    HTTP_READ_TIMEOUT: Seconds to wait for a response (default 30)
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+import aiohttp
+import asyncio
+import os
+import threading
+import requests
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+KEEPALIVE = 30.0
+
+
+class PooledSession(requests.Session):
+    """requests.Session with default timeouts and per-session request counting."""
+
+    def __init__(self, pool_size: int = POOL_SIZE) -> None:
+        super().__init__()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+        self.requests_sent = 0
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> Any:
+        # Clients like jikanpy never pass a timeout, which would otherwise wait forever
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        self.requests_sent += 1
+        return super().request(method, url, *args, **kwargs)
+
+    def connections_opened(self) -> int:
+        """Connections opened by the pools currently alive in this session."""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+
+_lock = threading.Lock()
+_sessions: Dict[str, PooledSession] = {}
+# aiohttp sessions are bound to the loop that created them
+_aio_sessions: Dict[Tuple[int, str], aiohttp.ClientSession] = {}
+_aio_stats: Dict[str, Dict[str, int]] = {}
+
+
+def get_session(host: str) -> PooledSession:
+    """Returns the pooled blocking session for a host, creating it once.
+
+    Args:
+        host: Upstream host name (e.g., 'api.jikan.moe')
+    """
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _sessions[host] = PooledSession()
+        return session
+
+
+def _count(host: str, field: str) -> Any:
+    async def hook(session: Any, context: Any, params: Any) -> None:
+        stats = _aio_stats.setdefault(host, {"requests": 0, "connections": 0})
+        stats[field] += 1
+
+    return hook
+
+
+def get_aio_session(
+    host: str, trace_configs: Optional[List[aiohttp.TraceConfig]] = None
+) -> aiohttp.ClientSession:
+    """Returns the pooled aiohttp session for a host on the running loop.
+
+    Args:
+        host: Upstream host name
+        trace_configs: Extra trace hooks, only applied when the session is created
+    """
+    key = (id(asyncio.get_running_loop()), host)
+    session = _aio_sessions.get(key)
+    if session is None or session.closed:
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(_count(host, "requests"))
+        trace.on_connection_create_end.append(_count(host, "connections"))
+        session = _aio_sessions[key] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit_per_host=POOL_SIZE, keepalive_timeout=KEEPALIVE
+            ),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT
+            ),
+            trace_configs=[trace, *(trace_configs or [])],
+        )
+    return session
+
+
+async def aclose_aio_sessions() -> None:
+    """Closes the aiohttp sessions of the running loop."""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _aio_sessions if key[0] == loop_id]:
+        await _aio_sessions.pop(key).close()
+
+
+def close_sessions() -> None:
+    """Closes every pooled blocking session."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def _reuse(requests_sent: int, connections: int) -> Dict[str, Any]:
+    reused = max(0, requests_sent - connections)
+    return {
+        "requests": requests_sent,
+        "connections": connections,
+        "reused": reused,
+        "reuse_ratio": reused / requests_sent if requests_sent else 0.0,
+    }
+
+
+def stats() -> Dict[str, Any]:
+    """Returns connection reuse per host, for the blocking and async sessions."""
+    with _lock:
+        sessions = dict(_sessions)
+    return {
+        "pool_size": POOL_SIZE,
+        "timeouts": {"connect": CONNECT_TIMEOUT, "read": READ_TIMEOUT},
+        "sync": {
+            host: _reuse(session.requests_sent, session.connections_opened())
+            for host, session in sessions.items()
+        },
+        "async": {
+            host: _reuse(s["requests"], s["connections"])
+            for host, s in _aio_stats.items()
+        },
+    }
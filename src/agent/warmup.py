@@ -0,0 +1,58 @@
+"""
+Background warm-up of the agent stack.
+Importing the model, search, Mongo and LangGraph libraries and compiling the graph
+takes seconds, and nobody needs any of it on the login screen. start_warmup() does
+that work in a daemon thread once per process, so it overlaps with the user signing
+in and the chat page finds the shared agent already built. This module imports
+nothing heavy itself, so the login page can start it without paying for it.
+
+Environment:
+    AGENT_WARMUP: Set to 0 to build the agent on the first chat page instead
+"""
+
+from typing import Any, Dict, Optional
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_status: Dict[str, Any] = {"state": "idle", "seconds": None, "error": None}
+
+
+def _warm() -> None:
+    start = time.perf_counter()
+    try:
+        from .agent import get_agent, get_router, get_service
+
+        get_agent()
+        get_router()
+        get_service()
+    except Exception as e:
+        # The chat page builds the agent itself and reports the error to the user
+        logger.exception("Agent warm-up failed")
+        _status.update(state="failed", error=str(e))
+    else:
+        _status.update(state="done")
+    _status["seconds"] = time.perf_counter() - start
+
+
+def start_warmup() -> None:
+    """Starts building the shared agent in the background, once per process."""
+    global _thread
+    if os.getenv("AGENT_WARMUP", "1").lower() in ("0", "false", "off"):
+        return
+    with _lock:
+        if _thread is not None:
+            return
+        _status["state"] = "running"
+        _thread = threading.Thread(target=_warm, name="agent-warmup", daemon=True)
+        _thread.start()
+
+
+def warmup_status() -> Dict[str, Any]:
+    """State of the warm-up ('idle', 'running', 'done' or 'failed') and its duration."""
+    return dict(_status)
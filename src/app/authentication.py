@@ -1,6 +1,4 @@
 import streamlit as st
-from supabase import create_client, Client
-from supabase.lib.client_options import ClientOptions
 from dotenv import load_dotenv
 import os
 import re
@@ -9,6 +7,10 @@ import re
 @st.cache_resource
 def init_connection():
     """Initializes and caches the Supabase connection."""
+    # Imported here so the login form paints before the client library loads
+    from supabase import create_client, Client
+    from supabase.lib.client_options import ClientOptions
+
     load_dotenv()
     supabase_url = os.getenv("SUPABASE_URL")
     supabase_key = os.getenv("SUPABASE_KEY")
@@ -63,6 +65,12 @@ def is_valid_email(email):
     return re.match(pattern, email) is not None
 
 
+def is_admin(email):
+    """Checks whether an email is listed in ADMIN_EMAILS (comma-separated)."""
+    admins = {a.strip().lower() for a in os.getenv("ADMIN_EMAILS", "").split(",")}
+    return bool(email) and email.lower() in admins
+
+
 def update_user(new_email, new_password):
     """Updates the user's email and password."""
     try: